@@ -16,25 +16,133 @@ def compute_indicators(df, conf):
     df['atr']=AverageTrueRange(h,l,c,window=conf.get('atr_period',14)).average_true_range()
     return df.dropna().reset_index(drop=True)
 
-def main():
-    p=argparse.ArgumentParser()
-    p.add_argument("--csv", required=True, help="OHLCV CSV con columnas timestamp,open,high,low,close,volume")
-    p.add_argument("--symbol", default="BTC/USDT")
-    p.add_argument("--fees", default="taker", choices=["taker","maker"])
-    args=p.parse_args()
-    os.makedirs("data/backtests", exist_ok=True)
+try:
+    from numba import njit  # opcional: compila el loop interno
+except Exception:
+    njit = None
 
-    df=pd.read_csv(args.csv, parse_dates=["timestamp"])
-    df=compute_indicators(df, {"ema_fast":21,"ema_slow":55,"rsi_period":14,"macd_fast":12,"macd_slow":26,"macd_signal":9,"bb_period":20,"bb_std":2,"atr_period":14})
-    bal=1000.0; fee=0.0005 if args.fees=="taker" else 0.0002
-    risk=0.01; stop_mult=2.0; tp1r=1.0; tp2r=2.0
+DEFAULTS = {"balance": 1000.0, "fee": 0.0005, "risk": 0.01, "stop_mult": 2.0, "tp1r": 1.0, "tp2r": 2.0,
+            "rsi_long": 52.0, "rsi_short": 48.0, "adx_min": 15.0, "bbw_min": 12.0}
+
+def entry_masks(df, params=None):
+    """Máscaras long/short de toda la serie de una vez (mismas reglas que el loop fila a fila)."""
+    P = {**DEFAULTS, **(params or {})}
+    ef = df['ema_fast'].to_numpy(float); es = df['ema_slow'].to_numpy(float)
+    hist = df['macd'].to_numpy(float) - df['macd_signal'].to_numpy(float)
+    rsi = df['rsi'].to_numpy(float)
+    base = (df['adx'].to_numpy(float) >= P["adx_min"]) & (df['bb_width_bps'].to_numpy(float) >= P["bbw_min"])
+    rising = np.zeros(len(df), dtype=bool); falling = np.zeros(len(df), dtype=bool)
+    rising[1:] = hist[1:] > hist[:-1]; falling[1:] = hist[1:] < hist[:-1]
+    long_ok = (ef > es) & rising & (rsi > P["rsi_long"]) & base
+    short_ok = (ef < es) & falling & (rsi < P["rsi_short"]) & base
+    long_ok[:2] = False; short_ok[:2] = False
+    return long_ok, short_ok
+
+def _first_exit(close, start, sl, tp1, is_long):
+    """Primer índice >= start donde toca SL o TP1 (búsqueda por bloques crecientes); -1 si no hay."""
+    n = len(close); step = 64
+    while start < n:
+        seg = close[start:start + step]
+        hit = (seg <= sl) | (seg >= tp1) if is_long else (seg >= sl) | (seg <= tp1)
+        k = np.flatnonzero(hit)
+        if k.size:
+            return start + int(k[0])
+        start += step; step = min(step * 4, 1 << 16)
+    return -1
+
+def _simulate_py(close, atr, long_ok, short_ok, P):
+    entries = np.flatnonzero(long_ok | short_ok)
+    bal = P["balance"]; fee = P["fee"]
+    events = []  # (idx, action, price, pnl)
+    start = 2
+    while True:
+        k = np.searchsorted(entries, start)
+        if k >= len(entries):
+            break
+        i = int(entries[k])
+        side = "long" if long_ok[i] else "short"
+        price = close[i]; atr_i = atr[i]
+        risk_usdt = bal * P["risk"]; stop_dist = atr_i * P["stop_mult"]
+        qty = risk_usdt / stop_dist
+        notional = qty * price; bal -= notional * fee
+        sl = price - stop_dist if side == "long" else price + stop_dist
+        tp1 = price + (atr_i * P["tp1r"] if side == "long" else -atr_i * P["tp1r"])
+        events.append((i, "OPEN", price, None))
+        j = _first_exit(close, i + 1, sl, tp1, side == "long")
+        if j < 0:
+            break
+        price = close[j]
+        pnl = (price - events[-1][2]) * qty * (1 if side == "long" else -1)
+        bal += pnl - (qty * price * fee)
+        stopped = price <= sl if side == "long" else price >= sl
+        events.append((j, "STOP" if stopped else "TP1", price, pnl))
+        start = j + 1
+    return events, bal
+
+if njit is not None:
+    @njit(cache=True)
+    def _simulate_nb(close, atr, long_ok, short_ok, balance, fee, risk, stop_mult, tp1r):
+        n = len(close)
+        idx = np.empty(n, np.int64); act = np.empty(n, np.int8); px = np.empty(n); pl = np.empty(n)
+        m = 0; bal = balance; in_pos = False
+        side_long = True; qty = 0.0; entry = 0.0; sl = 0.0; tp1 = 0.0
+        for i in range(2, n):
+            if not in_pos:
+                if long_ok[i] or short_ok[i]:
+                    side_long = bool(long_ok[i])
+                    price = close[i]; atr_i = atr[i]
+                    risk_usdt = bal * risk; stop_dist = atr_i * stop_mult
+                    qty = risk_usdt / stop_dist
+                    notional = qty * price; bal -= notional * fee
+                    sl = price - stop_dist if side_long else price + stop_dist
+                    tp1 = price + (atr_i * tp1r if side_long else -atr_i * tp1r)
+                    entry = price; in_pos = True
+                    idx[m] = i; act[m] = 0; px[m] = price; pl[m] = np.nan; m += 1
+            else:
+                price = close[i]
+                stop = price <= sl if side_long else price >= sl
+                take = price >= tp1 if side_long else price <= tp1
+                if stop or take:
+                    pnl = (price - entry) * qty * (1 if side_long else -1)
+                    bal += pnl - (qty * price * fee)
+                    idx[m] = i; act[m] = 1 if stop else 2; px[m] = price; pl[m] = pnl; m += 1
+                    in_pos = False
+        return idx[:m], act[:m], px[:m], pl[:m], bal
+
+def simulate(df, params=None, long_ok=None, short_ok=None, use_numba=True):
+    """Backtest sobre arrays NumPy. Devuelve (rows, balance_final) con los mismos trades que simulate_loop."""
+    P = {**DEFAULTS, **(params or {})}
+    if long_ok is None or short_ok is None:
+        long_ok, short_ok = entry_masks(df, P)
+    close = df['close'].to_numpy(float); atr = df['atr'].to_numpy(float)
+    ts = df['timestamp'].to_numpy() if 'timestamp' in df.columns else np.arange(len(df))
+    if use_numba and njit is not None:
+        idx, act, px, pl, bal = _simulate_nb(close, atr, long_ok, short_ok, P["balance"], P["fee"],
+                                             P["risk"], P["stop_mult"], P["tp1r"])
+        names = ("OPEN", "STOP", "TP1")
+        events = [(int(i), names[a], p, None if a == 0 else q) for i, a, p, q in zip(idx, act, px, pl)]
+    else:
+        events, bal = _simulate_py(close, atr, long_ok, short_ok, P)
+    rows = []
+    for i, action, price, pnl in events:
+        row = {"timestamp": ts[i], "action": action, "price": price}
+        if pnl is not None:
+            row["pnl"] = pnl
+        rows.append(row)
+    return rows, bal
+
+def simulate_loop(df, params=None):
+    """Loop original fila a fila (referencia para --verify)."""
+    P = {**DEFAULTS, **(params or {})}
+    bal = P["balance"]; fee = P["fee"]
+    risk = P["risk"]; stop_mult = P["stop_mult"]; tp1r = P["tp1r"]; tp2r = P["tp2r"]
 
     open_pos=None; rows=[]
     for i in range(2,len(df)):
         r=df.iloc[i]; p1=df.iloc[i-1]
         # simple signal (igual que runtime)
-        long_ok = r.ema_fast>r.ema_slow and (r.macd-r.macd_signal)>(p1.macd-p1.macd_signal) and r.rsi>52 and r.adx>=15 and r.bb_width_bps>=12
-        short_ok= r.ema_fast<r.ema_slow and (r.macd-r.macd_signal)<(p1.macd-p1.macd_signal) and r.rsi<48 and r.adx>=15 and r.bb_width_bps>=12
+        long_ok = r.ema_fast>r.ema_slow and (r.macd-r.macd_signal)>(p1.macd-p1.macd_signal) and r.rsi>P["rsi_long"] and r.adx>=P["adx_min"] and r.bb_width_bps>=P["bbw_min"]
+        short_ok= r.ema_fast<r.ema_slow and (r.macd-r.macd_signal)<(p1.macd-p1.macd_signal) and r.rsi<P["rsi_short"] and r.adx>=P["adx_min"] and r.bb_width_bps>=P["bbw_min"]
 
         if open_pos is None:
             if long_ok or short_ok:
@@ -60,6 +168,27 @@ def main():
                 bal += pnl - (open_pos["qty"]*price*fee)
                 rows.append({"timestamp":r.timestamp,"action":"TP1","price":price,"pnl":pnl})
                 open_pos=None
+    return rows, bal
+
+def main():
+    p=argparse.ArgumentParser()
+    p.add_argument("--csv", required=True, help="OHLCV CSV con columnas timestamp,open,high,low,close,volume")
+    p.add_argument("--symbol", default="BTC/USDT")
+    p.add_argument("--fees", default="taker", choices=["taker","maker"])
+    p.add_argument("--no-numba", action="store_true", help="usar el core NumPy puro aunque numba esté instalado")
+    p.add_argument("--verify", action="store_true", help="correr también el loop fila a fila y comparar trades")
+    args=p.parse_args()
+    os.makedirs("data/backtests", exist_ok=True)
+
+    df=pd.read_csv(args.csv, parse_dates=["timestamp"])
+    df=compute_indicators(df, {"ema_fast":21,"ema_slow":55,"rsi_period":14,"macd_fast":12,"macd_slow":26,"macd_signal":9,"bb_period":20,"bb_std":2,"atr_period":14})
+    params={"fee": 0.0005 if args.fees=="taker" else 0.0002}
+
+    rows, bal = simulate(df, params, use_numba=not args.no_numba)
+    if args.verify:
+        ref_rows, ref_bal = simulate_loop(df, params)
+        same = pd.DataFrame(rows).equals(pd.DataFrame(ref_rows)) and bal == ref_bal
+        print("verify:", "OK" if same else "DIFERENCIAS", f"({len(rows)} eventos)")
 
     out=pd.DataFrame(rows)
     out_path=f"data/backtests/{args.symbol.replace('/','')}_results.csv"
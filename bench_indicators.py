@@ -0,0 +1,64 @@
+import argparse, time
+import numpy as np, pandas as pd
+from bot.core.indicators import compute_indicators
+from bot.core.indicator_state import IndicatorState, COLUMNS
+
+def _synthetic(n, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.0015, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.0007, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.0007, n)))
+    ts = 1_700_000_000_000 + np.arange(n) * 120_000
+    return pd.DataFrame({"ts": ts, "open": open_, "high": high, "low": low, "close": close,
+                         "volume": np.abs(rng.normal(100, 30, n))})
+
+def main():
+    p = argparse.ArgumentParser(description="Chequea IndicatorState contra compute_indicators (ta) y mide el costo por tick")
+    p.add_argument("--csv", help="OHLCV CSV con columnas ts/timestamp,open,high,low,close,volume (default: sintético)")
+    p.add_argument("--bars", type=int, default=5000)
+    p.add_argument("--window", type=int, default=200, help="filas que recalcula compute_indicators por tick")
+    p.add_argument("--ticks", type=int, default=300)
+    args = p.parse_args()
+
+    if args.csv:
+        df = pd.read_csv(args.csv).rename(columns={"timestamp": "ts"})
+        df = df[["ts", "open", "high", "low", "close", "volume"]].dropna().reset_index(drop=True)
+    else:
+        df = _synthetic(args.bars)
+    conf = {}
+    bars = list(df.itertuples(index=False, name=None))
+
+    # 1) paridad: misma historia completa => mismas filas
+    ref = compute_indicators(df, conf)
+    st = IndicatorState(conf)
+    rows = [r for r in (st.update(b) for b in bars) if IndicatorState.ready(r)]
+    got = pd.DataFrame(rows, columns=COLUMNS)
+    assert len(got) == len(ref), f"filas distintas: {len(got)} vs {len(ref)}"
+    print(f"paridad sobre {len(ref)} filas:")
+    for col in COLUMNS[1:]:
+        a, b = ref[col].astype(float).values, got[col].astype(float).values
+        diff = float(np.max(np.abs(a - b)))
+        ok = np.allclose(a, b, rtol=1e-6, atol=1e-6)
+        print(f"  {col:<12} max|diff|={diff:.3e} {'OK' if ok else 'FAIL'}")
+
+    # 2) costo por tick: recalcular la ventana vs update incremental
+    ticks = min(args.ticks, len(bars) - args.window)
+    t0 = time.perf_counter()
+    for i in range(ticks):
+        compute_indicators(df.iloc[i:i + args.window], conf)
+    full_us = (time.perf_counter() - t0) / ticks * 1e6
+
+    st = IndicatorState(conf)
+    st.seed(bars[:args.window])
+    tail = bars[args.window:args.window + ticks]
+    t0 = time.perf_counter()
+    for b in tail:
+        st.peek(b)
+        st.update(b)
+    inc_us = (time.perf_counter() - t0) / len(tail) * 1e6
+    print(f"costo por tick: compute_indicators({args.window} filas)={full_us:.0f}us | "
+          f"IndicatorState peek+update={inc_us:.1f}us | x{full_us / max(inc_us, 1e-9):.0f}")
+
+if __name__ == "__main__":
+    main()
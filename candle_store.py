@@ -0,0 +1,186 @@
+from collections import deque
+import pandas as pd
+
+COLUMNS = ["ts", "open", "high", "low", "close", "volume"]
+
+_TF_UNITS = {"m": 60_000, "h": 3_600_000, "d": 86_400_000}
+
+
+def tf_to_ms(tf: str) -> int:
+    """'1m' -> 60000, '2m' -> 120000, '1h' -> 3600000 ..."""
+    tf = str(tf).strip().lower()
+    return int(tf[:-1]) * _TF_UNITS[tf[-1]]
+
+
+def strategy_timeframe(config: dict) -> str:
+    """Timeframe de la estrategia: `timeframe` arriba de todo o `strategy.timeframe`."""
+    config = config or {}
+    return str(config.get("timeframe") or (config.get("strategy") or {}).get("timeframe") or "2m")
+
+
+class CandleStore:
+    """Pirámide de velas por símbolo armada desde un solo timeframe base.
+
+    Guarda las últimas velas del timeframe base (ej. 1m) y mantiene los
+    timeframes derivados (2m/5m/15m/1h...) agregando solo la cola que cambió.
+    Cada timeframe tiene su propio largo (`depths`, default `depth`): las velas
+    derivadas quedan aunque sus velas base ya hayan salido del buffer, así un
+    1h llega a 200 velas sin guardar 12000 de 1m. La última vela puede estar
+    abierta: cada merge la reemplaza con la versión nueva. Si el hueco desde la
+    última vela supera el buffer (arranque, desconexión larga) se hace un fetch
+    completo y se reconstruye todo; `missing()` dice qué derivados quedaron
+    cortos para sembrarlos una vez con velas nativas (`seed`).
+    """
+
+    def __init__(self, base_tf: str = "1m", derived=(), depth: int = 200, depths: dict = None):
+        self.base_tf = base_tf
+        self.base_ms = tf_to_ms(base_tf)
+        depths = {str(k): int(v) for k, v in (depths or {}).items()}
+        self.derived = {tf: tf_to_ms(tf) for tf in list(derived) + list(depths) if tf != base_tf}
+        self.depths = {tf: max(2, depths.get(tf, int(depth))) for tf in self.derived}
+        # el base tiene que cubrir al menos un bucket entero del derivado más grande
+        widest = max((ms // self.base_ms for ms in self.derived.values()), default=1)
+        self.depth = max(2, int(depths.get(base_tf, depth)), widest + 1)
+        self._base = {}   # symbol -> deque[(ts, o, h, l, c, v)]
+        self._agg = {}    # (symbol, tf) -> deque[[bucket, o, h, l, c, v]]
+        self._seeded = set()
+
+    # --- fetch ---
+    def fetch_window(self, symbol, now_ms):
+        """(since, limit) para el próximo fetch; since=None => fetch completo."""
+        bars = self._base.get(symbol)
+        if not bars:
+            return None, self.depth
+        last_ts = bars[-1][0]
+        missing = int((now_ms - last_ts) // self.base_ms) + 1
+        if missing >= self.depth:
+            return None, self.depth
+        # +1: la vela abierta que ya teníamos vuelve a venir actualizada
+        return last_ts, missing + 1
+
+    def merge(self, symbol, rows, reset=False):
+        """Incorpora velas [ts, o, h, l, c, v]; devuelve cuántas velas nuevas entraron."""
+        rows = sorted((int(r[0]), float(r[1]), float(r[2]), float(r[3]), float(r[4]), float(r[5]))
+                      for r in rows or [])
+        bars = self._base.get(symbol)
+        if reset or bars is None:
+            if not rows and bars is not None:
+                return 0
+            self._rebuild(symbol, rows)
+            return len(self._base[symbol])
+
+        added = 0
+        dirty_from = None
+        for r in rows:
+            ts = r[0]
+            if not bars or ts > bars[-1][0]:
+                bars.append(r)
+                added += 1
+            elif ts == bars[-1][0]:
+                # la vela abierta vuelve actualizada
+                if bars[-1] == r:
+                    continue
+                bars[-1] = r
+            else:
+                # vela vieja fuera de orden (raro): reconstruir todo
+                merged = {b[0]: b for b in bars}
+                merged.update((x[0], x) for x in rows)
+                self._rebuild(symbol, sorted(merged.values()))
+                return added
+            if dirty_from is None:
+                dirty_from = ts
+        if dirty_from is not None:
+            self._rollup(symbol, dirty_from)
+        return added
+
+    def _rebuild(self, symbol, rows):
+        self._base[symbol] = deque(rows[-self.depth:], maxlen=self.depth)
+        for tf in self.derived:
+            self._agg[(symbol, tf)] = deque(maxlen=self.depths[tf])
+            self._seeded.discard((symbol, tf))
+        bars = self._base[symbol]
+        for tf, tf_ms in self.derived.items():
+            if bars:
+                self._agg[(symbol, tf)].extend(self._aggregate(bars, bars[0][0] - bars[0][0] % tf_ms, tf_ms))
+
+    # --- agregación ---
+    def _rollup(self, symbol, dirty_from):
+        """Re-agrega solo los buckets desde `dirty_from`.
+
+        Un bucket cuyo comienzo ya salió del buffer base no se toca (quedaría
+        incompleto): su valor agregado sigue siendo el bueno.
+        """
+        bars = self._base[symbol]
+        if not bars:
+            return
+        first_ts = bars[0][0]
+        for tf, tf_ms in self.derived.items():
+            agg = self._agg[(symbol, tf)]
+            start = dirty_from - dirty_from % tf_ms
+            if start < first_ts:
+                start += tf_ms
+            while agg and agg[-1][0] >= start:
+                agg.pop()
+            agg.extend(self._aggregate(bars, start, tf_ms))
+
+    def missing(self, symbol):
+        """Derivados con menos velas que su largo y todavía sin sembrar."""
+        return [tf for tf in self.derived
+                if (symbol, tf) not in self._seeded and len(self._agg.get((symbol, tf), ())) < self.depths[tf]]
+
+    def seed(self, symbol, tf, rows):
+        """Antepone velas nativas de `tf` (REST) anteriores a lo agregado desde el base.
+
+        El primer bucket agregado casi siempre arranca a mitad de camino (el
+        buffer base no empieza justo en el borde del tf): si viene la vela
+        nativa de ese bucket, la reemplaza.
+        """
+        self._seeded.add((symbol, tf))
+        agg = self._agg.get((symbol, tf))
+        if agg is None:
+            return 0
+        first = agg[0][0] if agg else None
+        old = sorted([int(r[0]), float(r[1]), float(r[2]), float(r[3]), float(r[4]), float(r[5])]
+                     for r in rows or [] if first is None or int(r[0]) <= first)
+        replaced = 0
+        if old and first is not None and old[-1][0] == first:
+            agg[0] = old.pop()
+            replaced = 1
+        if not old:
+            return replaced
+        room = self.depths[tf] - len(agg)
+        old = old[-room:] if room > 0 else []
+        agg.extendleft(reversed(old))
+        return len(old) + replaced
+
+    @staticmethod
+    def _aggregate(bars, start, tf_ms):
+        """Agrega a buckets de tf_ms las velas con ts >= start."""
+        sel = []
+        for bar in reversed(bars):
+            if bar[0] < start:
+                break
+            sel.append(bar)
+        sel.reverse()
+        out = []
+        for ts, o, h, l, c, v in sel:
+            bucket = ts - ts % tf_ms
+            if out and out[-1][0] == bucket:
+                cur = out[-1]
+                cur[2] = max(cur[2], h); cur[3] = min(cur[3], l); cur[4] = c; cur[5] += v
+            else:
+                out.append([bucket, o, h, l, c, v])
+        return out
+
+    # --- lectura ---
+    def bars(self, symbol, tf=None):
+        tf = tf or self.base_tf
+        if tf == self.base_tf:
+            return self._base.get(symbol, ())
+        return self._agg.get((symbol, tf), ())
+
+    def frame(self, symbol, tf=None) -> pd.DataFrame:
+        """DataFrame ['ts','open','high','low','close','volume'] con ts datetime (UTC naive)."""
+        df = pd.DataFrame(list(self.bars(symbol, tf)), columns=COLUMNS)
+        df['ts'] = pd.to_datetime(df['ts'], unit='ms')
+        return df
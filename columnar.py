@@ -0,0 +1,365 @@
+import os, glob, threading, time, atexit, logging, argparse
+from collections import OrderedDict
+import datetime as dt
+import pandas as pd
+
+from bot.storage.csv_store import iter_rows
+
+logger = logging.getLogger("columnar")
+
+# Historial columnar particionado por día UTC: <root>/<kind>/YYYY-MM-DD.<ext>
+# más chunks append-only YYYY-MM-DD.<n>.<ext> hasta que el día se compacta.
+# El ts se guarda como datetime64 UTC, así las lecturas no parsean texto y un
+# rango de fechas solo abre los archivos que caen adentro. Parquet si está
+# pyarrow; si no, pickle de pandas (sin dependencias extra).
+try:
+    import pyarrow  # noqa: F401
+    _EXT = ".parquet"
+except Exception:
+    _EXT = ".pkl"
+
+KINDS = ("trades", "equity", "decisions")
+
+
+def _dump(df, path):
+    if path.endswith(".parquet") or path.endswith(".parquet.tmp"):
+        df.to_parquet(path, index=False)
+    else:
+        df.to_pickle(path)
+
+
+def _write_frame(df, path):
+    tmp = path + ".tmp"
+    _dump(df, tmp)
+    os.replace(tmp, path)
+
+
+def _read_frame(path):
+    return pd.read_parquet(path) if path.endswith(".parquet") else pd.read_pickle(path)
+
+
+def _to_utc(ts):
+    """Serie de ts (ISO con/sin zona o epoch en segundos, mezclados) -> datetime64 UTC."""
+    num = pd.to_numeric(ts, errors="coerce")
+    is_num = num.notna()
+    if len(ts) and is_num.all():
+        return pd.to_datetime(num, unit="s", utc=True)
+    out = pd.to_datetime(ts.where(~is_num, "").astype(str), utc=True, format="ISO8601", errors="coerce")
+    if is_num.any():
+        out[is_num] = pd.to_datetime(num[is_num], unit="s", utc=True)
+    return out
+
+
+def normalize(rows) -> pd.DataFrame:
+    """Filas dict -> DataFrame con ts UTC y columnas numéricas convertidas."""
+    df = pd.DataFrame(list(rows))
+    if df.empty or "ts" not in df.columns:
+        return df
+    df["ts"] = _to_utc(df["ts"])
+    df = df[df["ts"].notna()]
+    for c in df.columns:
+        if c != "ts" and df[c].dtype == object:
+            num = pd.to_numeric(df[c], errors="coerce")
+            if num.notna().sum() == df[c].replace("", pd.NA).notna().sum():
+                df[c] = num
+    return df.reset_index(drop=True)
+
+
+def _utc(t):
+    if t is None:
+        return None
+    t = pd.Timestamp(t)
+    return t.tz_localize("UTC") if t.tzinfo is None else t.tz_convert("UTC")
+
+
+class ColumnarStore:
+    """Store columnar de trades/equity/decisions.
+
+    append()/extend() solo encolan la fila (sin pandas, lock corto). Un thread
+    writer baja lo pendiente cada `flush_interval` segundos como chunks nuevos
+    por día (<kind>/YYYY-MM-DD.<n>.ext): lo que ya está en disco no se reescribe.
+    Los chunks de días cerrados se compactan en la partición del día (el writer
+    lo hace al cambiar de día, o a mano con `python columnar.py --compact`).
+    read() combina particiones y chunks del rango con lo que todavía no se bajó.
+    Los archivos se cachean por mtime en un LRU de `cache_size` archivos.
+    """
+
+    def __init__(self, root, flush_interval=30.0, cache_size=64):
+        self.root = root
+        self.flush_interval = float(flush_interval)
+        self._lock = threading.RLock()
+        self._flush_lock = threading.Lock()
+        self._pending = {}    # kind -> [filas dict] sin bajar
+        self._inflight = {}   # kind -> [filas dict] que el writer está bajando
+        self._cache = OrderedDict()   # path -> (mtime, DataFrame), LRU
+        self.cache_size = int(cache_size)
+        self._thread = None
+        self._stop = threading.Event()
+        self._compacted = None
+        self.stats = {"rows": 0, "chunks": 0, "compacted": 0, "failed": 0}
+
+    def _dir(self, kind):
+        return os.path.join(self.root, kind)
+
+    def _path(self, kind, day):
+        return os.path.join(self._dir(kind), f"{day.isoformat()}{_EXT}")
+
+    def _chunk_path(self, kind, day):
+        return os.path.join(self._dir(kind), f"{day.isoformat()}.{time.time_ns()}{_EXT}")
+
+    def partitions(self, kind):
+        """[(date, ruta)] ordenadas; un día puede tener partición compactada y chunks."""
+        out = []
+        for p in glob.glob(os.path.join(glob.escape(self._dir(kind)), "*")):
+            name, ext = os.path.splitext(os.path.basename(p))
+            if ext not in (".parquet", ".pkl"):
+                continue
+            try:
+                out.append((dt.date.fromisoformat(name.split(".", 1)[0]), p))
+            except ValueError:
+                continue
+        return sorted(out)
+
+    def has_data(self, kind=None):
+        return any(self.partitions(k) for k in ((kind,) if kind else KINDS))
+
+    # sink de Ledger.load (migración) y de log_trade/persist_equity
+    def on_trade(self, row):
+        self.append("trades", row)
+
+    def on_equity(self, row):
+        self.append("equity", row)
+
+    # --- escritura ---
+    def append(self, kind, row):
+        with self._lock:
+            self._pending.setdefault(kind, []).append(row)
+        self._ensure_writer()
+
+    def extend(self, kind, rows):
+        rows = list(rows)
+        if not rows:
+            return
+        with self._lock:
+            self._pending.setdefault(kind, []).extend(rows)
+        self._ensure_writer()
+
+    def _ensure_writer(self):
+        if self._thread is None and not self._stop.is_set():
+            with self._lock:
+                if self._thread is None:
+                    self._thread = threading.Thread(target=self._run, name="columnar-writer", daemon=True)
+                    self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.flush_interval):
+            self.flush()
+            today = dt.datetime.utcnow().date()
+            if self._compacted != today:
+                self._compacted = today
+                try:
+                    self.compact(before=today)
+                except Exception as e:
+                    logger.warning("columnar compact failed: %s", e)
+
+    def flush(self):
+        """Baja lo pendiente como chunks nuevos (un archivo por kind y día)."""
+        with self._flush_lock:
+            with self._lock:
+                batches, self._pending = self._pending, {}
+                self._inflight = dict(batches)
+            for kind, rows in batches.items():
+                try:
+                    self._write_chunks(kind, rows)
+                except Exception as e:
+                    self.stats["failed"] += len(rows)
+                    logger.warning("columnar flush %s failed (%d filas): %s", kind, len(rows), e)
+                    with self._lock:
+                        self._inflight.pop(kind, None)
+
+    def _write_chunks(self, kind, rows):
+        df = normalize(rows)
+        staged = []
+        if not df.empty:
+            os.makedirs(self._dir(kind), exist_ok=True)
+            for day, part in df.groupby(df["ts"].dt.date, sort=True):
+                part = part.reset_index(drop=True)
+                path = self._chunk_path(kind, day)
+                _dump(part, path + ".tmp")
+                staged.append((path, part))
+        # rename + salida de inflight juntos: read() nunca ve la fila dos veces
+        with self._lock:
+            for path, part in staged:
+                os.replace(path + ".tmp", path)
+                self._cache_put(path, os.path.getmtime(path), part)
+            self._inflight.pop(kind, None)
+        self.stats["rows"] += len(rows)
+        self.stats["chunks"] += len(staged)
+
+    def compact(self, kinds=KINDS, before=None):
+        """Junta partición + chunks de cada día anterior a `before` (default: hoy UTC) en un solo archivo."""
+        before = before or dt.datetime.utcnow().date()
+        done = 0
+        for kind in kinds:
+            by_day = {}
+            for day, p in self.partitions(kind):
+                if day < before:
+                    by_day.setdefault(day, []).append(p)
+            for day, paths in by_day.items():
+                base = self._path(kind, day)
+                if paths == [base]:
+                    continue
+                frames = [f for f in (_read_frame(p) for p in paths) if not f.empty]
+                df = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame()
+                if not df.empty and "ts" in df.columns:
+                    df = df.sort_values("ts", kind="mergesort").reset_index(drop=True)
+                with self._lock:
+                    _write_frame(df, base)
+                    for p in paths:
+                        self._cache.pop(p, None)
+                        if p != base:
+                            os.remove(p)
+                done += 1
+        self.stats["compacted"] += done
+        return done
+
+    def close(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+    def write_partition(self, kind, day, df):
+        """Reemplaza la partición `day` (usado por la migración)."""
+        os.makedirs(self._dir(kind), exist_ok=True)
+        _write_frame(df.reset_index(drop=True), self._path(kind, day))
+
+    # --- lectura ---
+    def _cache_put(self, path, mtime, df):
+        with self._lock:
+            self._cache[path] = (mtime, df)
+            self._cache.move_to_end(path)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    def _load(self, path):
+        mtime = os.path.getmtime(path)
+        with self._lock:
+            hit = self._cache.get(path)
+            if hit and hit[0] == mtime:
+                self._cache.move_to_end(path)
+                return hit[1]
+        df = _read_frame(path)
+        self._cache_put(path, mtime, df)
+        return df
+
+    def read(self, kind, start=None, end=None, columns=None) -> pd.DataFrame:
+        """Filas de `kind` con start <= ts < end (UTC); solo abre los archivos de los días del rango."""
+        start, end = _utc(start), _utc(end)
+        d0 = start.date() if start is not None else None
+        d1 = end.date() if end is not None else None
+        for attempt in range(3):
+            with self._lock:
+                paths = [p for day, p in self.partitions(kind)
+                         if (d0 is None or day >= d0) and (d1 is None or day <= d1)]
+                pending = list(self._inflight.get(kind, ())) + list(self._pending.get(kind, ()))
+            try:
+                frames = [self._load(p) for p in paths]
+                break
+            except FileNotFoundError:
+                if attempt == 2:
+                    raise  # un compact borró chunks entre el listado y la lectura: se relista
+        if pending:
+            frames.append(normalize(pending))
+        frames = [f for f in frames if not f.empty]
+        if not frames:
+            return pd.DataFrame(columns=["ts"] + [c for c in (columns or []) if c != "ts"])
+        df = frames[0]
+        if len(frames) > 1:
+            df = pd.concat(frames, ignore_index=True).sort_values("ts", kind="mergesort")
+        mask = pd.Series(True, index=df.index)
+        if start is not None:
+            mask &= df["ts"] >= start
+        if end is not None:
+            mask &= df["ts"] < end
+        df = df[mask]
+        if columns:
+            df = df[[c for c in ["ts"] + [c for c in columns if c != "ts"] if c in df.columns]]
+        return df.reset_index(drop=True)
+
+    def last(self, kind, days, columns=None, now=None):
+        """Filas de los últimos `days` días."""
+        now = _utc(now) if now is not None else pd.Timestamp.now(tz="UTC")
+        return self.read(kind, now - pd.Timedelta(days=days), None, columns)
+
+
+def migrate_csv(csv_dir, root, kinds=KINDS, overwrite=False):
+    """Pasa trades/equity/decisions.csv (con sus segmentos) al store columnar. Devuelve filas por kind."""
+    store = ColumnarStore(root)
+    out = {}
+    for kind in kinds:
+        if store.partitions(kind) and not overwrite:
+            out[kind] = 0
+            continue
+        df = normalize(iter_rows(csv_dir, f"{kind}.csv"))
+        if df.empty:
+            out[kind] = 0
+            continue
+        for day, part in df.groupby(df["ts"].dt.date, sort=True):
+            store.write_partition(kind, day, part)
+        out[kind] = int(len(df))
+        logger.info("columnar: migradas %d filas de %s.csv", len(df), kind)
+    return out
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def columnar_dir(config) -> str:
+    st = (config or {}).get("storage", {})
+    return st.get("columnar_dir") or os.path.join(st.get("csv_dir", "data"), "columnar")
+
+
+def get_columnar(root, csv_dir=None, kinds=KINDS) -> ColumnarStore:
+    """Store compartido por root. Si está vacío y hay CSVs en `csv_dir`, migra `kinds` la primera vez.
+
+    El engine migra solo decisions por acá: trades/equity le llegan del Ledger.load.
+    """
+    with _stores_lock:
+        st = _stores.get(root)
+        if st is None:
+            if csv_dir and kinds and not any(os.path.isdir(os.path.join(root, k)) for k in KINDS):
+                try:
+                    migrate_csv(csv_dir, root, kinds)
+                except Exception as e:
+                    logger.warning("columnar migration from %s failed: %s", csv_dir, e)
+            st = _stores[root] = ColumnarStore(root)
+        return st
+
+
+@atexit.register
+def _flush_all():
+    for st in list(_stores.values()):
+        try:
+            st.close()
+        except Exception:
+            pass
+
+
+def main():
+    p = argparse.ArgumentParser(description="Migra los CSV de historial al store columnar")
+    p.add_argument("csv_dir", nargs="?", default="data")
+    p.add_argument("--out", default=None, help="directorio destino (default <csv_dir>/columnar)")
+    p.add_argument("--overwrite", action="store_true")
+    p.add_argument("--compact", action="store_true", help="solo compacta los chunks de días cerrados")
+    args = p.parse_args()
+    root = args.out or os.path.join(args.csv_dir, "columnar")
+    if args.compact:
+        print(ColumnarStore(root).compact())
+        return
+    print(migrate_csv(args.csv_dir, root, overwrite=args.overwrite))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,155 @@
-import csv, os
-
-def _ensure_header(path, fieldnames):
-    """Upgrade header to union of old+new fields, preserving rows."""
-    fields = list(fieldnames or [])
-    if not os.path.exists(path):
-        os.makedirs(os.path.dirname(path), exist_ok=True)
-        with open(path, "w", newline="", encoding="utf-8") as f:
-            w = csv.DictWriter(f, fieldnames=fields)
-            w.writeheader()
-        return fields
-    rows = []
-    old = []
-    with open(path, newline="", encoding="utf-8") as f:
-        r = csv.DictReader(f)
-        old = list(r.fieldnames or [])
-        for row in r:
-            rows.append(row)
-    seen = set()
-    new = []
-    for k in (old or []) + fields:
-        if k and k not in seen:
-            seen.add(k); new.append(k)
-    if new != old:
-        with open(path, "w", newline="", encoding="utf-8") as f:
-            w = csv.DictWriter(f, fieldnames=new)
-            w.writeheader()
-            for r in rows:
-                w.writerow({k: r.get(k, "") for k in new})
-    return new
+import csv, os, glob, re, atexit, threading
+
+# Escritura append-only: un handle abierto por archivo con el header cacheado.
+# Si llega una columna nueva no se reescribe el archivo: el actual pasa a ser un
+# segmento archivado (trades.1.csv, trades.2.csv, ...) y se abre uno nuevo con el
+# header ampliado. iter_rows() lee los segmentos en orden + el actual.
+# trades.csv se baja en cada fila (poco volumen y es la historia que se relee al
+# arrancar). equity/decisions quedan en el buffer (BUFFER_BYTES) y un thread las
+# baja cada FLUSH_INTERVAL_S; también al rotar, al cerrar y en flush_all().
+BUFFER_BYTES = 64 * 1024
+FLUSH_INTERVAL_S = 1.0
+FLUSH_EACH_ROW = ("trades.csv",)
+
+
+class _SegmentWriter:
+    def __init__(self, path, flush_each=False):
+        self.path = path
+        self.flush_each = flush_each
+        self.f = None
+        self.header = []
+        self.writer = None
+        self._open()
+
+    def _open(self, header=None):
+        d = os.path.dirname(self.path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        if header is None and os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, newline="", encoding="utf-8") as f:
+                self.header = next(csv.reader(f), [])
+            self.f = open(self.path, "a", newline="", encoding="utf-8", buffering=BUFFER_BYTES)
+        else:
+            self.header = list(header or [])
+            self.f = open(self.path, "w", newline="", encoding="utf-8", buffering=BUFFER_BYTES)
+            if self.header:
+                csv.writer(self.f).writerow(self.header)
+        self.writer = csv.DictWriter(self.f, fieldnames=self.header, restval="", extrasaction="ignore")
+
+    def _rotate(self, fields):
+        """Archiva el segmento actual y abre uno nuevo con header = viejo + columnas nuevas."""
+        header = self.header + [k for k in fields if k and k not in self.header]
+        self.f.close()
+        if self.header:
+            os.replace(self.path, _segment_path(self.path, _next_segment(self.path)))
+        self._open(header)
+
+    def append(self, row):
+        if not os.path.exists(self.path):
+            # lo borraron/movieron desde afuera: reabrir
+            self.f.close()
+            self._open(self.header)
+        if any(k not in self.header for k in row):
+            self._rotate(list(row.keys()))
+        self.writer.writerow(row)
+        if self.flush_each:
+            self.flush()
+
+    def flush(self):
+        if self.f and not self.f.closed:
+            self.f.flush()
+
+    def close(self):
+        if self.f and not self.f.closed:
+            self.f.close()
+
+
+def _segment_path(path, n):
+    base, ext = os.path.splitext(path)
+    return f"{base}.{n}{ext}"
+
+
+def _segments(path):
+    """[(n, ruta)] de los segmentos archivados de `path`, ordenados."""
+    base, ext = os.path.splitext(path)
+    pat = re.compile(re.escape(os.path.basename(base)) + r"\.(\d+)" + re.escape(ext) + "$")
+    out = []
+    for p in glob.glob(f"{glob.escape(base)}.*{ext}"):
+        m = pat.match(os.path.basename(p))
+        if m:
+            out.append((int(m.group(1)), p))
+    return sorted(out)
+
+
+def _next_segment(path):
+    segs = _segments(path)
+    return segs[-1][0] + 1 if segs else 1
+
+
+_writers = {}
+_lock = threading.Lock()
+_flusher = None
+_stop = threading.Event()
+
+
+def _run_flusher():
+    while not _stop.wait(FLUSH_INTERVAL_S):
+        try:
+            flush_all()
+        except Exception:
+            pass
+
+
+def _ensure_flusher():
+    global _flusher
+    if _flusher is None and not _stop.is_set():
+        _flusher = threading.Thread(target=_run_flusher, name="csv-flusher", daemon=True)
+        _flusher.start()
+
 
 def _append(csv_dir, filename, row):
     path = os.path.join(csv_dir, filename)
-    header = _ensure_header(path, list(row.keys()))
-    with open(path, "a", newline="", encoding="utf-8") as f:
-        w = csv.DictWriter(f, fieldnames=header)
-        w.writerow({k: row.get(k, "") for k in header})
+    with _lock:
+        w = _writers.get(path)
+        if w is None:
+            w = _writers[path] = _SegmentWriter(path, flush_each=filename in FLUSH_EACH_ROW)
+            if not w.flush_each:
+                _ensure_flusher()
+        w.append(row)
+
+
+def flush_all():
+    """Baja el buffer de todos los writers abiertos (thread periódico y handler de SIGTERM)."""
+    with _lock:
+        for w in _writers.values():
+            w.flush()
+
+
+def iter_rows(csv_dir, filename):
+    """Filas (dict) de todos los segmentos de `filename` en orden cronológico."""
+    path = os.path.join(csv_dir, filename)
+    with _lock:
+        w = _writers.get(path)
+        if w is not None:
+            w.flush()  # lo que sigue en el buffer del writer también cuenta
+    for p in [p for _, p in _segments(path)] + ([path] if os.path.exists(path) else []):
+        with open(p, newline="", encoding="utf-8") as f:
+            yield from csv.DictReader(f)
+
+
+@atexit.register
+def close_all():
+    global _flusher
+    _stop.set()
+    if _flusher is not None:
+        _flusher.join()
+        _flusher = None
+    _stop.clear()
+    with _lock:
+        for w in _writers.values():
+            w.close()
+        _writers.clear()
+
 
 def append_trade_csv(csv_dir, row): _append(csv_dir, "trades.csv", row)
 def append_equity_csv(csv_dir, row): _append(csv_dir, "equity.csv", row)
@@ -0,0 +1,225 @@
+import csv, os, json, threading, queue, time, atexit, logging, datetime as dt
+from collections import deque, Counter
+
+from bot.storage.csv_store import _segment_path, _next_segment, _segments
+
+logger = logging.getLogger("decision_journal")
+
+# Columnas fijas: lo variable (extra) va como JSON en una sola columna.
+SCHEMA = ("ts", "iso", "symbol", "reason", "detail", "extra")
+_STOP = object()
+
+
+class DecisionJournal:
+    """Motivos de no-entrada: ring buffer en memoria + CSV de esquema fijo.
+
+    record() solo arma una tupla, la deja en el ring, suma el contador del motivo
+    y la encola; un thread aparte baja los lotes a `decisions.csv` y, al pasar
+    `segment_bytes`, archiva el segmento (decisions.1.csv, ... como csv_store)
+    y abre otro. Si el CSV existente tiene otro header (formato viejo) se archiva
+    tal cual y se empieza uno nuevo. `recent()` y `counts` leen solo de memoria.
+    """
+
+    def __init__(self, csv_dir, ring_size=500, flush_interval=2.0, batch_size=512,
+                 segment_bytes=5_000_000, columnar=None):
+        self.path = os.path.join(csv_dir, "decisions.csv") if csv_dir else None
+        self.flush_interval = float(flush_interval)
+        self.batch_size = int(batch_size)
+        self.segment_bytes = int(segment_bytes)
+        self.columnar = columnar
+        self.ring = deque(maxlen=int(ring_size))
+        self.counts = Counter()
+        self.stats = {"recorded": 0, "written": 0, "segments": 0, "failed": 0}
+        self._q = queue.Queue()
+        self._closed = False
+        self._f = None
+        if self.path:
+            self._open()
+            self._preload()
+            self._thread = threading.Thread(target=self._run, name="decision-journal", daemon=True)
+            self._thread.start()
+        else:
+            self._thread = None
+
+    # --- hot path ---
+    def record(self, symbol, reason, detail="", extra=None, ts=None):
+        ts = time.time() if ts is None else ts
+        row = (ts, symbol, reason, detail or "", extra if isinstance(extra, dict) and extra else None)
+        self.ring.append(row)
+        self.counts[reason] += 1
+        self.stats["recorded"] += 1
+        if self._thread is not None and not self._closed:
+            self._q.put(row)
+
+    # --- lectura (memoria) ---
+    @staticmethod
+    def as_dict(row):
+        ts, symbol, reason, detail, extra = row
+        d = {"ts": ts, "iso": _iso(ts), "symbol": symbol, "reason": reason, "detail": detail}
+        for k, v in (extra or {}).items():
+            d[f"extra_{k}"] = v
+        return d
+
+    def recent(self, n=10, exclude=("opened",)):
+        out = []
+        for row in reversed(self.ring):
+            if row[2] in exclude:
+                continue
+            out.append(self.as_dict(row))
+            if len(out) >= n:
+                break
+        return out[::-1]
+
+    def top_reasons(self, n=10):
+        return self.counts.most_common(n)
+
+    # --- escritura ---
+    def _open(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        if os.path.exists(self.path) and os.path.getsize(self.path) > 0:
+            with open(self.path, newline="", encoding="utf-8") as f:
+                header = tuple(next(csv.reader(f), []))
+            if header != SCHEMA:
+                os.replace(self.path, _segment_path(self.path, _next_segment(self.path)))
+                self.stats["segments"] += 1
+        new = not os.path.exists(self.path)
+        self._f = open(self.path, "a", newline="", encoding="utf-8")
+        self._w = csv.writer(self._f)
+        if new:
+            self._w.writerow(SCHEMA)
+            self._f.flush()
+
+    def _preload(self):
+        """Llena el ring con las últimas filas (segmento actual y, si hace falta, el anterior)."""
+        segs = [p for _, p in _segments(self.path)][-1:] + [self.path]
+        for p in segs:
+            try:
+                with open(p, newline="", encoding="utf-8") as f:
+                    r = csv.reader(f)
+                    if tuple(next(r, [])) != SCHEMA:
+                        continue
+                    for row in deque(r, maxlen=self.ring.maxlen):
+                        self.ring.append(_parse(row))
+            except Exception as e:
+                logger.warning("decision journal preload %s failed: %s", p, e)
+
+    def _rotate(self):
+        self._f.close()
+        os.replace(self.path, _segment_path(self.path, _next_segment(self.path)))
+        self.stats["segments"] += 1
+        self._open()
+
+    def _run(self):
+        while True:
+            item = self._q.get()
+            if item is _STOP:
+                self._q.task_done()
+                return
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    nxt = self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+            self._write(batch)
+            for _ in batch:
+                self._q.task_done()
+            if stop:
+                self._q.task_done()
+                return
+
+    def _write(self, batch):
+        try:
+            if not os.path.exists(self.path):
+                # lo borraron/movieron desde afuera: reabrir
+                self._f.close()
+                self._open()
+            for ts, symbol, reason, detail, extra in batch:
+                self._w.writerow((ts, _iso(ts), symbol, reason, detail,
+                                  json.dumps(extra, default=str, separators=(",", ":")) if extra else ""))
+            self._f.flush()
+            self.stats["written"] += len(batch)
+            if self.segment_bytes and self._f.tell() >= self.segment_bytes:
+                self._rotate()
+        except Exception as e:
+            self.stats["failed"] += len(batch)
+            logger.warning("decision journal write failed (%d filas): %s", len(batch), e)
+        if self.columnar is not None:
+            # el lote entero de una vez: el columnar lo baja en su propio writer
+            rows = []
+            for row in batch:
+                d = self.as_dict(row[:4] + (None,))
+                d["extra"] = json.dumps(row[4], default=str) if row[4] else ""
+                rows.append(d)
+            try:
+                self.columnar.extend("decisions", rows)
+            except Exception as e:
+                logger.warning("decision journal columnar extend failed: %s", e)
+
+    def flush(self):
+        """Espera a que el writer haya bajado todo lo encolado."""
+        if self._thread is not None and not self._closed:
+            self._q.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        if self._thread is not None:
+            self._q.put(_STOP)
+            self._thread.join()
+            self._f.close()
+
+
+def _iso(ts):
+    try:
+        return dt.datetime.utcfromtimestamp(float(ts)).isoformat() + "Z"
+    except Exception:
+        return ""
+
+
+def _parse(r):
+    r = list(r) + [""] * (len(SCHEMA) - len(r))
+    try:
+        ts = float(r[0])
+    except ValueError:
+        ts = 0.0
+    try:
+        extra = json.loads(r[5]) if r[5] else None
+    except ValueError:
+        extra = None
+    return (ts, r[2], r[3], r[4], extra)
+
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_decision_journal(csv_dir, conf: dict = None, columnar=None) -> DecisionJournal:
+    """Journal compartido por csv_dir (un writer por archivo)."""
+    conf = conf or {}
+    with _journals_lock:
+        j = _journals.get(csv_dir)
+        if j is None or j._closed:
+            j = _journals[csv_dir] = DecisionJournal(
+                csv_dir, ring_size=int(conf.get("ring_size", 500)),
+                flush_interval=float(conf.get("flush_interval_s", 2.0)),
+                segment_bytes=int(float(conf.get("segment_mb", 5)) * 1_000_000),
+                columnar=columnar)
+        return j
+
+
+@atexit.register
+def _close_all():
+    for j in list(_journals.values()):
+        try:
+            j.close()
+        except Exception:
+            pass
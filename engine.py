@@ -1,16 +1,28 @@
-import asyncio, logging, time, datetime as dt, math, random, json, os
+import asyncio, atexit, logging, signal, time, datetime as dt, math, random, json, os
 import pandas as pd
 import ccxt.async_support as ccxt
 from bot.core.indicators import compute_indicators
-from bot.core.strategy import generate_signal
+from bot.core.strategy import signal_from_row
+from bot.core.candle_store import CandleStore, strategy_timeframe, tf_to_ms
+from bot.core.indicator_state import IndicatorState
+from bot.core.scheduler import BarClock
 from bot.risk.trailing import compute_trailing_stop
-from bot.risk.guards import Limits, can_open, portfolio_caps_ok
+from bot.risk.guards import Limits, can_open
 from bot.exchanges.paper import PaperExchange
 from bot.exchanges.real import RealExchange
-from bot.storage.csv_store import append_trade_csv, append_equity_csv
-from bot.storage.sqlite_store import ensure_db, insert_trade, insert_equity
+from bot.storage.csv_store import append_trade_csv, append_equity_csv, flush_all as flush_csv
+from bot.storage.sqlite_store import get_store
+from bot.storage.ledger import Ledger
+from bot.storage.columnar import get_columnar, columnar_dir
+from bot.storage.read_model import ReadModel
+from bot.storage.decision_journal import get_decision_journal
 from bot.trader import Trader
+from bot.lot_book import Positions, normalize_lot
 from bot.telemetry.notifier import Notifier
+from bot.exchanges.ws_feed import MarketFeed, DEFAULT_URL as WS_DEFAULT_URL
+from bot.risk.exit_manager import ExitManager
+from bot.risk.exposure import ExposureAggregator
+from bot.exchanges.funding_cache import FundingCache, next_grid_ts
 
 
 def _normalize_position_like(pos):
@@ -65,10 +77,7 @@ TELEGRAM_CHAT_ID = os.getenv("TELEGRAM_CHAT_ID")
 
 
 
-try:
-    from bot.state import load_state as ext_load_state, save_state as ext_save_state
-except Exception:
-    ext_load_state = ext_save_state = None
+from bot.state import StatePersister
 
 logger = logging.getLogger("engine")
 
@@ -90,42 +99,11 @@ class TradingApp:
             return False
 
     def _normalize_pos(self, pos):
-        if isinstance(pos, str):
-            s = pos.strip()
-            if s and s[0] in "{[":
-                try:
-                    pos = json.loads(s)
-                except Exception:
-                    return None
-            else:
-                return None
-        if not isinstance(pos, dict):
-            return None
-        for k in ("qty", "entry", "sl", "tp1", "tp2", "realized_pnl", "lev", "entry_adx", "leg"):
-            if k in pos and pos[k] is not None:
-                try:
-                    if k in ("lev", "leg"):
-                        pos[k] = int(pos[k])
-                    else:
-                        pos[k] = float(pos[k])
-                except Exception:
-                    pass
-        if "side" in pos and not isinstance(pos["side"], str):
-            try:
-                pos["side"] = pos["side"].decode("utf-8", "ignore")
-            except Exception:
-                pos["side"] = str(pos["side"])
-        return pos
+        return normalize_lot(pos)
 
-    def total_margin_used(self, price_by_symbol):
-        total = 0.0
-        for sym, lots in self.trader.state.positions.items():
-            price = price_by_symbol.get(sym) or self.price_cache.get(sym) or 0.0
-            if price <= 0:
-                continue
-            for L in lots:
-                total += abs(price * L['qty']) / max(L.get('lev', 1), 1)
-        return total
+    def total_margin_used(self, price_by_symbol=None):
+        """Margen usado al último precio conocido (los precios llegan por exposure.on_price)."""
+        return self.exposure.margin
 
     def available_margin_usd(self, equity, price_by_symbol):
         used = self.total_margin_used(price_by_symbol)
@@ -138,8 +116,14 @@ class TradingApp:
     def __init__(self, config: dict):
         self.cfg = config
         self.symbols = config.get("symbols", ["BTC/USDT:USDT", "ETH/USDT:USDT"])
-        self.timeframe = config.get("timeframe", "2m")
+        self.timeframe = strategy_timeframe(config)
         self.loop_seconds = int(config.get("loop_seconds", 120))
+        # velas en memoria: un solo stream base (1m) y los demás timeframes agregados desde él
+        cd_conf = config.get("candles", {})
+        self.base_timeframe = str(cd_conf.get("base_timeframe", "1m"))
+        self.candles = CandleStore(self.base_timeframe,
+                                   derived=(self.timeframe,) + tuple(cd_conf.get("timeframes") or ()),
+                                   depth=int(cd_conf.get("depth", 200)), depths=cd_conf.get("depths"))
         ex_cfg = config.get("exchange", {})
 
         # Build CCXT client con defaults seguros
@@ -163,10 +147,15 @@ class TradingApp:
         self.fees = config.get("fees", {"taker": 0.0002, "maker": 0.0002})
         self.paper = PaperExchange(self.fees, slippage_bps=int(config.get("paper", {}).get("slippage_bps", 5)))
         self.trader = Trader(self.fees, equity0=1000.0)
+        # lotes compactos con agregados por símbolo (exposición/margen en O(1))
+        self.trader.state.positions = Positions(self.trader.state.positions)
+        # notional/margen/clusters incrementales para el gate de riesgo
+        self.exposure = ExposureAggregator(config.get("correlation_guard", {}).get("clusters") or [])
+        self.exposure.attach(self.trader.state.positions)
 
         self.csv_dir = config.get("storage", {}).get("csv_dir", "data")
         self.sqlite_path = config.get("storage", {}).get("sqlite_path", "data/bot.sqlite")
-        ensure_db(self.sqlite_path)
+        self._open_storage(config)
 
         lim = config.get("limits", {})
         self.limits = Limits(max_total_positions=int(lim.get("max_total_positions", 6)),
@@ -178,14 +167,38 @@ class TradingApp:
         self.leverage_conf = config.get("leverage", {"min": 1, "max": 15, "default": 5})
         self.filters = config.get("filters", {})
         self.strategy_conf = config.get("strategy", {})
+        # indicadores incrementales por símbolo (O(1) por vela) en vez de recalcular 200 filas
+        self.incremental_indicators = bool(config.get("indicators", {}).get("incremental", True))
+        # fixed (default): el sleep de loop_seconds de siempre (evalúa la vela abierta);
+        # bar_close: se despierta al cierre de cada vela y evalúa solo velas cerradas nuevas
+        sc = config.get("scheduler", {})
+        self.bar_clock = BarClock(self.timeframe, float(sc.get("grace_s", 2.0))) \
+            if str(sc.get("mode", "fixed")).lower() == "bar_close" else None
+        self.bar_retry_s = float(sc.get("retry_s", 1.0))
+        self.bar_retries = int(sc.get("retries", 3))
+        self._ind_states = {}
         self.portfolio_caps = config.get("portfolio_caps", {})
         self.funding_guard = config.get("funding_guard", {"enabled": True, "annualized_bps_limit": 5000})
         self.circuit_breakers = config.get("circuit_breakers", {})
         self.mode = config.get("mode", "paper").lower()
         self.price_cache = {}
+        # etapa de fetch concurrente: máximo de símbolos pidiendo REST a la vez
+        self.fetch_concurrency = max(1, int(config.get("fetch_concurrency", 8)))
+        self._fetch_sem = asyncio.Semaphore(self.fetch_concurrency)
         self.allow_new_entries = True
-        self.notifier = Notifier()
+        self.notifier = Notifier(config.get("telegram", {}))
+        # market data por websocket (velas + mark price + funding); None => solo REST
+        self.ws_conf = config.get("ws_feed", {})
+        self.feed = None
+        # salidas por precio, con locks por símbolo compartidos con las entradas
+        self.exits = ExitManager(self, config.get("exit_manager", {}))
+        self.funding_cache = None
         self._loaded_state = False
+        # state.json con escrituras agrupadas + rename atómico (journal opcional para eventos críticos)
+        st_conf = config.get("state", {})
+        self.persister = StatePersister(self.STATE_FILE, self._serialize_state,
+                                        max_writes_per_s=float(st_conf.get("max_writes_per_s", 1.0)),
+                                        journal=bool(st_conf.get("journal", False)))
 
         self.exchange = self.paper if self.mode == 'paper' else RealExchange(self.ccxt, self.fees)
         self.trailing_conf = self.cfg.get('trailing', {'enabled': True, 'mode': 'atr', 'atr_k': 2.0, 'ema_key': 'ema_fast', 'ema_k': 1.0, 'percent': 0.6, 'min_step_atr': 0.5})
@@ -202,35 +215,171 @@ class TradingApp:
         self._last_alert_check = 0.0
         self._alert_sent = {}
 
+    def _open_storage(self, config):
+        """DB, ledger, historial columnar, read model y journal de decisiones.
+
+        Las subclases que no persisten nada (replay/optimizador) lo reemplazan
+        por objetos en memoria para no abrir stores ni levantar writers.
+        """
+        # conexión persistente + writer en background (no bloquea el loop)
+        self.db = get_store(self.sqlite_path)
+        # historial columnar por día para reportes/consultas
+        self.columnar = get_columnar(columnar_dir(config), self.csv_dir, kinds=("decisions",))
+        # agregados precalculados para los comandos de Telegram
+        self.read_model = ReadModel()
+        # agregados de trades/equity en memoria: única lectura de los CSV al arrancar; cada
+        # fila va también al read model y, si el columnar está vacío, lo migra
+        sinks = [self.read_model]
+        if not (self.columnar.has_data("trades") or self.columnar.has_data("equity")):
+            sinks.append(self.columnar)
+        self.ledger = Ledger().load(self.csv_dir, sinks=sinks)
+        # motivos de no-entrada: ring en memoria + CSV de esquema fijo escrito en background
+        self.decisions = get_decision_journal(self.csv_dir, config.get("decisions", {}), columnar=self.columnar)
+
+    async def refresh_candles(self, symbol):
+        """Pide a REST solo las velas desde la última guardada y las suma al buffer."""
+        since, limit = self.candles.fetch_window(symbol, int(self._now() * 1000))
+        if since is not None and limit <= 2 and self.feed is not None and self.feed.healthy(symbol):
+            return  # el websocket ya tiene el buffer al día
+        data = await self.with_retry(self.ccxt.fetch_ohlcv, symbol, timeframe=self.base_timeframe,
+                                     since=since, limit=limit)
+        self.candles.merge(symbol, data, reset=since is None)
+        # tras un fetch completo, historia vieja de los derivados con velas nativas (una vez)
+        for tf in self.candles.missing(symbol):
+            try:
+                rows = await self.with_retry(self.ccxt.fetch_ohlcv, symbol, timeframe=tf,
+                                             limit=self.candles.depths[tf])
+                self.candles.seed(symbol, tf, rows)
+            except Exception as e:
+                self.candles.seed(symbol, tf, [])
+                logger.warning("seed %s %s failed: %s", symbol, tf, e)
+
+    def candle_frame(self, symbol, tf=None):
+        """Velas de cualquier timeframe de la pirámide (sin REST ni resample)."""
+        return self.candles.frame(symbol, tf or self.timeframe)
+
     async def fetch_ohlcv_2m(self, symbol):
-        tf = self.timeframe
-        if tf == "2m":
-            data = await self.with_retry(self.ccxt.fetch_ohlcv, symbol, timeframe="1m", limit=200)
-            df = pd.DataFrame(data, columns=["ts", "open", "high", "low", "close", "volume"])
-            df['ts'] = pd.to_datetime(df['ts'], unit='ms')
-            df = df.set_index('ts').resample('2min').agg({
-                'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'
-            }).dropna().reset_index()
-            return df
-        else:
-            data = await self.with_retry(self.ccxt.fetch_ohlcv, symbol, timeframe=tf, limit=200)
-            df = pd.DataFrame(data, columns=["ts", "open", "high", "low", "close", "volume"])
-            df['ts'] = pd.to_datetime(df['ts'], unit='ms')
-            return df
+        await self.refresh_candles(symbol)
+        return self.candles.frame(symbol, self.timeframe)
+
+    def _now(self):
+        """Reloj del motor (epoch s); el replay lo reemplaza por el tiempo simulado."""
+        return time.time()
+
+    def _indicator_conf(self):
+        return {**self.filters, **self.strategy_conf, **self.cfg.get("indicators", {})}
 
     async def fetch_last_price(self, symbol):
+        p = self.feed.price(symbol) if self.feed is not None else None
+        if p:
+            return float(p)
         t = await self.with_retry(self.ccxt.fetch_ticker, symbol)
         return float(t['last'])
 
     async def funding_rate_bps_annualized(self, symbol):
+        if self.feed is not None:
+            bps = self.feed.funding_bps(symbol)
+            if bps is not None:
+                return bps
         try:
-            fr = await self.with_retry(self.ccxt.fetch_funding_rate, symbol)
-            rate = float(fr.get('fundingRate', 0.0))
-            annualized = rate * 3 * 24 * 365 * 10000.0  # bps
-            return annualized
+            fc = self._funding()
+            await fc.ensure(self._now())
+            bps = fc.bps(symbol)
+            return bps if bps is not None else 0.0
         except Exception:
             return 0.0
 
+    def _funding(self):
+        """Cache de funding (un fetch_funding_rates para todos, refresco según la liquidación)."""
+        if self.funding_cache is None or self.funding_cache.ccxt is not self.ccxt:
+            self.funding_cache = FundingCache(self.ccxt, self.symbols, self.cfg.get("funding_cache", {}),
+                                              with_retry=self.with_retry)
+        return self.funding_cache
+
+    def _next_funding_ts(self, symbol, now_ts):
+        """Próxima liquidación de funding informada por el exchange (ws o REST); grilla de 8h si no hay dato."""
+        nxt = self.feed.next_funding_ts(symbol) if self.feed is not None else None
+        if nxt and nxt > now_ts:
+            return nxt
+        if self.funding_cache is not None:
+            return self.funding_cache.next_funding(symbol, now_ts)
+        return next_grid_ts(now_ts)
+
+    def _funding_needed(self):
+        fw = self.cfg.get('funding_window', {})
+        return bool(fw.get('enabled', True)) or bool(self.funding_guard.get("enabled", False))
+
+    async def _fetch_symbol_inputs(self, symbol):
+        """Etapa concurrente por símbolo: OHLCV + funding en paralelo, luego indicadores y señal."""
+        fetch = self.refresh_candles if self.incremental_indicators else self.fetch_ohlcv_2m
+        async with self._fetch_sem:
+            if self._funding_needed():
+                df, fr_bps = await asyncio.gather(fetch(symbol), self.funding_rate_bps_annualized(symbol))
+            else:
+                df, fr_bps = await fetch(symbol), None
+        bars = self.candles.bars(symbol, self.timeframe)
+        if self.bar_clock is not None:
+            # los reintentos duermen fuera del semáforo: un símbolo atrasado no retiene un slot
+            bars = await self._closed_bars(symbol, fetch)
+            if not bars or not self.bar_clock.fresh(symbol, bars[-1][0]):
+                return None    # sin vela cerrada nueva: no se recalcula nada
+            if df is not None:
+                df = self.candles.frame(symbol, self.timeframe).iloc[:len(bars)]
+        if self.incremental_indicators:
+            st = self._ind_states.get(symbol)
+            if st is None:
+                st = self._ind_states[symbol] = IndicatorState(self._indicator_conf())
+            last = st.sync(bars)
+            if not IndicatorState.ready(last):
+                return None
+        else:
+            ind = compute_indicators(df, self._indicator_conf())
+            if ind.empty:
+                return None
+            last = ind.iloc[-1]
+        sig = signal_from_row(last, {**self.filters, **self.strategy_conf})
+        if self.bar_clock is not None:
+            # recién ahora la vela cuenta como evaluada: si fallaron los indicadores se reintenta
+            self.bar_clock.mark(symbol, bars[-1][0])
+        return last, sig, fr_bps
+
+    async def _closed_bars(self, symbol, fetch):
+        """Velas cerradas del timeframe hasta el último cierre; reintenta si el exchange viene atrasado."""
+        close_ms = int(self.bar_clock.last_close(self._now()) * 1000)
+        tf_ms = tf_to_ms(self.timeframe)
+        for _ in range(self.bar_retries):
+            base = self.candles.bars(symbol)
+            lag = close_ms - (base[-1][0] + self.candles.base_ms) if base else None
+            # solo se espera si falta la vela que acaba de cerrar (no si el dato viene viejo)
+            if lag is None or lag <= 0 or lag > tf_ms:
+                break
+            await asyncio.sleep(self.bar_retry_s)
+            async with self._fetch_sem:
+                await fetch(symbol)
+        bars = list(self.candles.bars(symbol, self.timeframe))
+        while bars and bars[-1][0] + tf_ms > close_ms:
+            bars.pop()
+        return bars
+
+    async def fetch_all_symbols(self):
+        """Trae y evalúa todos los símbolos en paralelo (acotado por fetch_concurrency).
+
+        Devuelve {symbol: (last_row, sig, fr_bps)}; los símbolos que fallan o que todavía
+        no tienen historia suficiente para los indicadores se omiten.
+        """
+        results = await asyncio.gather(*(self._fetch_symbol_inputs(sym) for sym in self.symbols),
+                                       return_exceptions=True)
+        out = {}
+        for sym, res in zip(self.symbols, results):
+            if isinstance(res, Exception):
+                logger.warning("fetch %s failed: %s", sym, res)
+                continue
+            if res is None:
+                logger.debug("indicadores sin warm-up para %s", sym)
+                continue
+            out[sym] = res
+        return out
+
     def _choose_leverage_and_pct(self, last_row: dict, regime: str):
         min_lev = int(self.leverage_conf.get("min", 1))
         max_lev = int(self.leverage_conf.get("max", 15))
@@ -383,49 +532,26 @@ class TradingApp:
         return {
             "killswitch": bool(self.trader.state.killswitch),
             "last_entry_ts_by_symbol": self.trader.state.last_entry_ts_by_symbol,
-            "positions": {
-                sym: [dict(side=L['side'], qty=L['qty'], entry=L['entry'], lev=L['lev'],
-                           sl=L['sl'], tp1=L['tp1'], tp2=L['tp2'],
-                           realized_pnl=L.get('realized_pnl', 0.0),
-                           trailing_anchor=L.get('trailing_anchor', L['entry']),
-                           entry_adx=L.get('entry_adx', 0.0),
-                           leg=L.get('leg', 1)) for L in lots]
-                for sym, lots in self.trader.state.positions.items()
-            }
+            "positions": self.trader.state.positions.to_state(),
         }
 
     def _restore_state(self, snap):
         try:
             self.trader.state.killswitch = bool(snap.get("killswitch", False))
             self.trader.state.last_entry_ts_by_symbol = dict(snap.get("last_entry_ts_by_symbol", {}))
-            self.trader.state.positions.clear()
-            for sym, lots in snap.get("positions", {}).items():
-                arr = []
-                for L in lots:
-                    arr.append({
-                        "side": L["side"], "qty": float(L["qty"]), "entry": float(L["entry"]), "lev": int(L["lev"]),
-                        "ts": time.time(), "sl": float(L.get("sl", 0.0)), "tp1": float(L.get("tp1", 0.0)),
-                        "tp2": float(L.get("tp2", 0.0)), "realized_pnl": float(L.get("realized_pnl", 0.0)),
-                        "trailing_anchor": float(L.get("trailing_anchor", L["entry"])),
-                        "entry_adx": float(L.get("entry_adx", 0.0)), "leg": int(L.get("leg", 1))
-                    })
-                if arr:
-                    self.trader.state.positions[sym] = arr
+            self.trader.state.positions = Positions.from_state(snap.get("positions", {}))
+            self.exposure.attach(self.trader.state.positions)
             self._loaded_state = True
             logger.info("PAPER state restored: %s positions", sum(len(v) for v in self.trader.state.positions.values()))
         except Exception as e:
             logger.warning("restore_state failed: %s", e)
 
-    def save_state(self):
+    def save_state(self, critical=False):
+        """Marca el estado para guardar; critical=True (lotes abiertos/cerrados) no espera al debounce."""
         if self.mode != 'paper':
             return
         try:
-            if ext_save_state:
-                ext_save_state(self._serialize_state())
-                return
-            os.makedirs(os.path.dirname(self.STATE_FILE), exist_ok=True)
-            with open(self.STATE_FILE, "w", encoding="utf-8") as f:
-                json.dump(self._serialize_state(), f, ensure_ascii=False, separators=(",", ":"))
+            self.persister.mark(critical)
         except Exception as e:
             logger.warning("save_state failed: %s", e)
 
@@ -433,11 +559,8 @@ class TradingApp:
         if self.mode != 'paper':
             return
         try:
-            if ext_load_state:
-                snap = ext_load_state()
-            elif os.path.exists(self.STATE_FILE):
-                with open(self.STATE_FILE, "r", encoding="utf-8") as f:
-                    snap = json.load(f)
+            snap = self.persister.load()
+            if snap is not None:
                 if isinstance(snap, list):
                     snap = {}
                 if isinstance(snap.get("positions", {}), list):
@@ -500,42 +623,13 @@ class TradingApp:
 
     def _update_learning_pauses(self, now_ts=None):
         try:
-            import csv, time as _t
-            now_ts = now_ts or _t.time()
-            path = os.path.join(self.csv_dir, "trades.csv")
-            if not os.path.exists(path):
-                return
-            rows = []
-            with open(path, newline="", encoding="utf-8") as f:
-                r = csv.DictReader(f)
-                for row in r:
-                    if str(row.get("note") or "").upper().startswith("CLOSE"):
-                        rows.append(row)
-            rows = rows[-600:]
-            perf = {}
-            for r in rows:
-                sym = r.get("symbol", "")
-                regime = (r.get("regime") or r.get("entry_regime") or "").lower()
-                if not sym or not regime:
-                    continue
-                layer = "trend" if ("trend" in regime) else ("range" if regime in ("range", "chop") else "other")
-                if layer == "other":
-                    continue
-                pnl = float(r.get("pnl") or 0.0)
-                key = (sym, layer)
-                d = perf.setdefault(key, {"n": 0, "pnl": 0.0, "gains": 0.0, "loss": 0.0})
-                d["n"] += 1
-                d["pnl"] += pnl
-                if pnl >= 0:
-                    d["gains"] += pnl
-                else:
-                    d["loss"] += pnl
-            for key, d in perf.items():
+            now_ts = now_ts or self._now()
+            for key, d in self.ledger.layer_stats().items():
                 n = d["n"]
                 if n < 20:
                     continue
-                pf = (d["gains"] / abs(d["loss"])) if d["loss"] < 0 else 999.0
-                expectancy = d["pnl"] / n
+                pf = d["pf"]
+                expectancy = d["expectancy"]
                 if expectancy < 0.0 and pf < 0.9:
                     until = now_ts + 24 * 3600
                     if self.layer_pauses.get(key, 0) < until:
@@ -545,39 +639,13 @@ class TradingApp:
         except Exception as e:
             logger.warning("update_learning_pauses failed: %s", e)
 
-    def _cluster_exposure_ok(self, symbol: str, side: str, price_by_symbol):
+    def _cluster_exposure_ok(self, symbol: str, side: str):
         try:
             cg = self.cfg.get('correlation_guard', {})
             if not cg or not cg.get('enabled', True):
                 return True, ''
-            clusters = cg.get('clusters') or []
             max_ratio = float(cg.get('same_side_max_exposure_ratio', 0.6))
-            total_notional = 0.0
-            for sym, lots in self.trader.state.positions.items():
-                p = price_by_symbol.get(sym) or self.price_cache.get(sym) or 0.0
-                if p <= 0:
-                    continue
-                for L in lots:
-                    total_notional += abs(L['qty']) * p
-            if total_notional <= 0:
-                return True, ''
-            cluster = None
-            for cl in clusters:
-                if symbol in cl:
-                    cluster = cl
-                    break
-            if not cluster:
-                return True, ''
-            cluster_same = 0.0
-            for sym in cluster:
-                lots = self.trader.state.positions.get(sym, [])
-                p = price_by_symbol.get(sym) or self.price_cache.get(sym) or 0.0
-                if p <= 0:
-                    continue
-                for L in lots:
-                    if L.get('side') == side:
-                        cluster_same += abs(L['qty']) * p
-            ratio = cluster_same / total_notional if total_notional else 0.0
+            ratio = self.exposure.cluster_ratio(symbol, side)
             if ratio > max_ratio:
                 return False, f"REJECT_CORR_EXPOSURE {symbol} {side} ratio={ratio:.2f} > {max_ratio:.2f}"
             return True, ''
@@ -594,16 +662,9 @@ class TradingApp:
             fr_bps = float(self.price_cache.get(f"FUNDING_BPS:{symbol}", 0.0))
             if abs(fr_bps) < thr:
                 return True, ''
-            import datetime as _dt
-            now = _dt.datetime.utcfromtimestamp(now_ts).replace(second=0, microsecond=0)
-            nexts = []
-            base = now.replace(hour=0, minute=0)
-            for h in (0, 8, 16):
-                t = base.replace(hour=h)
-                if t < now:
-                    t = t + _dt.timedelta(days=1) if h == 0 else t
-                nexts.append(t)
-            deltas = [abs((t - now).total_seconds()) for t in nexts]
+            # próxima liquidación según el exchange y la anterior (8h antes)
+            nxt = self._next_funding_ts(symbol, now_ts)
+            deltas = (nxt - now_ts, now_ts - (nxt - 8 * 3600))
             if min(deltas) <= minutes * 60:
                 return False, f"REJECT_FUNDING_WINDOW |FR|={fr_bps:.0f}bps <= {minutes}m de funding"
             return True, ''
@@ -618,47 +679,17 @@ class TradingApp:
             if now - getattr(self, "_last_alert_check", 0.0) < 300:
                 return
             self._last_alert_check = now
-            import datetime as _dt, csv
-            trades_path = os.path.join(self.csv_dir, "trades.csv")
-            eq_path = os.path.join(self.csv_dir, "equity.csv")
-            today = _dt.datetime.utcnow().date()
-            start = _dt.datetime(today.year, today.month, today.day).timestamp()
-            closes = []
-            streaks = {}
-            if os.path.exists(trades_path):
-                with open(trades_path, newline="", encoding="utf-8") as f:
-                    r = csv.DictReader(f)
-                    for row in r:
-                        note = str(row.get("note") or "").upper()
-                        if not note.startswith("CLOSE"):
-                            continue
-                        try:
-                            ts = row.get("ts") or row.get("time") or ""
-                            try:
-                                tsv = _dt.datetime.fromisoformat(ts.replace("Z", "")).timestamp()
-                            except Exception:
-                                tsv = float(ts)
-                            if tsv < start:
-                                continue
-                            symbol = row.get("symbol", "")
-                            pnl = float(row.get("pnl") or 0.0)
-                            closes.append(pnl)
-                            s = streaks.setdefault(symbol, [])
-                            s.append(pnl)
-                        except Exception:
-                            pass
-            gains = sum([x for x in closes if x >= 0])
-            losses = sum([x for x in closes if x < 0])
-            pf = (gains / abs(losses)) if losses < 0 else (gains if gains > 0 else 0.0)
+            day = self.ledger.today(dt.datetime.utcfromtimestamp(now))
+            pf = day["pf"]
             key_pf = "pf_day_low"
-            if closes and pf < 0.7 and not self._alert_sent.get(key_pf):
+            if day["closes"] and pf < 0.7 and not self._alert_sent.get(key_pf):
                 try:
-                    asyncio.create_task(self.notifier.send(f"⚠️ PF día bajo: {pf:.2f} (cierres={len(closes)})"))
+                    asyncio.create_task(self.notifier.send(f"⚠️ PF día bajo: {pf:.2f} (cierres={day['closes']})"))
                     self._alert_sent[key_pf] = True
                 except Exception:
                     pass
-            for sym, pnl_list in streaks.items():
-                if len(pnl_list) >= 3 and all(x < 0 for x in pnl_list[-3:]):
+            for sym, streak in day["streaks"].items():
+                if streak >= 3:
                     key = f"streak_{sym}"
                     if not self._alert_sent.get(key):
                         try:
@@ -666,36 +697,13 @@ class TradingApp:
                             self._alert_sent[key] = True
                         except Exception:
                             pass
-            if os.path.exists(eq_path):
-                eq = []
-                with open(eq_path, newline="", encoding="utf-8") as f:
-                    r = csv.DictReader(f)
-                    for row in r:
-                        try:
-                            ts = row.get("ts") or row.get("time") or ""
-                            try:
-                                tsv = _dt.datetime.fromisoformat(ts.replace("Z", "")).timestamp()
-                            except Exception:
-                                tsv = float(ts)
-                            if tsv >= start:
-                                eq.append(float(row.get("equity") or 0.0))
-                        except Exception:
-                            pass
-                if len(eq) >= 2:
-                    peak = eq[0]
-                    dd_min = 0.0
-                    for v in eq:
-                        if v > peak:
-                            peak = v
-                        dd_cur = (v - peak) / peak if peak > 0 else 0.0
-                        if dd_cur < dd_min:
-                            dd_min = dd_cur
-                    if dd_min <= -0.015 and not self._alert_sent.get('dd_day'):
-                        try:
-                            asyncio.create_task(self.notifier.send(f"⚠️ DD diario {dd_min * 100:.2f}%"))
-                            self._alert_sent['dd_day'] = True
-                        except Exception:
-                            pass
+            dd_min = day["dd_min"]
+            if dd_min <= -0.015 and not self._alert_sent.get('dd_day'):
+                try:
+                    asyncio.create_task(self.notifier.send(f"⚠️ DD diario {dd_min * 100:.2f}%"))
+                    self._alert_sent['dd_day'] = True
+                except Exception:
+                    pass
         except Exception as e:
             logger.debug("alerts check skipped: %s", e)
 
@@ -707,6 +715,13 @@ class TradingApp:
 
     async def run(self):
         logger.info("Trading loop started in %s mode", self.mode.upper())
+        # solo el loop en vivo baja el estado pendiente al salir (replays/optimizador no)
+        atexit.register(self.persister.flush)
+        # systemd stop manda SIGTERM: bajar todo antes de salir (atexit no alcanza si el proceso muere)
+        try:
+            asyncio.get_running_loop().add_signal_handler(signal.SIGTERM, self._on_sigterm)
+        except (NotImplementedError, RuntimeError) as e:
+            logger.warning("SIGTERM handler not installed: %s", e)
         try:
             await self.ccxt.load_markets()
         except Exception as e:
@@ -722,166 +737,210 @@ class TradingApp:
                 await self.bootstrap_real()
             except Exception as e:
                 logger.warning('bootstrap_real failed: %s', e)
+        self.start_feed()
+        self.exits.start()
         while True:
             try:
                 await self.step_all_symbols()
             except Exception as e:
                 logger.exception("step error: %s", e)
-            await asyncio.sleep(self.loop_seconds)
+            self.exits.export(os.path.join(self.csv_dir, "metrics", "exits.json"))
+            # las salidas siguen a su ritmo (ticks del websocket / poll del exit manager)
+            if self.bar_clock is not None:
+                await self.bar_clock.sleep_until_next(self._now)
+            else:
+                await asyncio.sleep(self.loop_seconds)
+
+    def flush_storage(self):
+        """Baja journal, CSV, columnar, SQLite y estado pendientes (en ese orden)."""
+        steps = (("decisions", getattr(self.decisions, "flush", None)), ("csv", flush_csv),
+                 ("columnar", getattr(self.columnar, "flush", None)), ("sqlite", getattr(self.db, "flush", None)),
+                 ("state", self.persister.flush))
+        for name, fn in steps:
+            if fn is None:
+                continue  # replay: sin store
+            try:
+                fn()
+            except Exception as e:
+                logger.warning("flush %s failed: %s", name, e)
+
+    def _on_sigterm(self):
+        logger.info("SIGTERM: flushing storage and exiting")
+        self.flush_storage()
+        raise SystemExit(0)
+
+    def start_feed(self):
+        if not self.ws_conf.get("enabled", False) or self.feed is not None:
+            return
+        self.feed = MarketFeed(self.symbols, self.base_timeframe, self.candles, self.price_cache,
+                               on_tick=self._on_tick, url=self.ws_conf.get("url", WS_DEFAULT_URL),
+                               stale_after_s=float(self.ws_conf.get("stale_after_s", 10.0)))
+        self.feed.start()
+
+    async def _on_tick(self, symbol, price):
+        """Mark price del websocket: se lo pasa al exit manager."""
+        self.exposure.on_price(symbol, price)
+        self.exits.on_price(symbol, price)
 
     async def step_all_symbols(self):
         self._apply_risk_bands()
 
-        if time.time() - self._last_learning_update > 600:
+        if self._now() - self._last_learning_update > 600:
             self._update_learning_pauses()
-            self._last_learning_update = time.time()
+            self._last_learning_update = self._now()
 
         if not self._check_circuit_breakers():
             self.trader.state.killswitch = True
             return
 
+        # fase 1: fetch + indicadores de todos los símbolos en paralelo
+        inputs = await self.fetch_all_symbols()
+
+        # fase 2: decisiones y órdenes en orden determinístico (self.symbols)
         price_by_symbol = {}
         for sym in self.symbols:
-            df = await self.fetch_ohlcv_2m(sym)
-            ind = compute_indicators(df, {**self.filters, **self.strategy_conf, **self.cfg.get("indicators", {})})
-            sig = generate_signal(ind, {**self.filters, **self.strategy_conf})
+            async with self.exits.lock(sym):
+                if sym not in inputs:
+                    continue
+                last, sig, fr_bps = inputs[sym]
 
-            try:
-                self.price_cache[f"ATR:{sym}"] = float(ind.iloc[-1].get('atr', 0.0))
-            except Exception:
-                pass
+                try:
+                    self.price_cache[f"ATR:{sym}"] = float(last.get('atr', 0.0))
+                except Exception:
+                    pass
 
-            # cache funding si corresponde
-            try:
-                fw = self.cfg.get('funding_window', {})
-                if fw.get('enabled', True):
-                    fr_bps = await self.funding_rate_bps_annualized(sym)
+                # cache funding si corresponde (ya traído en la fase 1)
+                if fr_bps is not None:
                     self.price_cache[f"FUNDING_BPS:{sym}"] = fr_bps
-            except Exception:
-                pass
-
-            # pausa por aprendizaje
-            layer = 'trend' if ('trend' in str(getattr(sig, 'regime', ''))) else ('range' if str(getattr(sig, 'regime', '')) in ('range', 'chop') else 'other')
-            if layer != 'other':
-                until = self.layer_pauses.get((sym, layer), 0)
-                if until and time.time() < until:
-                    self.log_decision(sym, 'pause_layer', detail=f'layer={layer} hasta={dt.datetime.utcfromtimestamp(until).isoformat()}Z')
-                    continue
-
-            price = float(ind.iloc[-1]['close'])
-            price_by_symbol[sym] = price
-            self.price_cache[sym] = price
 
-            if not self.allow_new_entries or self.trader.state.killswitch:
-                self.log_decision(sym, 'killswitch' if self.trader.state.killswitch else 'entries_disabled')
-                continue
+                # pausa por aprendizaje
+                layer = 'trend' if ('trend' in str(getattr(sig, 'regime', ''))) else ('range' if str(getattr(sig, 'regime', '')) in ('range', 'chop') else 'other')
+                if layer != 'other':
+                    until = self.layer_pauses.get((sym, layer), 0)
+                    if until and self._now() < until:
+                        self.log_decision(sym, 'pause_layer', detail=f'layer={layer} hasta={dt.datetime.utcfromtimestamp(until).isoformat()}Z')
+                        continue
 
-            if bool(self.funding_guard.get("enabled", False)):
-                fr_bps = await self.funding_rate_bps_annualized(sym)
-                self.price_cache[f"FUNDING_BPS:{sym}"] = fr_bps
+                price = float(last['close'])
+                price_by_symbol[sym] = price
+                self.price_cache[sym] = price
+                self.exposure.on_price(sym, price)
 
-            now = time.time()
-            last_t = self.trader.state.last_entry_ts_by_symbol.get(sym, 0)
-            if now - last_t < self.cooldown:
-                self.log_decision(sym, 'cooldown', detail=f'rem={self.cooldown - (now - last_t):.1f}s')
-                continue
+                if not self.allow_new_entries or self.trader.state.killswitch:
+                    self.log_decision(sym, 'killswitch' if self.trader.state.killswitch else 'entries_disabled')
+                    continue
 
-            if sig.side in ("long", "short"):
-                ok, reason = self.pre_open_checks(sym, sig.side, price_by_symbol)
-                if not ok:
-                    self.log_decision(sym, 'pre_open_checks', detail=reason)
+                now = self._now()
+                last_t = self.trader.state.last_entry_ts_by_symbol.get(sym, 0)
+                if now - last_t < self.cooldown:
+                    self.log_decision(sym, 'cooldown', detail=f'rem={self.cooldown - (now - last_t):.1f}s')
                     continue
 
-                lev, pct = self._choose_leverage_and_pct(ind.iloc[-1], sig.regime)
-                eq = self.trader.equity()
-                qty, usd = self._risk_normalized_qty(price, sig.sl, eq, pct, lev, float(ind.iloc[-1].get('atr', 0.0)))
-                usd = self._apply_caps(usd, price, lev)
+                if sig.side in ("long", "short"):
+                    ok, reason = self.pre_open_checks(sym, sig.side)
+                    if not ok:
+                        self.log_decision(sym, 'pre_open_checks', detail=reason)
+                        continue
 
-                # cap por margen libre de cartera
-                free = self.available_margin_usd(eq, price_by_symbol)
-                if usd > free:
-                    usd = free
-                    qty = (usd * lev) / max(price, 1e-9)
+                    lev, pct = self._choose_leverage_and_pct(last, sig.regime)
+                    eq = self.trader.equity()
+                    qty, usd = self._risk_normalized_qty(price, sig.sl, eq, pct, lev, float(last.get('atr', 0.0)))
+                    usd = self._apply_caps(usd, price, lev)
 
-                if qty <= 0:
-                    continue
+                    # cap por margen libre de cartera
+                    free = self.available_margin_usd(eq, price_by_symbol)
+                    if usd > free:
+                        usd = free
+                        qty = (usd * lev) / max(price, 1e-9)
 
-                try:
-                    await self.exchange.set_leverage(sym, lev)
-                except Exception as e:
-                    logger.warning('set_leverage failed: %s', e)
+                    if qty <= 0:
+                        continue
 
-                fill, fee = await self.exchange.market_order(sym, sig.side, qty, price)
-                leg_no = 1 + sum(1 for L in self.trader.state.positions.get(sym, []) if L['side'] == sig.side)
-                self.trader.open_lot(sym, sig.side, qty, fill.price, lev, sig.sl, sig.tp1, sig.tp2, fee,
-                                     entry_adx=float(ind.iloc[-1].get('adx', 0.0)), leg=leg_no)
-                self.trader.state.last_entry_ts_by_symbol[sym] = now
-                self.save_state()
+                    try:
+                        await self.exchange.set_leverage(sym, lev)
+                    except Exception as e:
+                        logger.warning('set_leverage failed: %s', e)
 
-                self.log_trade(sym, sig.side, qty, fill.price, lev, fee, note=f"OPEN usd={usd:.2f} lev={lev} pct={pct:.2f}")
+                    fill, fee = await self.exchange.market_order(sym, sig.side, qty, price)
+                    leg_no = 1 + sum(1 for L in self.trader.state.positions.get(sym, []) if L['side'] == sig.side)
+                    self.trader.open_lot(sym, sig.side, qty, fill.price, lev, sig.sl, sig.tp1, sig.tp2, fee,
+                                         entry_adx=float(last.get('adx', 0.0)), leg=leg_no)
+                    self.trader.state.last_entry_ts_by_symbol[sym] = now
+                    self.save_state(critical=True)
 
-                # --- AVISO OPEN con saldo ---
-                try:
-                    await self.notifier.send(
-                        f"🟢 OPEN {sym} {sig.side} qty={qty:.6f} @ {fill.price:.2f} lev={lev} usd={usd:.2f} saldo={self.trader.equity():.2f}"
-                    )
-                except Exception:
-                    pass
+                    self.log_trade(sym, sig.side, qty, fill.price, lev, fee, note=f"OPEN usd={usd:.2f} lev={lev} pct={pct:.2f}")
 
-                if self.mode == 'real':
+                    # --- AVISO OPEN con saldo ---
                     try:
-                        await self.exchange.place_protections(sym, sig.side, qty, sig.sl, sig.tp1, sig.tp2)
-                    except Exception as e:
-                        logger.warning('place_protections failed: %s', e)
-
-            # DCA a favor
-            lots = self.trader.state.positions.get(sym, [])
-            if lots:
-                side_net = None
-                net = sum(L['qty'] if L['side'] == 'long' else -L['qty'] for L in lots)
-                if abs(net) > 0:
-                    side_net = 'long' if net > 0 else 'short'
-                dca_cfg = self.cfg.get("dca", {})
-                if side_net and self.allow_new_entries and not self.trader.state.killswitch:
-                    if sum(len(v) for v in self.trader.state.positions.values()) < self.limits.max_total_positions and len(lots) < self.limits.max_per_symbol:
-                        ok_add, scale = self._dca_should_add(sym, side_net, ind.iloc[-1], lots, dca_cfg)
-                        if ok_add:
-                            lev, pct_base = self._choose_leverage_and_pct(ind.iloc[-1], sig.regime)
-                            pct = max(self.order_sizes.get("min_pct", 0.10),
-                                      min(self.order_sizes.get("max_pct", 1.00), pct_base * scale))
-                            eq = self.trader.equity()
-                            qty_add, usd_add = self._risk_normalized_qty(
-                                price, lots[-1]['sl'] if lots[-1]['sl'] else sig.sl, eq, pct, lev, float(ind.iloc[-1].get('atr', 0.0))
-                            )
-                            usd_add = self._apply_caps(usd_add, price, lev)
-                            free2 = self.available_margin_usd(eq, price_by_symbol)
-                            if usd_add > free2:
-                                usd_add = free2
-                                qty_add = (usd_add * lev) / max(price, 1e-9)
-                            if qty_add > 0:
-                                fill2, fee2 = await self.exchange.market_order(sym, side_net, qty_add, price)
-                                leg_no = 1 + sum(1 for L in lots if L['side'] == side_net)
-                                self.trader.open_lot(sym, side_net, qty_add, fill2.price, lev, sig.sl, sig.tp1, sig.tp2, fee2,
-                                                     entry_adx=float(ind.iloc[-1].get('adx', 0.0)), leg=leg_no)
-                                self.trader.state.last_entry_ts_by_symbol[sym] = now
-                                self.log_trade(sym, side_net, qty_add, fill2.price, lev, fee2,
-                                               note=f"DCA_ADD usd={usd_add:.2f} lev={lev} pct={pct:.2f}")
-                                self.save_state()
-            await self.manage_positions(price_by_symbol)
+                        await self.notifier.send(
+                            f"🟢 OPEN {sym} {sig.side} qty={qty:.6f} @ {fill.price:.2f} lev={lev} usd={usd:.2f} saldo={self.trader.equity():.2f}"
+                        )
+                    except Exception:
+                        pass
+
+                    if self.mode == 'real':
+                        try:
+                            await self.exchange.place_protections(sym, sig.side, qty, sig.sl, sig.tp1, sig.tp2)
+                        except Exception as e:
+                            logger.warning('place_protections failed: %s', e)
+
+                # DCA a favor
+                lots = self.trader.state.positions.get(sym, [])
+                if lots:
+                    side_net = None
+                    net = sum(L['qty'] if L['side'] == 'long' else -L['qty'] for L in lots)
+                    if abs(net) > 0:
+                        side_net = 'long' if net > 0 else 'short'
+                    dca_cfg = self.cfg.get("dca", {})
+                    if side_net and self.allow_new_entries and not self.trader.state.killswitch:
+                        if sum(len(v) for v in self.trader.state.positions.values()) < self.limits.max_total_positions and len(lots) < self.limits.max_per_symbol:
+                            ok_add, scale = self._dca_should_add(sym, side_net, last, lots, dca_cfg)
+                            if ok_add:
+                                lev, pct_base = self._choose_leverage_and_pct(last, sig.regime)
+                                pct = max(self.order_sizes.get("min_pct", 0.10),
+                                          min(self.order_sizes.get("max_pct", 1.00), pct_base * scale))
+                                eq = self.trader.equity()
+                                qty_add, usd_add = self._risk_normalized_qty(
+                                    price, lots[-1]['sl'] if lots[-1]['sl'] else sig.sl, eq, pct, lev, float(last.get('atr', 0.0))
+                                )
+                                usd_add = self._apply_caps(usd_add, price, lev)
+                                free2 = self.available_margin_usd(eq, price_by_symbol)
+                                if usd_add > free2:
+                                    usd_add = free2
+                                    qty_add = (usd_add * lev) / max(price, 1e-9)
+                                if qty_add > 0:
+                                    fill2, fee2 = await self.exchange.market_order(sym, side_net, qty_add, price)
+                                    leg_no = 1 + sum(1 for L in lots if L['side'] == side_net)
+                                    self.trader.open_lot(sym, side_net, qty_add, fill2.price, lev, sig.sl, sig.tp1, sig.tp2, fee2,
+                                                         entry_adx=float(last.get('adx', 0.0)), leg=leg_no)
+                                    self.trader.state.last_entry_ts_by_symbol[sym] = now
+                                    self.log_trade(sym, side_net, qty_add, fill2.price, lev, fee2,
+                                                   note=f"DCA_ADD usd={usd_add:.2f} lev={lev} pct={pct:.2f}")
+                                    self.save_state(critical=True)
+
+        # salidas: una evaluación por símbolo con el precio de esta pasada
+        await self.exits.evaluate_all(price_by_symbol)
+        self.exposure.rebuild()
 
         self.persist_equity(0.0)
 
     def persist_equity(self, pnl=0.0):
-        ts = dt.datetime.utcnow().isoformat()
+        ts = dt.datetime.utcfromtimestamp(self._now()).isoformat()
         row = {"ts": ts, "equity": round(self.trader.equity(), 6), "pnl": round(pnl, 6)}
         append_equity_csv(self.csv_dir, row)
-        insert_equity(self.sqlite_path, row)
+        self.ledger.on_equity(row)
+        self.columnar.append("equity", row)
+        self.read_model.on_equity(row)
+        self.db.insert_equity(row)
 
     def log_trade(self, symbol, side, qty, price, lev, fee, pnl=0.0, note="", regime: str = ""):
-        ts = dt.datetime.utcnow().isoformat()
+        ts = dt.datetime.utcfromtimestamp(self._now()).isoformat()
         row = {"ts": ts, "symbol": symbol, "side": side, "qty": qty, "price": price, "lev": lev, "fee": fee, "pnl": pnl, "note": note, "regime": regime}
         append_trade_csv(self.csv_dir, row)
-        insert_trade(self.sqlite_path, row)
+        self.ledger.on_trade(row)
+        self.columnar.append("trades", row)
+        self.read_model.on_trade(row)
+        self.db.insert_trade(row)
 
     def price_of(self, symbol):
         return self.price_cache.get(symbol)
@@ -911,117 +970,84 @@ class TradingApp:
                     if price <= L['sl']:
                         pnl = self.trader.close_lot(sym, idx, price, fee=fee_unit, note="SL")
                         self.log_trade(sym, L['side'], L['qty'], price, L['lev'], fee_unit, pnl, note="CLOSE_SL")
-                        self.save_state()
+                        self.save_state(critical=True)
                         await self.notifier.send(f"❌ SL {sym} long qty={L['qty']:.6f} @ {price:.2f} pnl={pnl:.2f} saldo={self.trader.equity():.2f}")
                         continue
                     if price >= L['tp2']:
                         pnl = self.trader.close_lot(sym, idx, price, fee=fee_unit, note="TP2")
                         self.log_trade(sym, L['side'], L['qty'], price, L['lev'], fee_unit, pnl, note="CLOSE_TP2")
-                        self.save_state()
+                        self.save_state(critical=True)
                         await self.notifier.send(f"✅ TP2 {sym} long qty={L['qty']:.6f} @ {price:.2f} pnl={pnl:.2f} saldo={self.trader.equity():.2f}")
                         continue
                     if price >= L['tp1']:
+                        # el resto queda con tp1=tp2: no vuelve a partirse en cada pasada
                         half = L['qty'] * 0.5
                         pnl = self.trader.close_lot(sym, idx, price, fee=abs(price * half) * self.fees['taker'], note="TP1_HALF")
                         self.log_trade(sym, L['side'], half, price, L['lev'], abs(price * half) * self.fees['taker'], pnl, note="CLOSE_TP1_HALF")
-                        self.save_state()
                         await self.notifier.send(f"🟢 TP1 {sym} long half qty={half:.6f} @ {price:.2f} pnl={pnl:.2f} saldo={self.trader.equity():.2f}")
-                        rem = {"side": L['side'], "qty": L['qty'] - half, "entry": price, "lev": L['lev'], "ts": time.time(),
-                               "sl": L['sl'], "tp1": L['tp1'], "tp2": L['tp2'], "realized_pnl": 0.0, "trailing_anchor": price}
+                        rem = {"side": L['side'], "qty": L['qty'] - half, "entry": price, "lev": L['lev'], "ts": self._now(),
+                               "sl": L['sl'], "tp1": L['tp2'], "tp2": L['tp2'], "realized_pnl": 0.0, "trailing_anchor": price}
                         self.trader.state.positions.setdefault(sym, []).append(rem)
+                        self.save_state(critical=True)
                         continue
                 else:
                     if price >= L['sl']:
                         pnl = self.trader.close_lot(sym, idx, price, fee=fee_unit, note="SL")
                         self.log_trade(sym, L['side'], L['qty'], price, L['lev'], fee_unit, pnl, note="CLOSE_SL")
-                        self.save_state()
+                        self.save_state(critical=True)
                         await self.notifier.send(f"❌ SL {sym} short qty={L['qty']:.6f} @ {price:.2f} pnl={pnl:.2f} saldo={self.trader.equity():.2f}")
                         continue
                     if price <= L['tp2']:
                         pnl = self.trader.close_lot(sym, idx, price, fee=fee_unit, note="TP2")
                         self.log_trade(sym, L['side'], L['qty'], price, L['lev'], fee_unit, pnl, note="CLOSE_TP2")
-                        self.save_state()
+                        self.save_state(critical=True)
                         await self.notifier.send(f"✅ TP2 {sym} short qty={L['qty']:.6f} @ {price:.2f} pnl={pnl:.2f} saldo={self.trader.equity():.2f}")
                         continue
                     if price <= L['tp1']:
+                        # el resto queda con tp1=tp2: no vuelve a partirse en cada pasada
                         half = L['qty'] * 0.5
                         pnl = self.trader.close_lot(sym, idx, price, fee=abs(price * half) * self.fees['taker'], note="TP1_HALF")
                         self.log_trade(sym, L['side'], half, price, L['lev'], abs(price * half) * self.fees['taker'], pnl, note="CLOSE_TP1_HALF")
-                        self.save_state()
                         await self.notifier.send(f"🟢 TP1 {sym} short half qty={half:.6f} @ {price:.2f} pnl={pnl:.2f} saldo={self.trader.equity():.2f}")
-                        rem = {"side": L['side'], "qty": L['qty'] - half, "entry": price, "lev": L['lev'], "ts": time.time(),
-                               "sl": L['sl'], "tp1": L['tp1'], "tp2": L['tp2'], "realized_pnl": 0.0, "trailing_anchor": price}
+                        rem = {"side": L['side'], "qty": L['qty'] - half, "entry": price, "lev": L['lev'], "ts": self._now(),
+                               "sl": L['sl'], "tp1": L['tp2'], "tp2": L['tp2'], "realized_pnl": 0.0, "trailing_anchor": price}
                         self.trader.state.positions.setdefault(sym, []).append(rem)
+                        self.save_state(critical=True)
                         continue
                 idx += 1
 
-    def pre_open_checks(self, symbol, side, price_by_symbol):
+    def pre_open_checks(self, symbol, side):
         ok, reason = can_open(symbol, side, self.trader.state.positions, self.limits)
         if not ok:
             return False, reason
         equity = self.trader.equity()
-        ok, reason = portfolio_caps_ok(equity, self.trader.state.positions, price_by_symbol, self.portfolio_caps)
+        ok, reason = self.exposure.caps_ok(equity, self.portfolio_caps)
         if not ok:
             return False, reason
-        ok, reason = self._cluster_exposure_ok(symbol, side, price_by_symbol)
+        ok, reason = self._cluster_exposure_ok(symbol, side)
         if not ok:
             return False, reason
-        ok, reason = self._funding_window_ok(symbol, time.time())
+        ok, reason = self._funding_window_ok(symbol, self._now())
         if not ok:
             return False, reason
         self.save_state()
         return True, ""
 
     def log_decision(self, symbol, reason, detail="", extra=None):
-        """Registra motivos de NO-entrada en memoria y CSV (data/decisions.csv)."""
+        """Registra motivos de NO-entrada (ring en memoria; el CSV lo escribe el journal)."""
         try:
-            from collections import deque
-            if not hasattr(self, "_decisions"):
-                self._decisions = deque(maxlen=200)
-            ts = time.time()
-            row = {
-                "ts": ts,
-                "iso": dt.datetime.utcfromtimestamp(ts).isoformat() + "Z",
-                "symbol": symbol,
-                "reason": reason,
-                "detail": detail or "",
-            }
-            if isinstance(extra, dict):
-                for k, v in extra.items():
-                    row[f"extra_{k}"] = v
-            self._decisions.append(row)
-            os.makedirs(self.csv_dir, exist_ok=True)
-            path = os.path.join(self.csv_dir, "decisions.csv")
-            newfile = not os.path.exists(path)
-            import csv
-            with open(path, "a", newline="", encoding="utf-8") as f:
-                w = csv.DictWriter(f, fieldnames=list(row.keys()))
-                if newfile:
-                    w.writeheader()
-                w.writerow(row)
+            self.decisions.record(symbol, reason, detail, extra, ts=self._now())
         except Exception as e:
             logger.warning("log_decision failed: %s", e)
 
     def recent_rejections(self, n=10):
-        """Últimas decisiones de no-entrada (memoria o CSV)."""
-        out = []
-        if hasattr(self, "_decisions") and self._decisions:
-            out = [d for d in list(self._decisions)[-n:] if d.get("reason") != "opened"]
-        else:
-            path = os.path.join(self.csv_dir, "decisions.csv")
-            if os.path.exists(path):
-                import csv
-                rows = []
-                with open(path, newline="", encoding="utf-8") as f:
-                    r = csv.DictReader(f)
-                    for row in r:
-                        rows.append(row)
-                out = [r for r in rows if (r.get("reason") != "opened")][-n:]
-        return out
+        """Últimas decisiones de no-entrada (memoria)."""
+        return self.decisions.recent(n)
 
     # --- estos dos debían estar dentro de la clase ---
     def toggle_killswitch(self):
         self.trader.state.killswitch = not self.trader.state.killswitch
+        self.save_state(critical=True)
         return self.trader.state.killswitch
 
     async def close_all(self):
@@ -1032,5 +1058,5 @@ class TradingApp:
                 fee_unit = abs(price * L['qty']) * self.fees['taker']
                 pnl = self.trader.close_lot(sym, 0, price, fee=fee_unit, note="FORCE_CLOSE")
                 self.log_trade(sym, L['side'], L['qty'], price, L['lev'], fee_unit, pnl, note="FORCE_CLOSE")
-        self.save_state()
+        self.save_state(critical=True)
         return True
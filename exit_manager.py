@@ -0,0 +1,121 @@
+import asyncio, json, os, time, logging
+from collections import deque
+
+logger = logging.getLogger("exit_manager")
+
+
+def crossed(lots, price) -> bool:
+    """True si `price` dispara SL/TP1/TP2 de algún lote."""
+    for L in lots or ():
+        if L['side'] == 'long':
+            if price <= L['sl'] or price >= min(L['tp1'], L['tp2']):
+                return True
+        else:
+            if price >= L['sl'] or price <= max(L['tp1'], L['tp2']):
+                return True
+    return False
+
+
+class ExitManager:
+    """Salidas (SL/TP/trailing) por precio, separadas del loop de señales.
+
+    Cada precio nuevo (tick del websocket, poll REST o la pasada del loop) se
+    evalúa en un task por símbolo con el último precio conocido (los intermedios
+    se descartan). Las entradas del loop toman el mismo lock por símbolo, así los
+    dos nunca tocan los lotes de un símbolo a la vez. Se mide la latencia desde
+    que llega un precio que cruza un nivel hasta que se decide el cierre.
+    """
+
+    def __init__(self, app, conf: dict = None):
+        conf = conf or {}
+        self.app = app
+        self.poll_s = float(conf.get("poll_s", 10.0))
+        self._locks = {}
+        self._latest = {}         # sym -> último precio sin evaluar
+        self._t0 = {}             # sym -> monotonic del primer cruce pendiente
+        self._tasks = {}
+        self._poll_task = None
+        self._lat = deque(maxlen=int(conf.get("latency_window", 1000)))
+        self.stats = {"ticks": 0, "evals": 0, "crossings": 0}
+
+    def lock(self, symbol) -> asyncio.Lock:
+        lk = self._locks.get(symbol)
+        if lk is None:
+            lk = self._locks[symbol] = asyncio.Lock()
+        return lk
+
+    def _mark_cross(self, symbol, price, now):
+        if symbol not in self._t0 and crossed(self.app.trader.state.positions.get(symbol), price):
+            self._t0[symbol] = now
+            self.stats["crossings"] += 1
+
+    # --- entrada de precios ---
+    def on_price(self, symbol, price):
+        """Precio nuevo (no bloquea): agenda la evaluación del símbolo si tiene lotes."""
+        self.stats["ticks"] += 1
+        if not self.app.trader.state.positions.get(symbol):
+            return
+        self._latest[symbol] = float(price)
+        self._mark_cross(symbol, price, time.monotonic())
+        t = self._tasks.get(symbol)
+        if t is None or t.done():
+            self._tasks[symbol] = asyncio.get_running_loop().create_task(self._drain(symbol))
+
+    async def _drain(self, symbol):
+        while symbol in self._latest:
+            await self.evaluate(symbol, self._latest.pop(symbol))
+
+    async def evaluate(self, symbol, price):
+        async with self.lock(symbol):
+            self.stats["evals"] += 1
+            try:
+                await self.app.manage_positions({symbol: price})
+            except Exception as e:
+                logger.warning("exit eval %s failed: %s", symbol, e)
+            t0 = self._t0.pop(symbol, None)
+            if t0 is not None:
+                self._lat.append(time.monotonic() - t0)
+
+    async def evaluate_all(self, price_by_symbol):
+        """Pasada del loop principal: evalúa cada símbolo con posiciones y precio."""
+        now = time.monotonic()
+        for sym in list(self.app.trader.state.positions):
+            price = price_by_symbol.get(sym)
+            if price is None:
+                continue
+            self._mark_cross(sym, price, now)
+            await self.evaluate(sym, price)
+
+    # --- poll REST cuando no hay websocket ---
+    def start(self):
+        if self.poll_s > 0 and (self._poll_task is None or self._poll_task.done()):
+            self._poll_task = asyncio.get_running_loop().create_task(self._poll())
+
+    async def _poll(self):
+        while True:
+            await asyncio.sleep(self.poll_s)
+            feed = getattr(self.app, "feed", None)
+            for sym, lots in list(self.app.trader.state.positions.items()):
+                if not lots or (feed is not None and feed.healthy(sym)):
+                    continue
+                try:
+                    self.on_price(sym, await self.app.fetch_last_price(sym))
+                except Exception as e:
+                    logger.debug("exit poll %s failed: %s", sym, e)
+
+    # --- métricas ---
+    def snapshot(self) -> dict:
+        lat = sorted(self._lat)
+        pct = lambda q: round(lat[min(len(lat) - 1, int(q * len(lat)))] * 1000.0, 3) if lat else None
+        return {**self.stats, "latency_ms": {"n": len(lat), "p50": pct(0.5), "p99": pct(0.99),
+                                             "max": round(lat[-1] * 1000.0, 3) if lat else None,
+                                             "last": round(self._lat[-1] * 1000.0, 3) if lat else None}}
+
+    def export(self, path):
+        try:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            with open(path + ".tmp", "w", encoding="utf-8") as f:
+                json.dump(self.snapshot(), f, indent=2)
+            os.replace(path + ".tmp", path)
+        except Exception as e:
+            logger.warning("exit metrics export failed: %s", e)
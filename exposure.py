@@ -0,0 +1,104 @@
+import logging
+from bot.risk.guards import caps_verdict
+
+logger = logging.getLogger("exposure")
+
+
+class ExposureAggregator:
+    """Exposición de cartera al último precio conocido, actualizada por evento.
+
+    Positions avisa cada cambio de lotes de un símbolo y el engine pasa cada
+    precio nuevo (loop o websocket). Por símbolo se guarda su aporte
+    (notional, margen, notional long/short) y se corrige la diferencia en los
+    totales y en los clusters donde figura, así las consultas del gate de riesgo
+    son O(1). `rebuild()` recalcula todo desde los books (arranque, restore y al
+    final de cada pasada, para no acumular redondeo).
+    """
+
+    def __init__(self, clusters=None):
+        self.clusters = [list(cl) for cl in (clusters or [])]
+        self._sym_clusters = {}
+        for i, cl in enumerate(self.clusters):
+            for sym in cl:
+                self._sym_clusters.setdefault(sym, []).append(i)
+        self.positions = None
+        self.prices = {}
+        self._contrib = {}        # sym -> (notional, margin, long_notional, short_notional)
+        self._reset()
+
+    def _reset(self):
+        self.notional = 0.0
+        self.margin = 0.0
+        self._cluster_side = [[0.0, 0.0] for _ in self.clusters]   # [long, short]
+        self._contrib.clear()
+
+    def attach(self, positions):
+        """Engancha un Positions (también después de reemplazarlo en un restore)."""
+        if self.positions is not None and self.positions is not positions:
+            self.positions.listener = None
+        self.positions = positions
+        positions.listener = self.sync
+        self.rebuild()
+
+    def rebuild(self):
+        self._reset()
+        for sym in list(self.positions or ()):
+            self.sync(sym)
+
+    def on_price(self, sym, price):
+        try:
+            price = float(price)
+        except (TypeError, ValueError):
+            return
+        if price <= 0 or self.prices.get(sym) == price:
+            return
+        self.prices[sym] = price
+        self.sync(sym)
+
+    def sync(self, sym):
+        book = self.positions.get(sym) if self.positions is not None else None
+        p = self.prices.get(sym, 0.0)
+        if book is None or p <= 0:
+            new = (0.0, 0.0, 0.0, 0.0)
+        else:
+            new = (p * book.gross_qty, p * book.margin_qty, p * book.qty_long, p * book.qty_short)
+        old = self._contrib.get(sym, (0.0, 0.0, 0.0, 0.0))
+        if new == old:
+            return
+        self.notional += new[0] - old[0]
+        self.margin += new[1] - old[1]
+        for i in self._sym_clusters.get(sym, ()):
+            self._cluster_side[i][0] += new[2] - old[2]
+            self._cluster_side[i][1] += new[3] - old[3]
+        if any(new):
+            self._contrib[sym] = new
+        else:
+            self._contrib.pop(sym, None)
+        if not self._contrib:
+            self.notional = self.margin = 0.0
+            for cs in self._cluster_side:
+                cs[0] = cs[1] = 0.0
+
+    # --- consultas O(1) ---
+    def leverage(self, equity):
+        return self.notional / equity if equity else 0.0
+
+    def margin_pct(self, equity):
+        return self.margin / equity if equity else 0.0
+
+    def caps_ok(self, equity, caps: dict):
+        return caps_verdict(equity, self.notional, self.margin, caps)
+
+    def cluster_ratio(self, sym, side):
+        """Mayor notional del mismo lado entre los clusters de `sym` / notional total."""
+        idx = self._sym_clusters.get(sym)
+        if not idx or self.notional <= 0:
+            return 0.0
+        k = 0 if side == "long" else 1
+        return max(self._cluster_side[i][k] for i in idx) / self.notional
+
+    def snapshot(self, equity=None):
+        out = {"notional": round(self.notional, 6), "margin": round(self.margin, 6), "symbols": len(self._contrib)}
+        if equity:
+            out.update(leverage=round(self.leverage(equity), 4), margin_pct=round(self.margin_pct(equity), 4))
+        return out
@@ -0,0 +1,116 @@
+import asyncio, time, logging
+
+logger = logging.getLogger("funding_cache")
+
+EIGHT_HOURS = 8 * 3600
+
+
+def annualized_bps(rate: float) -> float:
+    return float(rate) * 3 * 24 * 365 * 10000.0
+
+
+def next_grid_ts(now_ts: float, interval_s: int = EIGHT_HOURS) -> float:
+    """Próximo múltiplo de `interval_s` desde 00:00 UTC (fallback si el exchange no informa)."""
+    return (int(now_ts) // interval_s + 1) * interval_s
+
+
+class FundingCache:
+    """Funding de todos los símbolos con un solo fetch_funding_rates.
+
+    El funding solo cambia en cada liquidación (8h): se refresca si falta algún
+    símbolo, si ya pasó la próxima liquidación, cada `near_every_s` dentro de los
+    `near_s` previos a ella (la tasa estimada se mueve) o si el dato tiene más de
+    `max_age_s`. Si un refresco falla o vuelve incompleto (faltan símbolos o la
+    liquidación sigue vencida) no se reintenta hasta pasados `retry_s`. Guarda
+    también la hora de la próxima liquidación que da el exchange.
+    """
+
+    def __init__(self, ccxt, symbols, conf: dict = None, with_retry=None):
+        conf = conf or {}
+        self.ccxt = ccxt
+        self.symbols = list(symbols)
+        self.with_retry = with_retry
+        self.near_s = float(conf.get("near_s", 300))
+        self.near_every_s = float(conf.get("near_every_s", 60))
+        self.max_age_s = float(conf.get("max_age_s", 3600))
+        self.retry_s = float(conf.get("retry_s", 60))
+        self.rates = {}        # sym -> funding rate (por período)
+        self.next_ts = {}      # sym -> epoch s de la próxima liquidación
+        self.fetched_at = 0.0
+        self.retry_at = 0.0    # backoff tras un refresco fallido/incompleto
+        self._lock = asyncio.Lock()
+        self.stats = {"bulk": 0, "single": 0, "failed": 0, "partial": 0}
+
+    def due(self, now_ts: float) -> bool:
+        if now_ts < self.retry_at:
+            return False
+        if not self.fetched_at or any(s not in self.rates for s in self.symbols):
+            return True
+        age = now_ts - self.fetched_at
+        if age >= self.max_age_s:
+            return True
+        nxt = min((self.next_ts.get(s) or 0.0 for s in self.symbols), default=0.0)
+        if nxt and now_ts >= nxt:
+            return True
+        return bool(nxt) and nxt - now_ts <= self.near_s and age >= self.near_every_s
+
+    async def ensure(self, now_ts: float = None):
+        """Refresca si hace falta; las llamadas concurrentes comparten un solo fetch."""
+        now_ts = time.time() if now_ts is None else now_ts
+        if not self.due(now_ts):
+            return
+        async with self._lock:
+            if self.due(now_ts):
+                await self.refresh(now_ts)
+
+    async def _call(self, fn, *args):
+        return await (self.with_retry(fn, *args) if self.with_retry else fn(*args))
+
+    async def refresh(self, now_ts: float = None):
+        now_ts = time.time() if now_ts is None else now_ts
+        data = None
+        has = getattr(self.ccxt, "has", None)
+        bulk = has.get("fetchFundingRates") if isinstance(has, dict) else hasattr(self.ccxt, "fetch_funding_rates")
+        if bulk:
+            try:
+                data = await self._call(self.ccxt.fetch_funding_rates, self.symbols)
+                self.stats["bulk"] += 1
+            except Exception as e:
+                logger.debug("fetch_funding_rates failed, por símbolo: %s", e)
+        if data is None:
+            res = await asyncio.gather(*(self._call(self.ccxt.fetch_funding_rate, s) for s in self.symbols),
+                                       return_exceptions=True)
+            data = {s: r for s, r in zip(self.symbols, res) if not isinstance(r, Exception)}
+            self.stats["single"] += len(self.symbols)
+            if not data:
+                self.stats["failed"] += 1
+                self.retry_at = now_ts + self.retry_s
+                logger.warning("funding refresh failed para %d símbolos", len(self.symbols))
+                return
+        for sym, fr in (data or {}).items():
+            try:
+                self.rates[sym] = float(fr.get("fundingRate") or 0.0)
+            except (TypeError, ValueError):
+                continue
+            nxt = fr.get("nextFundingTimestamp") or fr.get("fundingTimestamp")
+            self.next_ts[sym] = float(nxt) / 1000.0 if nxt else None
+        self.fetched_at = now_ts
+        stale = [s for s in self.symbols if s not in self.rates or 0 < (self.next_ts.get(s) or 0) <= now_ts]
+        if stale:
+            self.stats["partial"] += 1
+            self.retry_at = now_ts + min(self.retry_s, self.max_age_s)
+            logger.debug("funding incompleto (%s); reintento en %.0fs", ",".join(stale), self.retry_at - now_ts)
+        else:
+            self.retry_at = 0.0
+
+    def bps(self, symbol):
+        r = self.rates.get(symbol)
+        return annualized_bps(r) if r is not None else None
+
+    def next_funding(self, symbol, now_ts: float = None):
+        """Próxima liquidación (epoch s) según el exchange; grilla de 8h si no se conoce."""
+        now_ts = time.time() if now_ts is None else now_ts
+        nxt = self.next_ts.get(symbol)
+        if nxt and nxt > now_ts:
+            return nxt
+        return next_grid_ts(now_ts)
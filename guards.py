@@ -6,17 +6,31 @@ class Limits:
     max_per_symbol: int
     no_hedge: bool
 
+def _side_count(lots, side):
+    n = getattr(lots, "n_side", None)   # LotBook: contadores corrientes
+    return n(side) if n else sum(1 for L in lots if L['side'] == side)
+
+def _qty_and_margin_qty(lots):
+    """(sum |qty|, sum |qty|/lev) del símbolo; O(1) con LotBook."""
+    if hasattr(lots, "margin_qty"):
+        return lots.gross_qty, lots.margin_qty
+    q = mq = 0.0
+    for L in lots:
+        q += abs(L['qty'])
+        mq += abs(L['qty']) / max(int(L.get('lev',1)), 1)
+    return q, mq
+
 def can_open(symbol, side, all_positions, limits: Limits):
-    total = sum(len(v) for v in all_positions.values())
+    tl = getattr(all_positions, "total_lots", None)   # Positions: contador corriente
+    total = tl() if tl else sum(len(v) for v in all_positions.values())
     per_sym = len(all_positions.get(symbol, []))
     if total >= limits.max_total_positions:
         return False, "REJECT_MAX_TOTAL"
     if per_sym >= limits.max_per_symbol:
         return False, "REJECT_MAX_PER_SYMBOL"
-    if limits.no_hedge:
-        for lot in all_positions.get(symbol, []):
-            if lot['side'] != side:
-                return False, "REJECT_NO_HEDGE"
+    if limits.no_hedge and per_sym:
+        if _side_count(all_positions[symbol], "short" if side == "long" else "long"):
+            return False, "REJECT_NO_HEDGE"
     return True, ""
 
 def portfolio_caps_ok(equity, positions, price_by_symbol, caps: dict):
@@ -25,11 +39,12 @@ def portfolio_caps_ok(equity, positions, price_by_symbol, caps: dict):
     for sym, lots in positions.items():
         p = price_by_symbol.get(sym)
         if p is None: continue
-        for L in lots:
-            notional = abs(L['qty']) * p
-            notional_total += notional
-            lev = max(int(L.get('lev',1)), 1)
-            margin_total += notional / lev
+        q, mq = _qty_and_margin_qty(lots)
+        notional_total += q * p
+        margin_total += mq * p
+    return caps_verdict(equity, notional_total, margin_total, caps)
+
+def caps_verdict(equity, notional_total, margin_total, caps: dict):
     lev_port = (notional_total / equity) if equity else 0.0
     margin_pct = (margin_total / equity) if equity else 0.0
 
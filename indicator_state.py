@@ -0,0 +1,235 @@
+import math
+from collections import deque
+
+_NAN = float("nan")
+
+COLUMNS = ["ts", "open", "high", "low", "close", "volume",
+           "ema_fast", "ema_slow", "macd", "macd_signal", "macd_hist", "rsi", "adx",
+           "bb_high", "bb_low", "bb_width", "atr", "vol_mean", "vol_ok"]
+
+
+class _Ewm:
+    """ewm(adjust=False, min_periods) de pandas, paso a paso (misma aritmética)."""
+    __slots__ = ("old", "new", "minp", "value", "nobs")
+
+    def __init__(self, minp, span=None, alpha=None):
+        com = (span - 1) / 2 if span is not None else (1 - alpha) / alpha
+        a = 1.0 / (1.0 + com)
+        self.old, self.new = 1.0 - a, a
+        self.minp = int(minp)
+        self.value, self.nobs = _NAN, 0
+
+    def step(self, x, commit=True):
+        v, n = self.value, self.nobs
+        if x == x:
+            n += 1
+            if v != v:
+                v = x
+            elif v != x:
+                v = (self.old * v + self.new * x) / (self.old + self.new)
+        if commit:
+            self.value, self.nobs = v, n
+        return v if n >= self.minp else _NAN
+
+
+class _Rolling:
+    """Media y desvío poblacional (ddof=0) sobre una ventana fija."""
+    __slots__ = ("n", "win")
+
+    def __init__(self, n):
+        self.n = int(n)
+        self.win = deque(maxlen=self.n)
+
+    def step(self, x, commit=True):
+        if commit:
+            self.win.append(x)
+            vals = self.win
+        else:
+            vals = list(self.win)[1:] if len(self.win) == self.n else list(self.win)
+            vals.append(x)
+        if len(vals) < self.n:
+            return _NAN, _NAN
+        mean = sum(vals) / self.n
+        return mean, math.sqrt(sum((v - mean) ** 2 for v in vals) / self.n)
+
+
+class _Atr:
+    """AverageTrueRange de `ta`: 0 hasta completar la ventana, luego suavizado de Wilder."""
+    __slots__ = ("w", "n", "acc", "atr", "prev_close")
+
+    def __init__(self, w):
+        self.w = int(w)
+        self.n, self.acc, self.atr, self.prev_close = 0, 0.0, 0.0, None
+
+    def step(self, h, l, c, commit=True):
+        pc = self.prev_close
+        tr = h - l if pc is None else max(h - l, abs(h - pc), abs(l - pc))
+        n, acc, atr = self.n + 1, self.acc, self.atr
+        if n < self.w:
+            acc += tr
+            out = 0.0
+        elif n == self.w:
+            atr = out = (acc + tr) / self.w
+        else:
+            atr = out = (atr * (self.w - 1) + tr) / float(self.w)
+        if commit:
+            self.n, self.acc, self.atr, self.prev_close = n, acc, atr, c
+        return out
+
+
+class _Adx:
+    """ADXIndicator de `ta` (incluye sus ceros iniciales) en O(1) por vela."""
+    __slots__ = ("w", "t", "prev", "trs", "dip", "din", "di_first", "adx")
+
+    def __init__(self, w):
+        self.w = int(w)
+        self.t = -1
+        self.prev = None
+        self.trs = self.dip = self.din = 0.0
+        self.di_first = []
+        self.adx = 0.0
+
+    def step(self, h, l, c, commit=True):
+        w = self.w
+        t = self.t + 1
+        trs, dip, din, adx = self.trs, self.dip, self.din, self.adx
+        di_first = self.di_first
+        out = 0.0
+        if self.prev is not None:
+            ph, pl, pc = self.prev
+            dm = max(h, pc) - min(l, pc)
+            up, down = h - ph, pl - l
+            pos = up if (up > down and up > 0) else 0.0
+            neg = down if (down > up and down > 0) else 0.0
+            if t <= w:
+                trs, dip, din = trs + dm, dip + pos, din + neg
+            else:
+                trs = trs - (trs / float(w)) + dm
+                dip = dip - (dip / float(w)) + pos
+                din = din - (din / float(w)) + neg
+            if t >= w:
+                dip_p = 100 * (dip / trs) if trs != 0 else 0
+                din_p = 100 * (din / trs) if trs != 0 else 0
+                di = 100 * abs((dip_p - din_p) / (dip_p + din_p)) if dip_p + din_p != 0 else 0
+                j = t - w + 1
+                if j < w:
+                    if commit:
+                        di_first = di_first + [di]
+                elif j == w:
+                    adx = out = (sum(di_first) + di) / w
+                else:
+                    adx = out = ((adx * (w - 1)) + di) / float(w)
+        if commit:
+            self.t, self.prev = t, (h, l, c)
+            self.trs, self.dip, self.din, self.adx = trs, dip, din, adx
+            self.di_first = di_first if t - w + 1 < w else []
+        return out
+
+
+class IndicatorState:
+    """Versión incremental de compute_indicators para un símbolo/timeframe.
+
+    Cada vela cerrada se incorpora con update() en O(1); la vela abierta se
+    evalúa con peek() sin tocar el estado. Los valores coinciden con
+    compute_indicators (librería `ta`) calculado sobre la misma historia
+    desde la primera vela sembrada.
+    """
+
+    def __init__(self, conf: dict):
+        conf = conf or {}
+        self.conf = conf
+        fast, slow = int(conf.get('ema_fast', 21)), int(conf.get('ema_slow', 55))
+        mf, ms, sg = int(conf.get('macd_fast', 12)), int(conf.get('macd_slow', 26)), int(conf.get('macd_signal', 9))
+        rsi_len = int(conf.get('rsi_len', 14))
+        self.bb_dev = float(conf.get('bb_dev', 2.0))
+        self.vol_mult = float(conf.get('vol_multiplier_vs_mean', 1.2))
+        self._ema_fast, self._ema_slow = _Ewm(fast, span=fast), _Ewm(slow, span=slow)
+        self._macd_fast, self._macd_slow = _Ewm(mf, span=mf), _Ewm(ms, span=ms)
+        self._macd_sig = _Ewm(sg, span=sg)
+        self._rsi_up, self._rsi_dn = _Ewm(rsi_len, alpha=1 / rsi_len), _Ewm(rsi_len, alpha=1 / rsi_len)
+        self._adx = _Adx(int(conf.get('adx_len', 14)) if 'adx_len' in conf else 14)
+        self._bb = _Rolling(int(conf.get('bb_len', 20)))
+        self._atr = _Atr(int(conf.get('atr_len', 14)))
+        self._vol = _Rolling(20)
+        self._prev_close = None
+        self.last_ts = None
+        self.last = None
+
+    def _step(self, bar, commit):
+        ts, o, h, l, c, v = bar[:6]
+        ema_fast = self._ema_fast.step(c, commit)
+        ema_slow = self._ema_slow.step(c, commit)
+        mf, ms = self._macd_fast.step(c, commit), self._macd_slow.step(c, commit)
+        macd = mf - ms
+        macd_signal = self._macd_sig.step(macd, commit)
+
+        pc = self._prev_close
+        diff = _NAN if pc is None else c - pc
+        up = self._rsi_up.step(diff if diff > 0 else 0.0, commit)
+        dn = self._rsi_dn.step(-diff if diff < 0 else -0.0, commit)
+        if up != up or dn != dn:
+            rsi = _NAN
+        else:
+            rsi = 100.0 if dn == 0 else 100 - (100 / (1 + up / dn))
+
+        bb_mid, bb_std = self._bb.step(c, commit)
+        bb_high = bb_mid + self.bb_dev * bb_std
+        bb_low = bb_mid - self.bb_dev * bb_std
+        vol_mean, _ = self._vol.step(v, commit)
+        row = {
+            "ts": ts, "open": o, "high": h, "low": l, "close": c, "volume": v,
+            "ema_fast": ema_fast, "ema_slow": ema_slow,
+            "macd": macd, "macd_signal": macd_signal, "macd_hist": macd - macd_signal,
+            "rsi": rsi,
+            "adx": self._adx.step(h, l, c, commit),
+            "bb_high": bb_high, "bb_low": bb_low, "bb_width": (bb_high - bb_low) / c * 10000.0,
+            "atr": self._atr.step(h, l, c, commit),
+            "vol_mean": vol_mean, "vol_ok": v > self.vol_mult * vol_mean,
+        }
+        if commit:
+            self._prev_close = c
+            self.last_ts = ts
+            self.last = row
+        return row
+
+    def update(self, bar) -> dict:
+        """Incorpora una vela cerrada (ts, o, h, l, c, v) y devuelve su fila de indicadores."""
+        return self._step(bar, True)
+
+    def peek(self, bar) -> dict:
+        """Fila de indicadores de una vela todavía abierta, sin modificar el estado."""
+        return self._step(bar, False)
+
+    def seed(self, bars):
+        for bar in bars:
+            self.update(bar)
+        return self.last
+
+    @staticmethod
+    def ready(row) -> bool:
+        """Equivalente a que compute_indicators no descarte la fila en dropna()."""
+        return row is not None and not any(isinstance(x, float) and x != x for x in row.values())
+
+    def sync(self, bars):
+        """Alinea el estado con un buffer de velas cuya última vela puede estar abierta.
+
+        Incorpora las velas cerradas nuevas y devuelve la fila de la última (peek).
+        Si el buffer ya no solapa con lo visto (hueco largo) se re-siembra.
+        """
+        if not bars:
+            return None
+        last_ts = self.last_ts
+        if last_ts is not None and bars[0][0] > last_ts:
+            self.__init__(self.conf)
+            last_ts = None
+        new = []
+        for bar in reversed(bars):
+            if last_ts is not None and bar[0] <= last_ts:
+                break
+            new.append(bar)
+        if not new:
+            return self.last
+        new.reverse()
+        for bar in new[:-1]:
+            self.update(bar)
+        return self.peek(new[-1])
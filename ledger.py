@@ -0,0 +1,171 @@
+import datetime as dt
+import logging
+from array import array
+from collections import deque
+
+from bot.storage.csv_store import iter_rows
+
+logger = logging.getLogger("ledger")
+
+
+def _ts_to_dt(ts):
+    """ts ISO (naive = UTC, con o sin Z) o epoch -> datetime UTC naive; None si no se puede leer."""
+    if isinstance(ts, (int, float)):
+        return dt.datetime.utcfromtimestamp(float(ts))
+    s = str(ts or "").strip()
+    if not s:
+        return None
+    try:
+        d = dt.datetime.fromisoformat(s.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            return dt.datetime.utcfromtimestamp(float(s))
+        except ValueError:
+            return None
+    if d.tzinfo is not None:
+        d = d.astimezone(dt.timezone.utc).replace(tzinfo=None)
+    return d
+
+
+def layer_of(regime) -> str:
+    regime = str(regime or "").lower()
+    if "trend" in regime:
+        return "trend"
+    if regime in ("range", "chop"):
+        return "range"
+    return "other"
+
+
+class _Agg:
+    __slots__ = ("n", "pnl", "gains", "loss")
+
+    def __init__(self):
+        self.n, self.pnl, self.gains, self.loss = 0, 0.0, 0.0, 0.0
+
+    def add(self, pnl, sign=1):
+        self.n += sign
+        self.pnl += sign * pnl
+        if pnl >= 0:
+            self.gains += sign * pnl
+        else:
+            self.loss += sign * pnl
+
+    @property
+    def pf(self):
+        return (self.gains / abs(self.loss)) if self.loss < 0 else (self.gains if self.gains > 0 else 0.0)
+
+    @property
+    def expectancy(self):
+        return self.pnl / self.n if self.n else 0.0
+
+    def as_dict(self):
+        return {"n": self.n, "pnl": self.pnl, "gains": self.gains, "loss": self.loss}
+
+
+class Ledger:
+    """Trades y equity en memoria con agregados incrementales.
+
+    Se carga una vez de los CSV al arrancar y después se alimenta desde
+    log_trade/persist_equity. Es el único que lee la historia de los CSV: load()
+    le pasa cada fila a los `sinks` (read model, migración columnar). Mantiene:
+      - por (símbolo, capa) sobre los últimos `window` cierres (pausas por aprendizaje)
+      - del día UTC en curso: PF/expectancy, racha de pérdidas por símbolo y DD intradía
+      - pnl_net de todas las filas que lo traen (Kelly / VaR del BudgetManager)
+    """
+
+    def __init__(self, window: int = 600):
+        self.window = int(window)
+        self._closes = deque()           # (key, pnl) de los últimos `window` cierres
+        self.layers = {}                 # (sym, layer) -> _Agg
+        self.day = None
+        self.day_agg = _Agg()
+        self.day_streaks = {}            # sym -> pérdidas consecutivas hoy
+        self.day_eq_first = None
+        self.day_eq_peak = None
+        self.day_dd_min = 0.0
+        self.last_equity = None
+        self.pnl_net = array("d")
+
+    def load(self, csv_dir, sinks=()):
+        """Una pasada por trades/equity; cada fila va también a sink.on_trade/on_equity."""
+        try:
+            for row in iter_rows(csv_dir, "trades.csv"):
+                self.on_trade(row)
+                for s in sinks:
+                    s.on_trade(row)
+            for row in iter_rows(csv_dir, "equity.csv"):
+                self.on_equity(row)
+                for s in sinks:
+                    s.on_equity(row)
+        except Exception as e:
+            logger.warning("ledger load failed: %s", e)
+        return self
+
+    def _roll_day(self, day):
+        if day != self.day:
+            self.day = day
+            self.day_agg = _Agg()
+            self.day_streaks = {}
+            self.day_eq_first = self.day_eq_peak = None
+            self.day_dd_min = 0.0
+
+    def on_trade(self, row):
+        try:
+            self.pnl_net.append(float(row["pnl_net"]))
+        except (KeyError, TypeError, ValueError):
+            pass
+        if not str(row.get("note") or "").upper().startswith("CLOSE"):
+            return
+        try:
+            pnl = float(row.get("pnl") or 0.0)
+        except (TypeError, ValueError):
+            return
+        sym = row.get("symbol", "")
+        d = _ts_to_dt(row.get("ts") or row.get("time"))
+        if d is not None and (self.day is None or d.date() >= self.day):
+            self._roll_day(d.date())
+            self.day_agg.add(pnl)
+            self.day_streaks[sym] = self.day_streaks.get(sym, 0) + 1 if pnl < 0 else 0
+
+        layer = layer_of(row.get("regime") or row.get("entry_regime"))
+        key = (sym, layer) if sym and layer != "other" else None
+        self._closes.append((key, pnl))
+        if key is not None:
+            self.layers.setdefault(key, _Agg()).add(pnl)
+        if len(self._closes) > self.window:
+            old_key, old_pnl = self._closes.popleft()
+            if old_key is not None:
+                self.layers[old_key].add(old_pnl, -1)
+
+    def on_equity(self, row):
+        try:
+            eq = float(row.get("equity") or 0.0)
+        except (TypeError, ValueError):
+            return
+        self.last_equity = eq
+        d = _ts_to_dt(row.get("ts") or row.get("time"))
+        if d is None or (self.day is not None and d.date() < self.day):
+            return
+        self._roll_day(d.date())
+        if self.day_eq_first is None:
+            self.day_eq_first = self.day_eq_peak = eq
+        if eq > self.day_eq_peak:
+            self.day_eq_peak = eq
+        dd = (eq - self.day_eq_peak) / self.day_eq_peak if self.day_eq_peak > 0 else 0.0
+        if dd < self.day_dd_min:
+            self.day_dd_min = dd
+
+    # --- consultas O(1) ---
+    def layer_stats(self):
+        """{(sym, layer): {'n','pnl','gains','loss','pf','expectancy'}} sobre los últimos `window` cierres."""
+        return {k: {**a.as_dict(), "pf": (a.gains / abs(a.loss)) if a.loss < 0 else 999.0, "expectancy": a.expectancy}
+                for k, a in self.layers.items() if a.n > 0}
+
+    def today(self, now=None):
+        """Agregados del día UTC de `now` (vacíos si todavía no hubo nada ese día)."""
+        day = (now or dt.datetime.utcnow()).date()
+        if day != self.day:
+            return {"closes": 0, "pnl": 0.0, "pf": 0.0, "expectancy": 0.0, "streaks": {}, "dd_min": 0.0}
+        a = self.day_agg
+        return {"closes": a.n, "pnl": a.pnl, "pf": a.pf, "expectancy": a.expectancy,
+                "streaks": dict(self.day_streaks), "dd_min": self.day_dd_min}
@@ -0,0 +1,316 @@
+import json, time
+
+# Lotes compactos (__slots__) con acceso tipo dict, para no tocar a los que
+# leen L['sl'] / L.get('lev'). Cada LotBook (uno por símbolo) lleva sumas
+# corrientes de qty por lado y de qty/lev, así exposición y márgenes salen en
+# O(1) por símbolo en vez de recorrer todos los lotes.
+
+FIELDS = ("side", "qty", "entry", "lev", "ts", "sl", "tp1", "tp2", "realized_pnl",
+          "trailing_anchor", "entry_adx", "leg")
+# lo que se guarda en state.json (ts se repone al cargar)
+STATE_FIELDS = ("side", "qty", "entry", "lev", "sl", "tp1", "tp2", "realized_pnl",
+                "trailing_anchor", "entry_adx", "leg")
+_INT = ("lev", "leg")
+_FLOAT = ("qty", "entry", "ts", "sl", "tp1", "tp2", "realized_pnl", "trailing_anchor", "entry_adx")
+_TRACKED = ("side", "qty", "lev")   # cambian los agregados del book
+
+
+def normalize_lot(pos):
+    """dict / JSON / bytes -> dict con tipos canónicos; None si no es un lote."""
+    if isinstance(pos, (bytes, bytearray)):
+        pos = pos.decode("utf-8", "ignore")
+    if isinstance(pos, str):
+        s = pos.strip()
+        if not s or s[0] not in "{[":
+            return None
+        try:
+            pos = json.loads(s)
+        except Exception:
+            return None
+    if isinstance(pos, Lot):
+        return pos.to_dict()
+    if not isinstance(pos, dict):
+        return None
+    out = dict(pos)
+    for k in _INT + _FLOAT:
+        if out.get(k) is not None:
+            try:
+                out[k] = int(float(out[k])) if k in _INT else float(out[k])
+            except Exception:
+                pass
+    if "side" in out and not isinstance(out["side"], str):
+        try:
+            out["side"] = out["side"].decode("utf-8", "ignore")
+        except Exception:
+            out["side"] = str(out["side"])
+    return out
+
+
+class Lot:
+    __slots__ = FIELDS + ("extra", "_book")
+
+    def __init__(self, side="long", qty=0.0, entry=0.0, lev=1, ts=None, sl=0.0, tp1=0.0, tp2=0.0,
+                 realized_pnl=0.0, trailing_anchor=None, entry_adx=0.0, leg=1, **extra):
+        self._book = None
+        self.side = side
+        self.qty = float(qty)
+        self.entry = float(entry)
+        self.lev = int(lev or 1)
+        self.ts = time.time() if ts is None else float(ts)
+        self.sl = float(sl)
+        self.tp1 = float(tp1)
+        self.tp2 = float(tp2)
+        self.realized_pnl = float(realized_pnl or 0.0)
+        self.trailing_anchor = None if trailing_anchor is None else float(trailing_anchor)
+        self.entry_adx = float(entry_adx or 0.0)
+        self.leg = int(leg or 1)
+        self.extra = extra or None
+
+    @classmethod
+    def from_any(cls, pos):
+        if isinstance(pos, Lot):
+            return pos
+        d = normalize_lot(pos)
+        if d is None:
+            raise ValueError(f"lote inválido: {pos!r}")
+        return cls(**d)
+
+    # --- acceso tipo dict ---
+    def __getitem__(self, k):
+        if k in FIELDS:
+            v = getattr(self, k)
+            if v is None:
+                raise KeyError(k)
+            return v
+        if self.extra and k in self.extra:
+            return self.extra[k]
+        raise KeyError(k)
+
+    def __setitem__(self, k, v):
+        if k not in FIELDS:
+            if self.extra is None:
+                self.extra = {}
+            self.extra[k] = v
+            return
+        book = self._book if k in _TRACKED else None
+        if book is not None:
+            book._sub(self)
+        setattr(self, k, v)
+        if book is not None:
+            book._add(self)
+
+    def get(self, k, default=None):
+        try:
+            return self[k]
+        except KeyError:
+            return default
+
+    def __contains__(self, k):
+        return (k in FIELDS and getattr(self, k) is not None) or bool(self.extra and k in self.extra)
+
+    def keys(self):
+        return [k for k in FIELDS if getattr(self, k) is not None] + list(self.extra or ())
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def to_dict(self):
+        return dict(self.items())
+
+    def to_state(self):
+        d = {k: getattr(self, k) for k in STATE_FIELDS}
+        if d["trailing_anchor"] is None:
+            d["trailing_anchor"] = self.entry
+        return d
+
+    def __repr__(self):
+        return f"Lot({self.to_dict()!r})"
+
+
+class LotBook(list):
+    """Lista de Lot de un símbolo con agregados corrientes.
+
+    qty_long / qty_short: qty bruta por lado; margin_qty: suma de |qty|/lev.
+    Notional y margen a un precio p son p * gross_qty y p * margin_qty.
+    """
+
+    def __init__(self, lots=()):
+        super().__init__()
+        self.qty_long = self.qty_short = self.margin_qty = 0.0
+        self.n_long = self.n_short = 0
+        self.sym = None
+        self._owner = None       # Positions que recibe los cambios
+        self.extend(lots)
+
+    def _changed(self):
+        if self._owner is not None:
+            self._owner._book_changed(self.sym)
+
+    # --- agregados ---
+    def _add(self, L, sign=1):
+        q = abs(L.qty)
+        if L.side == "long":
+            self.qty_long += sign * q
+            self.n_long += sign
+        else:
+            self.qty_short += sign * q
+            self.n_short += sign
+        self.margin_qty += sign * q / max(int(L.lev or 1), 1)
+        if not self.n_long and not self.n_short:
+            self.qty_long = self.qty_short = self.margin_qty = 0.0   # sin arrastre de redondeo
+        self._changed()
+
+    def _sub(self, L):
+        self._add(L, -1)
+
+    def _attach(self, L):
+        L = Lot.from_any(L)
+        L._book = self
+        self._add(L)
+        return L
+
+    def _detach(self, L):
+        self._sub(L)
+        L._book = None
+        return L
+
+    @property
+    def gross_qty(self):
+        return self.qty_long + self.qty_short
+
+    @property
+    def net_qty(self):
+        return self.qty_long - self.qty_short
+
+    def qty(self, side):
+        return self.qty_long if side == "long" else self.qty_short
+
+    def n_side(self, side):
+        return self.n_long if side == "long" else self.n_short
+
+    # --- mutaciones de list ---
+    def append(self, L):
+        super().append(self._attach(L))
+
+    def extend(self, lots):
+        for L in lots:
+            self.append(L)
+
+    def __iadd__(self, lots):
+        self.extend(lots)
+        return self
+
+    def insert(self, i, L):
+        super().insert(i, self._attach(L))
+
+    def pop(self, i=-1):
+        return self._detach(super().pop(i))
+
+    def remove(self, L):
+        i = self.index(L)
+        del self[i]
+
+    def clear(self):
+        for L in self:
+            L._book = None
+        super().clear()
+        self.qty_long = self.qty_short = self.margin_qty = 0.0
+        self.n_long = self.n_short = 0
+        self._changed()
+
+    def __setitem__(self, i, L):
+        if isinstance(i, slice):
+            for old in self[i]:
+                self._detach(old)
+            super().__setitem__(i, [self._attach(x) for x in L])
+        else:
+            self._detach(self[i])
+            super().__setitem__(i, self._attach(L))
+
+    def __delitem__(self, i):
+        for old in (self[i] if isinstance(i, slice) else [self[i]]):
+            self._detach(old)
+        super().__delitem__(i)
+
+    def to_state(self):
+        return [L.to_state() for L in self]
+
+
+class Positions(dict):
+    """{symbol: LotBook}; convierte lo que el Trader guarde (listas de dicts).
+
+    Lleva el total de lotes y avisa cada cambio de un símbolo a `listener(sym)`
+    (el agregador de exposición).
+    """
+
+    def __init__(self, data=None):
+        super().__init__()
+        self._n = 0
+        self._counts = {}
+        self.listener = None
+        for sym, lots in (data or {}).items():
+            self[sym] = lots
+
+    def _book_changed(self, sym):
+        book = dict.get(self, sym)
+        n = book.n_long + book.n_short if book is not None and book._owner is self else 0
+        self._n += n - self._counts.get(sym, 0)
+        self._counts[sym] = n
+        if self.listener is not None:
+            self.listener(sym)
+
+    def __setitem__(self, sym, lots):
+        book = lots if isinstance(lots, LotBook) else LotBook(lots)
+        old = dict.get(self, sym)
+        if old is not None and old is not book:
+            old._owner = None
+        book.sym, book._owner = sym, self
+        super().__setitem__(sym, book)
+        self._book_changed(sym)
+
+    def __delitem__(self, sym):
+        dict.__getitem__(self, sym)._owner = None
+        super().__delitem__(sym)
+        self._book_changed(sym)
+
+    def pop(self, sym, *default):
+        if sym not in self:
+            return dict.pop(self, sym, *default)
+        book = dict.pop(self, sym)
+        book._owner = None
+        self._book_changed(sym)
+        return book
+
+    def clear(self):
+        syms = list(self)
+        for book in self.values():
+            book._owner = None
+        super().clear()
+        for sym in syms:
+            self._book_changed(sym)
+
+    def setdefault(self, sym, default=None):
+        if sym not in self:
+            self[sym] = default or ()
+        return self[sym]
+
+    def update(self, other=(), **kw):
+        for sym, lots in dict(other, **kw).items():
+            self[sym] = lots
+
+    def total_lots(self):
+        return self._n
+
+    def to_state(self):
+        return {sym: book.to_state() for sym, book in self.items() if len(book)}
+
+    @classmethod
+    def from_state(cls, snap_positions, now=None):
+        """Inverso de to_state: ts de cada lote = ahora (no se persiste)."""
+        now = time.time() if now is None else now
+        out = cls()
+        for sym, lots in (snap_positions or {}).items():
+            book = LotBook(Lot(**{**normalize_lot(L), "ts": now}) for L in lots if normalize_lot(L))
+            if len(book):
+                out[sym] = book
+        return out
@@ -1,3 +1,5 @@
+import numpy as np
+
 def infer_regime(row) -> str:
     """
     Clasifica mercado: 'trend_up', 'trend_down', 'range', 'chop' según EMA y ADX/BB.
@@ -17,3 +19,14 @@ def infer_regime(row) -> str:
     if close < ema_slow and ema_fast < ema_slow:
         return "trend_down"
     return "range"
+
+
+def infer_regime_array(adx, bb, ema_fast, ema_slow, close):
+    """infer_regime para arrays enteros (mismo orden de reglas; NaN cae igual que en escalar)."""
+    adx, bb, ema_fast, ema_slow, close = (np.asarray(x, dtype=float) for x in (adx, bb, ema_fast, ema_slow, close))
+    with np.errstate(invalid="ignore"):
+        conds = [(adx < 12) | (bb < 6),
+                 (np.abs(bb) < 8) & (adx < 18),
+                 (close > ema_slow) & (ema_fast > ema_slow),
+                 (close < ema_slow) & (ema_fast < ema_slow)]
+    return np.select(conds, ["chop", "range", "trend_up", "trend_down"], default="range").astype(object)
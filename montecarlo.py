@@ -1,22 +1,71 @@
 import pandas as pd, numpy as np, argparse, os, json
+
+PCTS = (1, 5, 25, 50, 75, 95, 99)
+
+def bootstrap_index(n, runs, block, rng):
+    """Índices (runs, n) remuestreados por bloques circulares de largo `block` (block=1 => bootstrap iid)."""
+    nb = -(-n // block)
+    starts = rng.integers(0, n, size=(runs, nb))
+    idx = (starts[:, :, None] + np.arange(block)) % n
+    return idx.reshape(runs, nb * block)[:, :n]
+
+def simulate(rets, runs=10000, block=1, equity0=1000.0, ruin_pct=0.5, seed=None, chunk_cells=8_000_000):
+    """Monte Carlo matricial por chunks: devuelve arrays final, max_dd, max_dd_pct y ruin (bool) por corrida.
+
+    El drawdown se mide contra el pico incluyendo el equity inicial; ruina = el equity
+    toca equity0 * (1 - ruin_pct) en algún momento.
+    """
+    rets = np.asarray(rets, dtype=float)
+    n = len(rets)
+    rng = np.random.default_rng(seed)
+    block = max(1, min(int(block), n))
+    chunk = max(1, min(runs, chunk_cells // max(n, 1)))
+    final = np.empty(runs); max_dd = np.empty(runs); max_dd_pct = np.empty(runs); ruin = np.empty(runs, dtype=bool)
+    ruin_level = equity0 * (1.0 - ruin_pct)
+    for a in range(0, runs, chunk):
+        b = min(runs, a + chunk)
+        eq = np.cumsum(rets[bootstrap_index(n, b - a, block, rng)], axis=1)
+        eq += equity0
+        peak = np.maximum.accumulate(eq, axis=1)
+        np.maximum(peak, equity0, out=peak)
+        dd = eq - peak
+        final[a:b] = eq[:, -1]
+        max_dd[a:b] = dd.min(axis=1)
+        max_dd_pct[a:b] = (dd / peak).min(axis=1)
+        ruin[a:b] = eq.min(axis=1) <= ruin_level
+    return final, max_dd, max_dd_pct, ruin
+
+def summarize(final, max_dd, max_dd_pct, ruin, equity0=1000.0):
+    band = lambda x: {f"p{p}": float(v) for p, v in zip(PCTS, np.percentile(x, PCTS))}
+    return {
+        "runs": int(len(final)),
+        "final": {"mean": float(final.mean()), **band(final)},
+        "maxDD": band(max_dd),
+        "maxDD_pct": band(max_dd_pct),
+        "prob_loss": float((final < equity0).mean()),
+        "risk_of_ruin": float(ruin.mean()),
+    }
+
 def main():
     p=argparse.ArgumentParser()
     p.add_argument("results_csv")
     p.add_argument("--runs", type=int, default=1000)
+    p.add_argument("--block", type=int, default=0, help="largo de bloque (0 = auto n^(1/3), 1 = iid)")
+    p.add_argument("--equity0", type=float, default=1000.0)
+    p.add_argument("--ruin", type=float, default=0.5, help="fracción de equity0 perdida que cuenta como ruina")
+    p.add_argument("--seed", type=int, default=None)
     args=p.parse_args()
     df=pd.read_csv(args.results_csv)
     rets=df["pnl"].dropna().values
     if len(rets)==0: print("No hay pnl en CSV"); return
-    stats=[]
-    for _ in range(args.runs):
-        s=np.random.choice(rets, size=len(rets), replace=True)
-        eq=1000+np.cumsum(s)
-        dd=np.min(eq-np.maximum.accumulate(eq))
-        stats.append({"final":eq[-1],"maxDD":dd})
-    out=pd.DataFrame(stats)
+    block = args.block or max(1, int(round(len(rets) ** (1 / 3))))
+    final, dd, dd_pct, ruin = simulate(rets, args.runs, block, args.equity0, args.ruin, args.seed)
+    out = {"trades": int(len(rets)), "block": block, "equity0": args.equity0, "ruin_pct": args.ruin,
+           **summarize(final, dd, dd_pct, ruin, args.equity0)}
     os.makedirs("data/metrics", exist_ok=True)
     path="data/metrics/montecarlo.json"
-    out.to_json(path, orient="records")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(out, f, indent=2)
     print("Monte Carlo:", path)
 if __name__=="__main__":
     main()
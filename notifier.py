@@ -1,19 +1,113 @@
-import os, logging
+import os, time, asyncio, logging
+from collections import deque
 from telegram import Bot
 
 log = logging.getLogger("notifier")
 
+MAX_LEN = 4096  # límite de Telegram por mensaje
+
+
+def split_message(text: str, limit: int = MAX_LEN):
+  """Parte en trozos <= limit, cortando por líneas cuando se puede."""
+  out, cur = [], ""
+  for line in text.split("\n"):
+    while len(line) > limit:
+      if cur:
+        out.append(cur); cur = ""
+      out.append(line[:limit]); line = line[limit:]
+    if cur and len(cur) + 1 + len(line) > limit:
+      out.append(cur); cur = line
+    else:
+      cur = f"{cur}\n{line}" if cur else line
+  if cur:
+    out.append(cur)
+  return out
+
+
 class Notifier:
-  def __init__(self):
+  """Envío a Telegram sin bloquear al que llama.
+
+  send() solo encola; un task de fondo respeta anti_spam.min_interval_s entre
+  envíos, junta lo acumulado en un mensaje (partido en 4096), descarta repetidos
+  dentro de dedup_window_s y, si la cola se llena, tira los más viejos.
+  """
+
+  def __init__(self, conf: dict = None):
+    conf = conf or {}
     # accept both TELEGRAM_TOKEN and TELEGRAM_BOT_TOKEN
     self.token = os.getenv("TELEGRAM_TOKEN") or os.getenv("TELEGRAM_BOT_TOKEN")
     self.chat_id = os.getenv("TELEGRAM_CHAT_ID")
     self.bot = Bot(self.token) if self.token else None
+    self.min_interval = float(conf.get("anti_spam", {}).get("min_interval_s", 1.0))
+    self.dedup_window = float(conf.get("dedup_window_s", 60))
+    self.max_backlog = int(conf.get("max_backlog", 500))
+    self._q = deque()
+    self._recent = {}          # texto -> último encolado (monotonic)
+    self._wake = None
+    self._task = None
+    self._last_send = 0.0
+    self._busy = False
+    self.stats = {"queued": 0, "sent": 0, "batches": 0, "deduped": 0, "dropped": 0, "failed": 0}
 
   async def send(self, text: str):
     if not self.bot or not self.chat_id:
       return
+    now = time.monotonic()
+    last = self._recent.get(text)
+    if last is not None and now - last < self.dedup_window:
+      self.stats["deduped"] += 1
+      return
+    self._recent[text] = now
+    if len(self._recent) > 4 * self.max_backlog:
+      self._recent = {k: t for k, t in self._recent.items() if now - t < self.dedup_window}
+    if len(self._q) >= self.max_backlog:
+      self._q.popleft()
+      self.stats["dropped"] += 1
+      if self.stats["dropped"] % 100 == 1:
+        log.warning("notifier backlog lleno (%d): descartados %d", self.max_backlog, self.stats["dropped"])
+    self._q.append(text)
+    self.stats["queued"] += 1
+    self._ensure_task()
+    self._wake.set()
+
+  def _ensure_task(self):
+    if self._task is None or self._task.done():
+      self._wake = self._wake or asyncio.Event()
+      self._task = asyncio.get_running_loop().create_task(self._run())
+
+  async def _run(self):
+    while True:
+      await self._wake.wait()
+      wait = self.min_interval - (time.monotonic() - self._last_send)
+      if wait > 0:
+        await asyncio.sleep(wait)   # mientras tanto se sigue acumulando
+      self._wake.clear()
+      if not self._q:
+        continue
+      batch = list(self._q); self._q.clear()
+      self._busy = True
+      self.stats["batches"] += 1
+      try:
+        for i, chunk in enumerate(split_message("\n".join(batch))):
+          if i:
+            await asyncio.sleep(self.min_interval)
+          await self._deliver(chunk)
+      finally:
+        self._busy = False
+      self.stats["sent"] += len(batch)
+      if self._q:
+        self._wake.set()
+
+  async def _deliver(self, text: str):
+    self._last_send = time.monotonic()
     try:
       await self.bot.send_message(self.chat_id, text)
     except Exception as e:
+      self.stats["failed"] += 1
       log.warning("notify failed: %s", e)
+
+  async def flush(self, timeout: float = 10.0):
+    """Espera (hasta timeout) a que se vacíe la cola, p.ej. antes de apagar."""
+    end = time.monotonic() + timeout
+    while (self._q or self._busy) and time.monotonic() < end:
+      await asyncio.sleep(0.05)
@@ -1 +1,260 @@
-print("Optimizer simple: adaptar a tus CSV y parámetros; recorre grids y guarda el mejor por métrica.")
+"""Optimizador de parámetros de estrategia sobre el replay del motor (bot.replay).
+
+Busca en grilla, al azar o de forma adaptativa (refina alrededor de los mejores)
+sobre stop_mult, tp1_r, tp2_r, umbrales RSI, largos de EMA y trailing atr_k.
+Cada trial corre un ReplayApp en un ProcessPoolExecutor. Los indicadores se
+calculan una sola vez por combinación de parámetros de indicadores y se pasan
+a los workers como .npy mapeados en memoria (solo lectura).
+
+Uso:
+  python optimize.py --config config.yaml --csv BTC/USDT:USDT=data/btc_1m.csv --mode random --trials 300
+"""
+import argparse, itertools, json, math, os, random, shutil, tempfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import pandas as pd
+
+# nombre del parámetro -> (sección de config, clave)
+PARAM_PATHS = {
+    "stop_mult": ("strategy", "stop_mult"),
+    "tp1_r": ("strategy", "tp1_r"),
+    "tp2_r": ("strategy", "tp2_r"),
+    "rsi_long": ("strategy", "rsi_long"),
+    "rsi_short": ("strategy", "rsi_short"),
+    "rsi_low": ("strategy", "rsi_low"),
+    "rsi_high": ("strategy", "rsi_high"),
+    "ema_fast": ("indicators", "ema_fast"),
+    "ema_slow": ("indicators", "ema_slow"),
+    "atr_k": ("trailing", "atr_k"),
+}
+# parámetros que cambian las columnas de indicadores (el resto solo cambia decisiones)
+INDICATOR_PARAMS = ("ema_fast", "ema_slow")
+
+DEFAULT_SPACE = {
+    "stop_mult": [1.0, 1.5, 2.0, 2.5],
+    "tp1_r": [0.8, 1.0, 1.5],
+    "tp2_r": [2.0, 2.4, 3.0],
+    "rsi_long": [50, 52, 55],
+    "rsi_short": [45, 48, 50],
+    "ema_fast": [13, 21, 34],
+    "ema_slow": [55, 89],
+    "atr_k": [1.5, 2.0, 3.0],
+}
+
+METRICS = ("pf", "expectancy", "max_dd")
+
+
+def apply_params(cfg: dict, params: dict) -> dict:
+    cfg = json.loads(json.dumps(cfg))
+    for name, value in params.items():
+        section, key = PARAM_PATHS[name]
+        cfg.setdefault(section, {})[key] = value
+    return cfg
+
+
+def indicator_key(params: dict) -> tuple:
+    return tuple((k, params[k]) for k in INDICATOR_PARAMS if k in params)
+
+
+# --- generación de candidatos ---
+def grid_candidates(space: dict):
+    names = list(space)
+    for combo in itertools.product(*(space[n] for n in names)):
+        yield dict(zip(names, combo))
+
+
+def random_candidates(space: dict, n: int, rng: random.Random):
+    seen = set()
+    total = math.prod(len(v) for v in space.values())
+    while len(seen) < min(n, total):
+        cand = {k: rng.choice(v) for k, v in space.items()}
+        key = tuple(sorted(cand.items()))
+        if key not in seen:
+            seen.add(key)
+            yield cand
+
+
+def neighbours(best: dict, space: dict, n: int, rng: random.Random):
+    """Candidatos a un paso de grilla de `best` en 1-2 parámetros."""
+    out = []
+    names = list(space)
+    for _ in range(n):
+        cand = dict(best)
+        for name in rng.sample(names, k=min(len(names), rng.choice((1, 2)))):
+            vals = space[name]
+            i = vals.index(cand[name]) if cand[name] in vals else 0
+            cand[name] = vals[max(0, min(len(vals) - 1, i + rng.choice((-1, 1))))]
+        out.append(cand)
+    return out
+
+
+# --- workers ---
+_W = {}
+
+
+def _init_worker(cfg, ind_paths):
+    _W["cfg"] = cfg
+    _W["ind_paths"] = ind_paths
+    _W["cache"] = {}
+
+
+def _indicator_task(bars, conf, path):
+    from bot.replay import indicator_array
+    np.save(path, indicator_array(bars, conf))
+    return path
+
+
+def _trial_task(params):
+    import asyncio
+    from bot.replay import ReplayApp
+    key = indicator_key(params)
+    ind = _W["cache"].get(key)
+    if ind is None:
+        # una sola key viva por worker: los arrays son memmaps de solo lectura
+        _W["cache"] = {key: {sym: np.load(p, mmap_mode="r") for sym, p in _W["ind_paths"][key].items()}}
+        ind = _W["cache"][key]
+    app = ReplayApp(apply_params(_W["cfg"], params), indicators=ind)
+    summary = asyncio.run(app.run_replay())
+    return {**params, **{k: summary[k] for k in ("closes", "pnl", "pf", "expectancy", "win_rate", "max_dd", "equity")}}
+
+
+def rank(results: pd.DataFrame, by: str = "pf", min_trades: int = 20) -> pd.DataFrame:
+    """Ordena por `by` (pf/expectancy desc, max_dd menos negativo primero) y desempata con el resto."""
+    order = [by] + [m for m in METRICS if m != by]
+    df = results.copy()
+    df["enough_trades"] = df["closes"] >= min_trades
+    df = df.sort_values(["enough_trades"] + order, ascending=[False] + [False] * len(order))
+    return df.drop(columns="enough_trades").reset_index(drop=True)
+
+
+class Optimizer:
+    def __init__(self, cfg: dict, bars_by_symbol: dict, space: dict, workers: int = None, workdir: str = None):
+        self.cfg = cfg
+        self.bars = bars_by_symbol
+        self.space = space
+        self.workers = max(1, int(workers or os.cpu_count() or 1))
+        self.workdir = workdir or tempfile.mkdtemp(prefix="optimize_")
+        self.ind_paths = {}
+        self.results = []
+        self._seen = set()
+        self._pool = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        if self._pool is not None:
+            self._pool.shutdown()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+    def _ensure_indicators(self, candidates):
+        """Calcula (en paralelo) los arrays de indicadores que falten para estos candidatos."""
+        missing = {indicator_key(c) for c in candidates} - set(self.ind_paths)
+        if not missing:
+            return
+        jobs = {}
+        with ProcessPoolExecutor(max_workers=self.workers) as ex:
+            for key in missing:
+                conf = {**self.cfg.get("filters", {}), **self.cfg.get("strategy", {}),
+                        **self.cfg.get("indicators", {}), **dict(key)}
+                paths = self.ind_paths.setdefault(key, {})
+                tag = "_".join(f"{k}{v}" for k, v in key) or "base"
+                for i, (sym, bars) in enumerate(self.bars.items()):
+                    paths[sym] = os.path.join(self.workdir, f"{tag}_{i}.npy")
+                    jobs[ex.submit(_indicator_task, bars, conf, paths[sym])] = key
+            for fut in as_completed(jobs):
+                fut.result()
+        # los workers de trials se reinician con el mapa de paths actualizado
+        if self._pool is not None:
+            self._pool.shutdown()
+            self._pool = None
+
+    def _pool_(self):
+        if self._pool is None:
+            self._pool = ProcessPoolExecutor(max_workers=self.workers, initializer=_init_worker,
+                                             initargs=(self.cfg, self.ind_paths))
+        return self._pool
+
+    def evaluate(self, candidates):
+        cands = []
+        for c in candidates:
+            key = tuple(sorted(c.items()))
+            if key not in self._seen:
+                self._seen.add(key)
+                cands.append(c)
+        if not cands:
+            return []
+        self._ensure_indicators(cands)
+        # agrupar por key de indicadores para que cada worker reuse sus memmaps
+        cands.sort(key=lambda c: indicator_key(c))
+        pool = self._pool_()
+        chunk = max(1, len(cands) // (self.workers * 4))
+        out = list(pool.map(_trial_task, cands, chunksize=chunk))
+        self.results.extend(out)
+        return out
+
+    def run(self, mode="random", trials=200, seed=0, rank_by="pf", min_trades=20):
+        rng = random.Random(seed)
+        if mode == "grid":
+            self.evaluate(grid_candidates(self.space))
+        elif mode == "random":
+            self.evaluate(random_candidates(self.space, trials, rng))
+        else:  # adaptive: arranque al azar y refinamiento alrededor de los mejores
+            first = max(self.workers * 2, trials // 3)
+            self.evaluate(random_candidates(self.space, first, rng))
+            batch = max(self.workers * 2, 8)
+            while len(self.results) < trials:
+                top = rank(pd.DataFrame(self.results), rank_by, min_trades).head(max(1, self.workers // 2))
+                cands = []
+                for best in top[list(self.space)].to_dict("records"):
+                    best = {k: (v.item() if hasattr(v, "item") else v) for k, v in best.items()}
+                    cands += neighbours(best, self.space, max(1, batch // len(top)), rng)
+                if not self.evaluate(cands[:trials - len(self.results)]):
+                    break
+        return rank(pd.DataFrame(self.results), rank_by, min_trades)
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--config", default="config.yaml")
+    p.add_argument("--csv", action="append", required=True, help="SIMBOLO=ruta.csv (OHLCV del timeframe base)")
+    p.add_argument("--base-tf", default="1m")
+    p.add_argument("--space", default=None, help="JSON con {parametro: [valores]} (default: DEFAULT_SPACE)")
+    p.add_argument("--mode", default="random", choices=["grid", "random", "adaptive"])
+    p.add_argument("--trials", type=int, default=200)
+    p.add_argument("--workers", type=int, default=None, help="default: todos los cores")
+    p.add_argument("--rank-by", default="pf", choices=list(METRICS))
+    p.add_argument("--min-trades", type=int, default=20)
+    p.add_argument("--seed", type=int, default=0)
+    p.add_argument("--out", default="data/metrics/optimize_results.csv")
+    args = p.parse_args()
+
+    from bot.config import load_config
+    from bot.replay import frame_to_bars
+    from bot.core.candle_store import strategy_timeframe
+    cfg = load_config(args.config)
+    space = DEFAULT_SPACE
+    if args.space:
+        with open(args.space, "r", encoding="utf-8") as f:
+            space = json.load(f)
+    unknown = set(space) - set(PARAM_PATHS)
+    if unknown:
+        p.error(f"parámetros desconocidos: {sorted(unknown)}")
+
+    tf = strategy_timeframe(cfg)
+    bars = {}
+    for spec in args.csv:
+        sym, path = spec.split("=", 1)
+        bars[sym] = frame_to_bars(pd.read_csv(path), args.base_tf, tf)
+    cfg["symbols"] = list(bars)
+
+    with Optimizer(cfg, bars, space, workers=args.workers) as opt:
+        table = opt.run(args.mode, args.trials, args.seed, args.rank_by, args.min_trades)
+    os.makedirs(os.path.dirname(args.out) or ".", exist_ok=True)
+    table.to_csv(args.out, index=False)
+    print(table.head(10).to_string())
+    print("Resultados:", args.out)
+
+
+if __name__ == "__main__":
+    main()
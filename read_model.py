@@ -0,0 +1,107 @@
+import time, threading
+import datetime as dt
+from collections import deque
+
+from bot.storage.ledger import _ts_to_dt
+
+WINDOWS = {"1d": 86400, "7d": 7 * 86400, "30d": 30 * 86400}
+
+
+def _epoch(ts):
+    d = _ts_to_dt(ts)
+    return d.replace(tzinfo=dt.timezone.utc).timestamp() if d is not None else None
+
+
+class _Window:
+    """Suma móvil de (ts, valor) sobre los últimos `seconds` segundos."""
+    __slots__ = ("seconds", "items", "total")
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+        self.items = deque()
+        self.total = 0.0
+
+    def add(self, ts, v):
+        self.items.append((ts, v))
+        self.total += v
+        self.value(ts)
+
+    def value(self, now):
+        cut = now - self.seconds
+        while self.items and self.items[0][0] < cut:
+            self.total -= self.items.popleft()[1]
+        return self.total
+
+
+class ReadModel:
+    """Agregados para comandos de Telegram, mantenidos con cada escritura del engine.
+
+    PnL y cantidad de trades a 1d/7d/30d, PnL acumulado de toda la historia, lotes
+    abiertos por símbolo reconstruidos de las notas OPEN/CLOSE y últimos saldos.
+    No lee los CSV: la historia le llega del Ledger.load (sink) y después
+    log_trade/persist_equity. Las consultas no tocan disco.
+    """
+
+    def __init__(self, recent=3):
+        self._lock = threading.Lock()
+        self.pnl = {k: _Window(s) for k, s in WINDOWS.items()}
+        self.trades = {k: _Window(s) for k, s in WINDOWS.items()}
+        self.pnl_all = 0.0
+        self.open_lots = {}
+        self.recent_equity = deque(maxlen=recent)
+
+    def _in_range(self, ts):
+        return ts is not None and ts >= time.time() - WINDOWS["30d"]
+
+    def on_trade(self, row):
+        sym = str(row.get("symbol") or "").upper()
+        note = str(row.get("note") or "").upper()
+        ts = _epoch(row.get("ts"))
+        with self._lock:
+            if self._in_range(ts):
+                for w in self.trades.values():
+                    w.add(ts, 1)
+            if not sym:
+                return
+            if note.startswith("OPEN"):
+                self.open_lots[sym] = self.open_lots.get(sym, 0) + 1
+            elif note.startswith("CLOSE") and self.open_lots.get(sym, 0) > 0:
+                self.open_lots[sym] -= 1
+                if self.open_lots[sym] <= 0:
+                    self.open_lots.pop(sym, None)
+
+    def on_equity(self, row):
+        try:
+            eq = float(row.get("equity") or 0.0)
+            pnl = float(row.get("pnl") or 0.0)
+        except (TypeError, ValueError):
+            return
+        ts = _epoch(row.get("ts"))
+        with self._lock:
+            self.recent_equity.append(eq)
+            self.pnl_all += pnl
+            if self._in_range(ts) and pnl:
+                for w in self.pnl.values():
+                    w.add(ts, pnl)
+
+    # --- consultas ---
+    def pnl_window(self, key, now=None):
+        with self._lock:
+            return self.pnl[key].value(now or time.time())
+
+    def pnl_total(self):
+        with self._lock:
+            return self.pnl_all
+
+    def trade_count(self, key, now=None):
+        with self._lock:
+            return int(self.trades[key].value(now or time.time()))
+
+    def open_by_symbol(self):
+        with self._lock:
+            return dict(self.open_lots)
+
+    def last_equity(self):
+        with self._lock:
+            return list(self.recent_equity)
+
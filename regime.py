@@ -1,7 +1,14 @@
 
 import math
+from collections import deque, namedtuple
+import numpy as np
 import pandas as pd
 
+EMAS = (9, 20, 50, 200)
+
+# resultado de classify (antes un type(...) nuevo por llamada)
+Regime = namedtuple("Regime", ["name", "ema", "slope"])
+
 def _ema(series: pd.Series, n: int) -> pd.Series:
     return series.ewm(span=n, adjust=False).mean()
 
@@ -13,14 +20,54 @@ def _slope_bps(series: pd.Series, k: int, price: float) -> float:
     except Exception:
         return 0.0
 
+def _rules(cfg: dict) -> dict:
+    """Umbrales del config con sus defaults (los mismos para las tres APIs)."""
+    rules = (cfg or {}).get("rules", {})
+    r, u, d = rules.get("range", {}), rules.get("uptrend", {}), rules.get("downtrend", {})
+    bb_max = float(r.get("bb_width_bps_max", 12))
+    return {
+        "r_s9": float(r.get("abs_slope_ema9_bps_max", 2)), "r_s50": float(r.get("abs_slope_ema50_bps_max", 1)),
+        "r_adx": float(r.get("adx_max", 18)), "bb_max": bb_max,
+        "u_order": u.get("ema_order", "9>20>50>200"), "u_s20": float(u.get("slope_ema20_bps_min", 2)),
+        "u_s50": float(u.get("slope_ema50_bps_min", 1)), "u_adx": float(u.get("adx_min", 20)),
+        "d_order": d.get("ema_order", "9<20<50<200"), "d_s20": float(d.get("slope_ema20_bps_max", -2)),
+        "d_s50": float(d.get("slope_ema50_bps_max", -1)), "d_adx": float(d.get("adx_min", 20)),
+    }
+
+def _order(order: str, e9, e20, e50, e200):
+    if order == "9>20>50>200":
+        return (e9 > e20) & (e20 > e50) & (e50 > e200)
+    if order == "9<20<50<200":
+        return (e9 < e20) & (e20 < e50) & (e50 < e200)
+    return np.zeros(len(e9), dtype=bool) if isinstance(e9, np.ndarray) else False
+
+def _label(R, price, e9, e20, e50, e200, s9, s20, s50, adx, bbw) -> str:
+    """Reglas de classify para un bar (escalares)."""
+    # RANGE / CHATO
+    if (abs(s9) <= R["r_s9"] and abs(s50) <= R["r_s50"] and adx < R["r_adx"] and bbw < R["bb_max"] and
+            abs(e50 - e200) / max(price, 1) * 10000.0 < 5.0):  # 5 bps de separación entre 50 y 200
+        return "range"
+    # TENDENCIA ALCISTA
+    if (_order(R["u_order"], e9, e20, e50, e200) and s20 >= R["u_s20"] and s50 >= R["u_s50"] and
+            adx >= R["u_adx"] and bbw >= R["bb_max"]):
+        return "uptrend"
+    # TENDENCIA BAJISTA
+    if (_order(R["d_order"], e9, e20, e50, e200) and s20 <= R["d_s20"] and s50 <= R["d_s50"] and
+            adx >= R["d_adx"] and bbw >= R["bb_max"]):
+        return "downtrend"
+    # CHOP / TRANSICIÓN (default si nada anterior)
+    return "chop"
+
+def _aux(row, key):
+    return float(getattr(row, key, 0) or 0)
+
 def classify(row_or_df, cfg: dict):
     """
     Clasifica el mercado en: 'range' | 'uptrend' | 'downtrend' | 'chop'
     Usa EMA 9/20/50/200 + pendientes + ADX + ancho de bandas (bb_width_bps).
-    Acepta un row con columnas ya calculadas o un df para calcular EMAs on-the-fly.
+    Acepta un row con columnas ya calculadas o un df para calcular EMAs on-the-fly
+    (sin tocar el df). Devuelve Regime(name, ema, slope).
     """
-    # Extrae parámetros
-    ema_set = (cfg or {}).get("ema_set", [9,20,50,200])
     slope_lookback = int((cfg or {}).get("slope_lookback", 10))
 
     # Permitir row (última fila) o df
@@ -30,73 +77,112 @@ def classify(row_or_df, cfg: dict):
     else:
         row = row_or_df
         df = None
+    has_close = df is not None and "close" in df.columns
+    ewm = {}
+    if has_close:
+        ewm = {n: _ema(df["close"], n) for n in (9, 20, 50)}
 
-    # Asegurar EMAs presentes
+    # EMAs: columnas del row, o calculadas del df, o el precio
     price = float(getattr(row, "close", getattr(row, "price", 0)) or 0)
-    out = {}
-    for n in [9,20,50,200]:
-        col = f"ema{n}"
-        val = getattr(row, col, None)
-        if pd.isna(val) if hasattr(pd, "isna") else (val is None):
-            # calcular si nos dieron df
-            if df is not None and "close" in df.columns:
-                df[col] = _ema(df["close"], n)
-                val = float(df[col].iloc[-1])
+    out = []
+    for n in EMAS:
+        val = getattr(row, f"ema{n}", None)
+        if pd.isna(val):
+            if has_close:
+                val = float((ewm[n] if n in ewm else _ema(df["close"], n)).iloc[-1])
             else:
                 val = price
-        out[col] = float(val)
-
-    ema9, ema20, ema50, ema200 = out["ema9"], out["ema20"], out["ema50"], out["ema200"]
+        out.append(float(val))
+    ema9, ema20, ema50, ema200 = out
 
     # Pendientes en bps/bar
-    if df is not None and "close" in df.columns and len(df) > slope_lookback+1:
-        s9  = _slope_bps(df["close"].ewm(span=9,  adjust=False).mean(),  slope_lookback, price)
-        s20 = _slope_bps(df["close"].ewm(span=20, adjust=False).mean(),  slope_lookback, price)
-        s50 = _slope_bps(df["close"].ewm(span=50, adjust=False).mean(),  slope_lookback, price)
+    if has_close and len(df) > slope_lookback+1:
+        s9, s20, s50 = (_slope_bps(ewm[n], slope_lookback, price) for n in (9, 20, 50))
     else:
         s9 = s20 = s50 = 0.0
 
-    # Indicadores auxiliares si existen
-    adx = float(getattr(row, "adx", 0) or 0)
-    bb_width_bps = float(getattr(row, "bb_width_bps", 0) or 0)
+    name = _label(_rules(cfg), price, ema9, ema20, ema50, ema200, s9, s20, s50,
+                  _aux(row, "adx"), _aux(row, "bb_width_bps"))
+    return Regime(name, (ema9, ema20, ema50, ema200), (s9, s20, s50))
 
-    # Reglas del config
-    rules = (cfg or {}).get("rules", {})
+def classify_series(df: pd.DataFrame, cfg: dict) -> pd.Series:
+    """Régimen de cada vela del df en una pasada vectorizada.
 
-    # Helpers
-    def ema_order_is(order: str) -> bool:
-        if order == "9>20>50>200":
-            return ema9 > ema20 > ema50 > ema200
-        if order == "9<20<50<200":
-            return ema9 < ema20 < ema50 < ema200
-        return False
+    Igual a llamar classify(df.iloc[:i+1], cfg) para cada i (EMAs adjust=False
+    son causales, así que una sola pasada sobre todo el df da los mismos valores).
+    """
+    if df.empty:
+        return pd.Series([], index=df.index, dtype=object)
+    k = int((cfg or {}).get("slope_lookback", 10))
+    close = df["close"].astype(float)
+    price = close.to_numpy()
+    ewm = {n: _ema(close, n).to_numpy() for n in EMAS}
+    ema = []
+    for n in EMAS:
+        col = f"ema{n}"
+        ema.append(np.where(df[col].notna(), df[col].astype(float), ewm[n]) if col in df.columns else ewm[n])
+    e9, e20, e50, e200 = ema
 
-    # RANGE / CHATO
-    r = rules.get("range", {})
-    if (abs(s9) <= float(r.get("abs_slope_ema9_bps_max", 2)) and
-        abs(s50) <= float(r.get("abs_slope_ema50_bps_max", 1)) and
-        adx < float(r.get("adx_max", 18)) and
-        bb_width_bps < float(r.get("bb_width_bps_max", 12)) and
-        abs(ema50 - ema200)/max(price,1) * 10000.0 < 5.0):  # 5 bps de separación entre 50 y 200
-        return type("Regime", (), {"name": "range", "ema": (ema9,ema20,ema50,ema200), "slope": (s9,s20,s50)})
+    def slope(n):
+        s = np.zeros(len(df))
+        if k > 0 and len(df) > k + 1:
+            prev = np.roll(ewm[n], k)
+            s[k+1:] = np.where(price[k+1:] > 0, (ewm[n][k+1:] - prev[k+1:]) / np.where(price[k+1:] > 0, price[k+1:], 1.0) * 10000.0, 0.0)
+        return s
+    s9, s20, s50 = slope(9), slope(20), slope(50)
 
-    # TENDENCIA ALCISTA
-    u = rules.get("uptrend", {})
-    if (ema_order_is(u.get("ema_order","9>20>50>200")) and
-        s20 >= float(u.get("slope_ema20_bps_min", 2)) and
-        s50 >= float(u.get("slope_ema50_bps_min", 1)) and
-        adx >= float(u.get("adx_min", 20)) and
-        bb_width_bps >= float(rules.get("range", {}).get("bb_width_bps_max", 12))):
-        return type("Regime", (), {"name": "uptrend", "ema": (ema9,ema20,ema50,ema200), "slope": (s9,s20,s50)})
+    def aux(col):
+        if col not in df.columns:
+            return np.zeros(len(df))
+        return df[col].astype(float).to_numpy()
+    adx, bbw = aux("adx"), aux("bb_width_bps")
 
-    # TENDENCIA BAJISTA
-    d = rules.get("downtrend", {})
-    if (ema_order_is(d.get("ema_order","9<20<50<200")) and
-        s20 <= float(d.get("slope_ema20_bps_max", -2)) and
-        s50 <= float(d.get("slope_ema50_bps_max", -1)) and
-        adx >= float(d.get("adx_min", 20)) and
-        bb_width_bps >= float(rules.get("range", {}).get("bb_width_bps_max", 12))):
-        return type("Regime", (), {"name": "downtrend", "ema": (ema9,ema20,ema50,ema200), "slope": (s9,s20,s50)})
+    R = _rules(cfg)
+    with np.errstate(invalid="ignore"):
+        is_range = ((np.abs(s9) <= R["r_s9"]) & (np.abs(s50) <= R["r_s50"]) & (adx < R["r_adx"]) &
+                    (bbw < R["bb_max"]) & (np.abs(e50 - e200) / np.maximum(price, 1) * 10000.0 < 5.0))
+        is_up = (_order(R["u_order"], e9, e20, e50, e200) & (s20 >= R["u_s20"]) & (s50 >= R["u_s50"]) &
+                 (adx >= R["u_adx"]) & (bbw >= R["bb_max"]))
+        is_down = (_order(R["d_order"], e9, e20, e50, e200) & (s20 <= R["d_s20"]) & (s50 <= R["d_s50"]) &
+                   (adx >= R["d_adx"]) & (bbw >= R["bb_max"]))
+    labels = np.select([is_range, is_up, is_down], ["range", "uptrend", "downtrend"], default="chop")
+    return pd.Series(labels, index=df.index, dtype=object)
 
-    # CHOP / TRANSICIÓN (default si nada anterior)
-    return type("Regime", (), {"name": "chop", "ema": (ema9,ema20,ema50,ema200), "slope": (s9,s20,s50)})
+class RegimeState:
+    """classify incremental para vivo: una vela por update() en O(1).
+
+    Lleva las EMAs 9/20/50/200 (adjust=False) y las últimas `slope_lookback`+1
+    para las pendientes; da lo mismo que classify_series sobre la misma historia.
+    """
+
+    def __init__(self, cfg: dict):
+        self.k = int((cfg or {}).get("slope_lookback", 10))
+        self.R = _rules(cfg)
+        self._alpha = {n: 2.0 / (n + 1) for n in EMAS}
+        self._ema = {}
+        self._hist = {n: deque(maxlen=self.k + 1) for n in (9, 20, 50)}
+        self.n = 0
+        self.last = None
+
+    def update(self, row) -> str:
+        """Incorpora una vela (row/dict con close y opcionalmente ema*, adx, bb_width_bps) y devuelve su régimen."""
+        get = row.get if hasattr(row, "get") else (lambda key, d=None: getattr(row, key, d))
+        c = float(get("close"))
+        for n, a in self._alpha.items():
+            prev = self._ema.get(n)
+            self._ema[n] = c if prev is None else prev + a * (c - prev)
+        self.n += 1
+        price = float(c or 0)
+        ema = []
+        for n in EMAS:
+            val = get(f"ema{n}")
+            ema.append(self._ema[n] if val is None or pd.isna(val) else float(val))
+        slopes = []
+        for n in (9, 20, 50):
+            h = self._hist[n]
+            h.append(self._ema[n])
+            ok = self.k > 0 and self.n > self.k + 1 and price > 0
+            slopes.append((h[-1] - h[0]) / price * 10000.0 if ok else 0.0)
+        self.last = _label(self.R, price, *ema, *slopes,
+                           float(get("adx", 0) or 0), float(get("bb_width_bps", 0) or 0))
+        return self.last
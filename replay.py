@@ -0,0 +1,225 @@
+"""Replay del motor en vivo sobre velas históricas.
+
+Usa el mismo TradingApp (señal, sizing, DCA, TP1/TP2/SL y trailing de
+manage_positions) con un reloj simulado, PaperExchange y todo en memoria:
+no hay fetch REST ni escrituras a CSV/SQLite/state.json por vela.
+
+Diferencia conocida con producción: en vivo el loop evalúa la vela abierta
+(peek) cada loop_seconds; el replay evalúa cada vela al cierre.
+
+Uso:
+  python -m bot.replay --config config.yaml --csv BTC/USDT:USDT=data/btc_1m.csv
+"""
+import argparse, asyncio, copy, logging
+import numpy as np
+import pandas as pd
+
+from bot.engine import TradingApp
+from bot.storage.decision_journal import DecisionJournal
+from bot.storage.ledger import Ledger
+from bot.core.candle_store import tf_to_ms
+from bot.core.indicator_state import IndicatorState, COLUMNS as IND_COLUMNS
+from bot.core.strategy import signal_arrays, signal_at, SIGNAL_KEYS
+
+logger = logging.getLogger("replay")
+
+
+class _NullNotifier:
+    async def send(self, *args, **kwargs):
+        return None
+
+
+def frame_to_bars(df: pd.DataFrame, base_tf: str = "1m", tf: str = None):
+    """DataFrame OHLCV (timestamp|ts, open, high, low, close, volume) -> [(ts_ms, o, h, l, c, v)] en `tf`.
+
+    La agregación es la misma que CandleStore (bucket = ts - ts % tf).
+    """
+    tcol = "timestamp" if "timestamp" in df.columns else "ts"
+    ts = df[tcol]
+    if pd.api.types.is_numeric_dtype(ts):
+        ts = ts.astype("int64")
+    else:
+        ts = pd.to_datetime(ts).astype("datetime64[ms]").astype("int64")
+    out = pd.DataFrame({"ts": ts.to_numpy(), "open": df["open"].to_numpy(float), "high": df["high"].to_numpy(float),
+                        "low": df["low"].to_numpy(float), "close": df["close"].to_numpy(float),
+                        "volume": df["volume"].to_numpy(float)})
+    out = out.drop_duplicates("ts", keep="last").sort_values("ts")
+    tf = tf or base_tf
+    if tf != base_tf:
+        tf_ms = tf_to_ms(tf)
+        out["ts"] = out["ts"] - out["ts"] % tf_ms
+        out = out.groupby("ts", sort=True).agg(open=("open", "first"), high=("high", "max"), low=("low", "min"),
+                                               close=("close", "last"), volume=("volume", "sum")).reset_index()
+    return list(out.itertuples(index=False, name=None))
+
+
+def indicator_array(bars, conf: dict) -> np.ndarray:
+    """Filas listas de IndicatorState sobre `bars` como array float64 (columnas IND_COLUMNS)."""
+    st = IndicatorState(conf)
+    out = []
+    for bar in bars:
+        row = st.update(bar)
+        if IndicatorState.ready(row):
+            out.append([float(row[k]) for k in IND_COLUMNS])
+    return np.array(out, dtype=float).reshape(-1, len(IND_COLUMNS))
+
+
+def rows_from_array(arr) -> dict:
+    """Inversa de indicator_array: {ts: fila} con los mismos tipos que IndicatorState."""
+    rows = {}
+    for vals in np.asarray(arr).tolist():
+        row = dict(zip(IND_COLUMNS, vals))
+        row["ts"] = int(row["ts"])
+        row["vol_ok"] = bool(row["vol_ok"])
+        rows[row["ts"]] = row
+    return rows
+
+
+class ReplayApp(TradingApp):
+    """TradingApp manejado por velas históricas y un reloj simulado.
+
+    `frames` son DataFrames OHLCV del timeframe base por símbolo; alternativamente
+    `indicators` trae los arrays de indicator_array ya calculados (optimizador).
+    """
+
+    def __init__(self, config: dict, frames: dict = None, base_tf: str = "1m", funding_bps: dict = None,
+                 indicators: dict = None):
+        source = indicators if indicators is not None else frames
+        cfg = copy.deepcopy(config or {})
+        cfg["mode"] = "paper"
+        cfg["symbols"] = [s for s in cfg.get("symbols", list(source)) if s in source] or list(source)
+        super().__init__(cfg)
+
+        self.notifier = _NullNotifier()
+        self.funding_bps = dict(funding_bps or {})
+        self._clock = 0.0
+        self._bar_ts = None
+        self.trades = []
+        self._closes = []
+        self.equity_curve = []
+        self.decision_counts = self.decisions.counts
+        # indicadores calculados una sola vez por símbolo, con el mismo IndicatorState que en vivo
+        if indicators is None:
+            indicators = {sym: indicator_array(frame_to_bars(frames[sym], base_tf, self.timeframe),
+                                               self._indicator_conf())
+                          for sym in self.symbols}
+        self._rows = {sym: rows_from_array(indicators[sym]) for sym in self.symbols}
+        # columnas por símbolo para signal_arrays (señales de todo el histórico en una pasada)
+        self._cols, self._index, self._signals = {}, {}, {}
+        for sym in self.symbols:
+            arr = np.asarray(indicators[sym], dtype=float).reshape(-1, len(IND_COLUMNS))
+            self._cols[sym] = {k: arr[:, j] for j, k in enumerate(IND_COLUMNS)}
+            self._index[sym] = {int(ts): i for i, ts in enumerate(self._cols[sym]["ts"])}
+
+    # --- reloj y datos ---
+    def _now(self):
+        return self._clock
+
+    async def _fetch_symbol_inputs(self, symbol):
+        last = self._rows[symbol].get(self._bar_ts)
+        if last is None:
+            return None
+        sig = signal_at(self._signal_arrays(symbol), self._index[symbol][self._bar_ts])
+        return last, sig, self.funding_bps.get(symbol)
+
+    def _signal_arrays(self, symbol):
+        """signal_arrays del símbolo para la conf actual (stop_mult cambia con las bandas de DD)."""
+        conf = {**self.filters, **self.strategy_conf}
+        key = (symbol,) + tuple(conf.get(k) for k in SIGNAL_KEYS)
+        sigs = self._signals.get(key)
+        if sigs is None:
+            sigs = self._signals[key] = signal_arrays(self._cols[symbol], conf)
+        return sigs
+
+    # --- persistencia en memoria ---
+    def _open_storage(self, config):
+        # sin DB/CSV/columnar/read model: el ledger arranca vacío y los motivos quedan en el ring
+        self.db = None
+        self.columnar = None
+        self.read_model = None
+        self.ledger = Ledger()
+        self.decisions = DecisionJournal(None, ring_size=200)
+
+    def save_state(self, critical=False):
+        pass
+
+    def load_state(self):
+        pass
+
+    def persist_equity(self, pnl=0.0):
+        eq = float(self.trader.equity())
+        self.equity_curve.append((self._clock, eq))
+        self.ledger.on_equity({"ts": self._clock, "equity": eq})
+
+    def log_trade(self, symbol, side, qty, price, lev, fee, pnl=0.0, note="", regime: str = ""):
+        row = {"ts": self._clock, "symbol": symbol, "side": side, "qty": qty, "price": price, "lev": lev,
+               "fee": fee, "pnl": pnl, "note": note, "regime": regime}
+        self.trades.append(row)
+        self.ledger.on_trade(row)
+        if note.upper().startswith("CLOSE"):
+            self._closes.append(row)
+
+    # --- loop ---
+    async def run_replay(self):
+        """Corre step_all_symbols al cierre de cada vela del timeline y devuelve summary()."""
+        tf_ms = tf_to_ms(self.timeframe)
+        timeline = sorted(set().union(*(rows.keys() for rows in self._rows.values())))
+        for ts in timeline:
+            self._bar_ts = ts
+            self._clock = (ts + tf_ms) / 1000.0
+            await self.step_all_symbols()
+        return self.summary()
+
+    def summary(self):
+        pnls = [float(t["pnl"]) for t in self._closes]
+        gains = sum(p for p in pnls if p > 0)
+        losses = -sum(p for p in pnls if p < 0)
+        peak, max_dd = None, 0.0
+        for _, eq in self.equity_curve:
+            peak = eq if peak is None or eq > peak else peak
+            if peak > 0:
+                max_dd = min(max_dd, (eq - peak) / peak)
+        return {
+            "bars": len(self.equity_curve),
+            "opens": sum(1 for t in self.trades if not t["note"].upper().startswith("CLOSE")),
+            "closes": len(pnls),
+            "pnl": sum(pnls),
+            "pf": gains / losses if losses > 0 else (float("inf") if gains > 0 else 0.0),
+            "expectancy": sum(pnls) / len(pnls) if pnls else 0.0,
+            "win_rate": sum(1 for p in pnls if p > 0) / len(pnls) if pnls else 0.0,
+            "max_dd": max_dd,
+            "equity": float(self.trader.equity()),
+        }
+
+
+def replay(config: dict, frames: dict, **kwargs):
+    """Atajo sincrónico: arma el ReplayApp, corre el replay y devuelve (summary, app)."""
+    app = ReplayApp(config, frames, **kwargs)
+    return asyncio.run(app.run_replay()), app
+
+
+def main():
+    p = argparse.ArgumentParser()
+    p.add_argument("--config", default="config.yaml")
+    p.add_argument("--csv", action="append", required=True, help="SIMBOLO=ruta.csv (OHLCV del timeframe base)")
+    p.add_argument("--base-tf", default="1m")
+    p.add_argument("--trades-out", default=None, help="CSV opcional con los trades del replay")
+    args = p.parse_args()
+
+    from bot.config import load_config
+    cfg = load_config(args.config)
+    frames = {}
+    for spec in args.csv:
+        sym, path = spec.split("=", 1)
+        frames[sym] = pd.read_csv(path)
+
+    summary, app = replay(cfg, frames, base_tf=args.base_tf)
+    for k, v in summary.items():
+        print(f"{k}: {v}")
+    if args.trades_out:
+        pd.DataFrame(app.trades).to_csv(args.trades_out, index=False)
+        print("Trades:", args.trades_out)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
 import asyncio, logging, pandas as pd, datetime as dt, pytz, os
 from telegram import Bot
+from bot.storage.columnar import get_columnar, columnar_dir
 
 logger = logging.getLogger("reporting")
 
@@ -57,17 +58,12 @@ class ReportingScheduler:
             await self._send(txt)
 
     def build_report(self, days: int, title: str):
-        csv_dir = self.cfg.get("storage",{}).get("csv_dir","data")
         try:
-            eq = pd.read_csv(f"{csv_dir}/equity.csv", parse_dates=["ts"])
-            tr = pd.read_csv(f"{csv_dir}/trades.csv", parse_dates=["ts"])
+            store = getattr(self.app, "columnar", None) or get_columnar(columnar_dir(self.cfg))
+            eqp = store.last("equity", days, columns=["equity", "pnl"])
+            trp = store.last("trades", days, columns=["pnl"])
         except Exception:
             return None
-        now = pd.Timestamp.utcnow()
-        eq['ts'] = pd.to_datetime(eq['ts'], utc=True)
-        tr['ts'] = pd.to_datetime(tr['ts'], utc=True)
-        eqp = eq[eq['ts'] >= (now - pd.Timedelta(days=days))]
-        trp = tr[tr['ts'] >= (now - pd.Timedelta(days=days))]
 
         pnl = float(eqp['pnl'].sum()) if not eqp.empty else 0.0
         n = len(trp)
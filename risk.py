@@ -1,7 +1,8 @@
 from dataclasses import dataclass
 from typing import Tuple, Dict
-import math, pandas as pd, os, json
+import math, pandas as pd, numpy as np, os, json
 from bot.utils.time_utils import now_utc, to_iso
+from bot.storage.columnar import get_columnar
 
 @dataclass
 class RiskParams:
@@ -35,26 +36,46 @@ def position_size(balance_usdt: float, price: float, atr: float, risk_per_trade:
     return max(qty,0.0), float(notional), float(margin)
 
 class BudgetManager:
-    def __init__(self, equity_csv="data/equity.csv", cfg: Dict = None):
+    """Circuit breakers y sizing sobre la historia de trades/equity.
+
+    Con `read_model`/`ledger` (los del engine) las ventanas de PnL y los pnl_net
+    salen de memoria; sin ellos, de una sola lectura del store columnar por llamada.
+    """
+
+    def __init__(self, equity_csv="data/equity.csv", cfg: Dict = None, read_model=None, columnar=None, ledger=None):
         self.equity_csv = equity_csv
         self.cfg = cfg or {}
+        self.read_model = read_model
+        self.columnar = columnar
+        self.ledger = ledger
         os.makedirs("data", exist_ok=True)
         if not os.path.exists(equity_csv):
             pd.DataFrame(columns=["ts","equity","pnl"]).to_csv(equity_csv, index=False)
 
-    def _pnl_window(self, days: int) -> float:
+    def _store(self, csv_path):
+        if self.columnar is not None:
+            return self.columnar
+        csv_dir = os.path.dirname(csv_path) or "."
+        return get_columnar(self.cfg.get("columnar_dir") or os.path.join(csv_dir, "columnar"), csv_dir)
+
+    def _pnl_windows(self) -> Tuple[float, float, float]:
+        """PnL de equity del último día, la última semana y toda la historia."""
         try:
-            df = pd.read_csv(self.equity_csv, parse_dates=["ts"])
-            if df.empty: return 0.0
-            cutoff = pd.Timestamp.utcnow().tz_localize('UTC') - pd.Timedelta(days=days)
-            return float(df[df["ts"]>=cutoff]["pnl"].sum())
+            rm = self.read_model
+            if rm is not None:
+                return rm.pnl_window("1d"), rm.pnl_window("7d"), rm.pnl_total()
+            df = self._store(self.equity_csv).last("equity", 3650, columns=["pnl"])
+            if df.empty: return 0.0, 0.0, 0.0
+            now = pd.Timestamp.now(tz="UTC")
+            pnl = df["pnl"].astype(float)
+            return (float(pnl[df["ts"] >= now - pd.Timedelta(days=1)].sum()),
+                    float(pnl[df["ts"] >= now - pd.Timedelta(days=7)].sum()),
+                    float(pnl.sum()))
         except Exception:
-            return 0.0
+            return 0.0, 0.0, 0.0
 
     def circuit_breakers(self) -> Tuple[bool, str]:
-        dd_day = self._pnl_window(1)
-        dd_week= self._pnl_window(7)
-        dd_glob = self._pnl_window(3650)  # all history
+        dd_day, dd_week, dd_glob = self._pnl_windows()  # glob: toda la historia
         lim_d = -abs(float(self.cfg.get("max_daily_drawdown_pct",2.0)))/100.0
         lim_w = -abs(float(self.cfg.get("max_weekly_drawdown_pct",5.0)))/100.0
         lim_g = -abs(float(self.cfg.get("max_global_drawdown_pct",25.0)))/100.0
@@ -64,11 +85,18 @@ class BudgetManager:
         if dd_glob <= lim_g:  return True, f"CIRCUIT_GLOBAL {dd_glob:.4f}"
         return False, ""
 
+    def _pnl_net(self, trades_csv):
+        """pnl_net de toda la historia de trades: del ledger o de la columna del store columnar."""
+        if self.ledger is not None:
+            return np.asarray(self.ledger.pnl_net, dtype=float)
+        df = self._store(trades_csv).read("trades", columns=["pnl_net"])
+        if "pnl_net" not in df.columns: return np.empty(0)
+        return pd.to_numeric(df["pnl_net"], errors="coerce").dropna().to_numpy(float)
+
     def kelly_fraction(self, trades_csv="data/trades.csv") -> float:
         try:
-            df = pd.read_csv(trades_csv)
-            if "pnl_net" not in df.columns: return 0.0
-            rets = df["pnl_net"].astype(float)
+            rets = pd.Series(self._pnl_net(trades_csv), dtype=float)
+            if rets.empty: return 0.0
             wins = (rets>0).mean()
             if wins in (0,1): return 0.0
             avg_win = rets[rets>0].mean()
@@ -82,8 +110,8 @@ class BudgetManager:
 
     def var95(self, trades_csv="data/trades.csv") -> float:
         try:
-            df = pd.read_csv(trades_csv)
-            if "pnl_net" not in df.columns or df["pnl_net"].empty: return 0.0
-            return float(np.percentile(df["pnl_net"].values, 5))
+            pnls = self._pnl_net(trades_csv)
+            if not len(pnls): return 0.0
+            return float(np.percentile(pnls, 5))
         except Exception:
             return 0.0
@@ -2,19 +2,30 @@
 from __future__ import annotations
 import argparse, os
 from .data_ccxt import load_csv
-from .walkforward import walk_forward
+from .walkforward import walk_forward, DEFAULT_THRESHOLDS, DEFAULT_HOLDS
+
+def _floats(s: str):
+    return [float(x) for x in s.split(",") if x.strip()]
 
 def main():
     ap = argparse.ArgumentParser()
     ap.add_argument("--csv", required=True)
     ap.add_argument("--train_months", type=int, default=6)
     ap.add_argument("--test_months", type=int, default=1)
+    ap.add_argument("--thresholds", default=",".join(str(x) for x in DEFAULT_THRESHOLDS))
+    ap.add_argument("--holds", default=",".join(str(x) for x in DEFAULT_HOLDS))
+    ap.add_argument("--fee_bps", type=float, default=0.0, help="costo ida y vuelta por trade")
+    ap.add_argument("--min_trades", type=int, default=10)
+    ap.add_argument("--workers", type=int, default=None)
     args = ap.parse_args()
     df = load_csv(args.csv)
-    rep = walk_forward(df, args.train_months, args.test_months)
+    rep, eq = walk_forward(df, args.train_months, args.test_months, _floats(args.thresholds),
+                           [int(h) for h in _floats(args.holds)], args.fee_bps, args.min_trades,
+                           args.workers, return_equity=True)
     os.makedirs("wf_out", exist_ok=True)
     rep.to_csv("wf_out/walkforward_report.csv", index=False)
-    print("WF listo: wf_out/walkforward_report.csv")
+    eq.to_csv("wf_out/oos_equity.csv", index_label="timestamp")
+    print("WF listo: wf_out/walkforward_report.csv, wf_out/oos_equity.csv")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,44 @@
+import asyncio, math, time
+
+from bot.core.candle_store import tf_to_ms
+
+
+class BarClock:
+    """Despertares alineados al cierre de vela del timeframe (grilla UTC).
+
+    `next_wake` da el próximo cierre + `grace_s` (margen para que el exchange
+    publique la vela); `fresh` dice si una vela cerrada todavía no se evaluó
+    para un símbolo y `mark` la da por evaluada (recién cuando salió la señal),
+    así no se recalculan señales sobre la misma vela ni se pierde una que falló.
+    """
+
+    def __init__(self, timeframe: str, grace_s: float = 2.0):
+        self.timeframe = timeframe
+        self.tf_s = tf_to_ms(timeframe) / 1000.0
+        self.grace_s = max(0.0, float(grace_s))
+        self._seen = {}      # symbol -> ts (ms) de la última vela cerrada evaluada
+        self.stats = {"wakes": 0, "fresh": 0, "skipped": 0}
+
+    def last_close(self, now_s: float) -> float:
+        """Epoch s del cierre de vela más reciente (<= now)."""
+        return math.floor(now_s / self.tf_s) * self.tf_s
+
+    def next_wake(self, now_s: float) -> float:
+        wake = self.last_close(now_s) + self.grace_s
+        return wake if now_s < wake else wake + self.tf_s
+
+    async def sleep_until_next(self, now_fn=time.time):
+        await asyncio.sleep(max(0.0, self.next_wake(now_fn()) - now_fn()))
+        self.stats["wakes"] += 1
+
+    def fresh(self, symbol, bar_ts) -> bool:
+        """True si `bar_ts` es una vela cerrada que todavía no se evaluó para `symbol`."""
+        if self._seen.get(symbol) == bar_ts:
+            self.stats["skipped"] += 1
+            return False
+        return True
+
+    def mark(self, symbol, bar_ts):
+        """Da la vela por evaluada (hay señal): los próximos fresh() la saltean."""
+        self._seen[symbol] = bar_ts
+        self.stats["fresh"] += 1
@@ -1,24 +1,158 @@
-import sqlite3, os
+import sqlite3, os, threading, queue, time, atexit, logging
 
-def ensure_db(path):
-    os.makedirs(os.path.dirname(path), exist_ok=True)
-    conn = sqlite3.connect(path)
+logger = logging.getLogger("sqlite_store")
+
+TRADE_COLS = ("ts", "symbol", "side", "qty", "price", "lev", "fee", "pnl", "note", "regime")
+EQUITY_COLS = ("ts", "equity", "pnl")
+_TRADE_DEFAULTS = {"pnl": 0.0, "note": "", "regime": ""}
+_TRADE_SQL = f"INSERT INTO trades ({','.join(TRADE_COLS)}) VALUES ({','.join('?' * len(TRADE_COLS))})"
+_EQUITY_SQL = f"INSERT INTO equity ({','.join(EQUITY_COLS)}) VALUES ({','.join('?' * len(EQUITY_COLS))})"
+_STOP = object()
+
+
+def _schema(conn):
     cur = conn.cursor()
-    cur.execute("CREATE TABLE IF NOT EXISTS trades (id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT, symbol TEXT, side TEXT, qty REAL, price REAL, lev INTEGER, fee REAL, pnl REAL, note TEXT)")
+    cur.execute("CREATE TABLE IF NOT EXISTS trades (id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT, symbol TEXT, side TEXT, qty REAL, price REAL, lev INTEGER, fee REAL, pnl REAL, note TEXT, regime TEXT)")
     cur.execute("CREATE TABLE IF NOT EXISTS equity (id INTEGER PRIMARY KEY AUTOINCREMENT, ts TEXT, equity REAL, pnl REAL)")
+    # DBs viejas: no tenían la columna regime
+    cols = {r[1] for r in cur.execute("PRAGMA table_info(trades)")}
+    if "regime" not in cols:
+        cur.execute("ALTER TABLE trades ADD COLUMN regime TEXT")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_trades_ts ON trades(ts)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_trades_symbol_ts ON trades(symbol, ts)")
+    cur.execute("CREATE INDEX IF NOT EXISTS idx_equity_ts ON equity(ts)")
     conn.commit()
-    conn.close()
+
+
+class SqliteStore:
+    """Conexión SQLite persistente (WAL) con cola de escritura en un thread aparte.
+
+    insert_* solo encolan y vuelven enseguida; el writer junta lo que haya en la
+    cola (hasta batch_size o flush_interval) y lo escribe en una transacción,
+    así los fsync no bloquean el event loop.
+    """
+
+    def __init__(self, path, batch_size=256, flush_interval=0.25):
+        self.path = path
+        self.batch_size = int(batch_size)
+        self.flush_interval = float(flush_interval)
+        d = os.path.dirname(path)
+        if d:
+            os.makedirs(d, exist_ok=True)
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        _schema(self._conn)
+        self._q = queue.Queue()
+        self._closed = False
+        self._thread = threading.Thread(target=self._run, name=f"sqlite-writer:{os.path.basename(path)}", daemon=True)
+        self._thread.start()
+
+    # --- escritura ---
+    def insert_trade(self, row):
+        self._put(_TRADE_SQL, tuple(row.get(k, _TRADE_DEFAULTS[k]) if k in _TRADE_DEFAULTS else row[k]
+                                    for k in TRADE_COLS))
+
+    def insert_equity(self, row):
+        self._put(_EQUITY_SQL, tuple(row[k] for k in EQUITY_COLS))
+
+    def _put(self, sql, params):
+        if self._closed:
+            logger.warning("sqlite store %s cerrado; se descarta escritura", self.path)
+            return
+        self._q.put((sql, params))
+
+    def _run(self):
+        while True:
+            item = self._q.get()
+            if item is _STOP:
+                self._q.task_done()
+                return
+            batch = [item]
+            stop = False
+            deadline = time.monotonic() + self.flush_interval
+            while len(batch) < self.batch_size:
+                remaining = deadline - time.monotonic()
+                try:
+                    nxt = self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait()
+                except queue.Empty:
+                    break
+                if nxt is _STOP:
+                    stop = True
+                    break
+                batch.append(nxt)
+            self._write(batch)
+            for _ in batch:
+                self._q.task_done()
+            if stop:
+                self._q.task_done()
+                return
+
+    def _write(self, batch):
+        by_sql = {}
+        for sql, params in batch:
+            by_sql.setdefault(sql, []).append(params)
+        try:
+            with self._conn:
+                for sql, rows in by_sql.items():
+                    self._conn.executemany(sql, rows)
+        except Exception as e:
+            logger.warning("sqlite batch write failed (%d filas): %s", len(batch), e)
+
+    def flush(self):
+        """Espera a que el writer haya escrito todo lo encolado."""
+        if not self._closed:
+            self._q.join()
+
+    def close(self):
+        if self._closed:
+            return
+        self._closed = True
+        self._q.put(_STOP)
+        self._thread.join()
+        self._conn.close()
+        with _stores_lock:
+            if _stores.get(self.path) is self:
+                _stores.pop(self.path, None)
+
+    # --- lectura ---
+    def query(self, sql, params=()):
+        """SELECT en una conexión propia (WAL permite leer mientras el writer escribe)."""
+        conn = sqlite3.connect(self.path)
+        try:
+            return conn.execute(sql, params).fetchall()
+        finally:
+            conn.close()
+
+
+_stores = {}
+_stores_lock = threading.Lock()
+
+
+def get_store(path) -> SqliteStore:
+    """Store compartido por path (una conexión y un writer por archivo)."""
+    with _stores_lock:
+        st = _stores.get(path)
+        if st is None:
+            st = _stores[path] = SqliteStore(path)
+        return st
+
+
+@atexit.register
+def _close_all():
+    for st in list(_stores.values()):
+        try:
+            st.close()
+        except Exception:
+            pass
+
+
+# API anterior (por path), ahora sobre el store compartido
+def ensure_db(path):
+    get_store(path)
 
 def insert_trade(path, row):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    cur.execute("INSERT INTO trades (ts,symbol,side,qty,price,lev,fee,pnl,note) VALUES (?,?,?,?,?,?,?,?,?)",
-        (row["ts"],row["symbol"],row["side"],row["qty"],row["price"],row["lev"],row["fee"],row.get("pnl",0.0),row.get("note","")))
-    conn.commit(); conn.close()
+    get_store(path).insert_trade(row)
 
 def insert_equity(path, row):
-    conn = sqlite3.connect(path)
-    cur = conn.cursor()
-    cur.execute("INSERT INTO equity (ts,equity,pnl) VALUES (?,?,?)",
-        (row["ts"],row["equity"],row["pnl"]))
-    conn.commit(); conn.close()
+    get_store(path).insert_equity(row)
@@ -1,4 +1,6 @@
-import json, os, time, datetime as dt
+import json, os, time, datetime as dt, asyncio, logging
+
+log = logging.getLogger("state")
 
 STATE_PATH = "data/state.json"
 CMD_QUEUE_PATH = "data/cmd_queue.json"
@@ -27,12 +29,145 @@ def load_state():
     except Exception:
         return {"allow_new_entries": True, "positions": {}, "equity": 1000.0, "updated_at": _iso_utc()}
 
+def write_atomic(path: str, text: str):
+    """Escribe a un .tmp, fsync y rename: un corte a mitad nunca deja el archivo a medias."""
+    d = os.path.dirname(path)
+    if d:
+        os.makedirs(d, exist_ok=True)
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp, path)
+
 def save_state(st: dict):
     st = dict(st or {})
     st["updated_at"] = _iso_utc()
-    os.makedirs(os.path.dirname(STATE_PATH), exist_ok=True)
-    with open(STATE_PATH,"w",encoding="utf-8") as f: 
-        json.dump(st,f,ensure_ascii=False,indent=2)
+    write_atomic(STATE_PATH, json.dumps(st, ensure_ascii=False, indent=2))
+
+
+class StatePersister:
+    """Persistencia del estado con escrituras agrupadas.
+
+    mark() marca el estado como sucio; el snapshot se escribe (atómico) a lo
+    sumo `max_writes_per_s` veces por segundo y solo si cambió. Los eventos
+    críticos (abrir/cerrar lotes) se bajan enseguida o, con journal=True, se
+    agregan como una línea al journal (append + fsync) y el snapshot completo
+    queda para la próxima escritura agrupada. Snapshot y líneas del journal llevan
+    un `seq` creciente; load() se queda con el registro de `seq` más alto (un crash
+    entre escribir el snapshot y truncar el journal deja líneas más viejas).
+    """
+
+    def __init__(self, path: str, snapshot, max_writes_per_s: float = 1.0, journal: bool = False):
+        self.path = path
+        self.snapshot = snapshot
+        self.min_interval = 1.0 / max_writes_per_s if max_writes_per_s > 0 else 0.0
+        self.journal_path = path + ".journal" if journal else None
+        self._dirty = False
+        self._last_write = 0.0
+        self._last_blob = None
+        # seguir la numeración de lo que ya hay en disco aunque nunca se llame a load()
+        self._seq = max(self._read()[1], 0)
+        self._timer = None
+        self.stats = {"marks": 0, "writes": 0, "unchanged": 0, "journal": 0}
+
+    def mark(self, critical: bool = False):
+        self.stats["marks"] += 1
+        self._dirty = True
+        if critical:
+            if not self.journal_path:
+                return self.flush()
+            self._append_journal()
+        if time.monotonic() - self._last_write >= self.min_interval:
+            return self.flush()
+        self._schedule()
+        return False
+
+    def _schedule(self):
+        if self._timer is not None:
+            return
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return  # sin loop: se baja en el próximo mark() o en flush()
+        delay = max(0.0, self.min_interval - (time.monotonic() - self._last_write))
+        self._timer = loop.call_later(delay, self._on_timer)
+
+    def _on_timer(self):
+        self._timer = None
+        try:
+            self.flush()
+        except Exception as e:
+            log.warning("state flush failed: %s", e)
+
+    @staticmethod
+    def _dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(",", ":"))
+
+    def _record(self, state):
+        """Estado serializado con el `seq` siguiente."""
+        self._seq += 1
+        return self._dumps({**state, "seq": self._seq})
+
+    def _append_journal(self):
+        with open(self.journal_path, "a", encoding="utf-8") as f:
+            f.write(self._record(self.snapshot()) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self.stats["journal"] += 1
+
+    def flush(self) -> bool:
+        """Baja el snapshot si está sucio y cambió; devuelve True si escribió."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._dirty:
+            return False
+        state = self.snapshot()
+        blob = self._dumps(state)
+        self._dirty = False
+        self._last_write = time.monotonic()
+        if blob == self._last_blob:
+            self.stats["unchanged"] += 1
+            return False
+        write_atomic(self.path, self._record(state))
+        self._last_blob = blob
+        self.stats["writes"] += 1
+        if self.journal_path and os.path.exists(self.journal_path):
+            open(self.journal_path, "w").close()
+        return True
+
+    def _read(self):
+        """(estado, seq) del registro de `seq` más alto entre snapshot y journal; (None, -1) si no hay."""
+        snap, seq = None, -1
+        if os.path.exists(self.path):
+            try:
+                with open(self.path, "r", encoding="utf-8") as f:
+                    snap = json.load(f)
+                seq = int(snap.pop("seq", 0)) if isinstance(snap, dict) else 0
+            except Exception as e:
+                log.warning("state snapshot ilegible (%s): %s", self.path, e)
+        if self.journal_path and os.path.exists(self.journal_path):
+            with open(self.journal_path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        break  # línea cortada por un crash: vale la anterior
+                    n = int(rec.pop("seq", 0)) if isinstance(rec, dict) else 0
+                    # >=: sin seq (formato viejo) el journal sigue ganando como antes
+                    if n >= seq:
+                        snap, seq = rec, n
+        return snap, seq
+
+    def load(self):
+        """Último estado guardado o None."""
+        snap, seq = self._read()
+        self._seq = max(self._seq, seq)
+        if snap is not None:
+            self._last_blob = self._dumps(snap)
+        return snap
 
 def enqueue_cmd(cmd: dict):
     q = []
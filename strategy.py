@@ -1,7 +1,8 @@
 
 from dataclasses import dataclass
+import numpy as np
 import pandas as pd
-from .market_regime import infer_regime
+from .market_regime import infer_regime, infer_regime_array
 
 @dataclass
 class Signal:
@@ -19,7 +20,10 @@ def generate_signal(df: pd.DataFrame, conf: dict) -> Signal:
     Señal con capas (régimen + momentum + volatilidad).
     Requiere columnas: close, ema_fast, ema_slow, rsi, adx, bb_width, bb_low, bb_high, atr.
     """
-    last = df.iloc[-1]
+    return signal_from_row(df.iloc[-1], conf)
+
+def signal_from_row(last, conf: dict) -> Signal:
+    """Misma señal que generate_signal a partir de la última fila (Series o dict)."""
     regime = infer_regime(last)
 
     c = float(last['close'])
@@ -80,3 +84,68 @@ def generate_signal(df: pd.DataFrame, conf: dict) -> Signal:
             sl = tp1 = tp2 = 0.0
 
     return Signal(side, _clip(confidence, 0.0, 1.0), sl, tp1, tp2, regime)
+
+
+# parámetros de conf que usa la señal (clave de cache para signal_arrays)
+SIGNAL_KEYS = ('rsi_long', 'rsi_short', 'rsi_low', 'rsi_high', 'stop_mult', 'tp1_r', 'tp2_r')
+
+def _col(frame, name, default, n):
+    if name in frame:
+        return np.asarray(frame[name], dtype=float)
+    return np.broadcast_to(np.asarray(default, dtype=float), (n,))
+
+def signal_arrays(frame, conf: dict) -> dict:
+    """signal_from_row para todas las filas de una vez.
+
+    `frame` es un DataFrame de indicadores o un dict {columna: array}. Devuelve
+    {'side', 'conf', 'sl', 'tp1', 'tp2', 'regime'} como arrays; el elemento i es
+    igual a signal_from_row(fila i) (mismas reglas y mismas operaciones en float64).
+    """
+    c = np.asarray(frame['close'], dtype=float)
+    n = len(c)
+    ema_fast = np.asarray(frame['ema_fast'], dtype=float)
+    ema_slow = np.asarray(frame['ema_slow'], dtype=float)
+    rsi = _col(frame, 'rsi', 50.0, n)
+    atr = _col(frame, 'atr', 0.0, n)
+    bb_low = _col(frame, 'bb_low', c, n)
+    bb_high = _col(frame, 'bb_high', c, n)
+    macd_hist = _col(frame, 'macd_hist', 0.0, n)
+    regime = infer_regime_array(frame['adx'], frame['bb_width'], ema_fast, ema_slow, c)
+
+    rsi_long = float(conf.get('rsi_long', 52.0))
+    rsi_short = float(conf.get('rsi_short', 48.0))
+    rsi_low = float(conf.get('rsi_low', 35.0))
+    rsi_high = float(conf.get('rsi_high', 65.0))
+    stop_mult = float(conf.get('stop_mult', 1.5))
+    tp1_R = float(conf.get('tp1_r', 1.0))
+    tp2_R = float(conf.get('tp2_r', 2.4))
+
+    with np.errstate(invalid="ignore"):
+        up, down = regime == 'trend_up', regime == 'trend_down'
+        trend_long = up & (ema_fast > ema_slow) & (rsi >= rsi_long) & (c >= ema_fast) & (macd_hist > 0)
+        trend_short = down & (ema_fast < ema_slow) & (rsi <= rsi_short) & (c <= ema_fast) & (macd_hist < 0)
+        mean_rev = ~(up | down)
+        near_low = c <= (bb_low + 0.15 * (bb_high - bb_low))
+        near_high = c >= (bb_high - 0.15 * (bb_high - bb_low))
+        mr_long = mean_rev & near_low & (rsi <= rsi_low)
+        mr_short = mean_rev & ~mr_long & near_high & (rsi >= rsi_high)
+
+        side = np.select([trend_long, trend_short, mr_long, mr_short],
+                         ['long', 'short', 'long', 'short'], default='flat').astype(object)
+        confidence = np.select([trend_long | trend_short, mr_long | mr_short], [0.7, 0.55], default=0.0)
+
+        is_long, is_short = side == 'long', side == 'short'
+        live = (is_long | is_short) & ~(atr <= 0)
+        sl = np.where(is_long, c - stop_mult * atr, c + stop_mult * atr)
+        rr = np.where(is_long, c - sl, sl - c)
+        tp1 = np.where(is_long, c + tp1_R * rr, c - tp1_R * rr)
+        tp2 = np.where(is_long, c + tp2_R * rr, c - tp2_R * rr)
+    zero = np.zeros(n)
+    return {'side': side, 'conf': np.clip(confidence, 0.0, 1.0),
+            'sl': np.where(live, sl, zero), 'tp1': np.where(live, tp1, zero), 'tp2': np.where(live, tp2, zero),
+            'regime': regime}
+
+def signal_at(arrays: dict, i: int) -> Signal:
+    """Signal de la fila i de signal_arrays."""
+    return Signal(arrays['side'][i], float(arrays['conf'][i]), float(arrays['sl'][i]),
+                  float(arrays['tp1'][i]), float(arrays['tp2'][i]), arrays['regime'][i])
@@ -43,6 +43,7 @@ def compute_cots_score(df: pd.DataFrame, atr_htf_window: int = 48, lookback_open
             w["impact"]   *_sigm(impact))
     out = pd.DataFrame(index=df.index)
     out["cots"] = cots.clip(0,1)
+    out["dir"] = np.sign(df["mid_ret"]).fillna(0.0)
     out["long_ok"]  = ((out["cots"]>=0.65) & (df["mid_ret"]>0)).astype(int)
     out["short_ok"] = ((out["cots"]>=0.65) & (df["mid_ret"]<0)).astype(int)
     return out
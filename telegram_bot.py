@@ -1,4 +1,4 @@
-import os, logging, pandas as pd
+import os, logging
 from telegram import Update
 from telegram.ext import ApplicationBuilder, ContextTypes, MessageHandler, filters
 
@@ -24,7 +24,7 @@ async def start_telegram_bot(app, config):
             text = (update.message.text or "").strip()
             low = text.lower()
             chat_id = update.effective_chat.id
-            csv_dir = config.get("storage",{}).get("csv_dir","data")
+            rm = app.read_model
             if low == "precio":
                 parts = []
                 for sym in app.symbols:
@@ -33,15 +33,7 @@ async def start_telegram_bot(app, config):
                 await context.bot.send_message(chat_id, "📈 " + " | ".join(parts))
             elif low == "estado":
                 total = app.trader.equity()
-                d1 = 0.0; w1 = 0.0
-                try:
-                    df = pd.read_csv(f"{csv_dir}/equity.csv", parse_dates=["ts"])
-                    df['ts'] = pd.to_datetime(df['ts'], utc=True)
-                    now = pd.Timestamp.utcnow()
-                    d1 = float(df[df['ts'] >= (now - pd.Timedelta(days=1))]['pnl'].sum())
-                    w1 = float(df[df['ts'] >= (now - pd.Timedelta(days=7))]['pnl'].sum())
-                except Exception:
-                    pass
+                d1 = rm.pnl_window("1d"); w1 = rm.pnl_window("7d")
                 ks = "ON" if app.trader.state.killswitch else "OFF"
                 pos_count = sum(len(v) for v in app.trader.state.positions.values())
                 await context.bot.send_message(chat_id, f"⚙️ estado: equity=${total:.2f} | pnl(1d)=${d1:.2f} | pnl(7d)=${w1:.2f} | posiciones={pos_count} | killswitch={ks}")
@@ -56,28 +48,17 @@ async def start_telegram_bot(app, config):
                 await context.bot.send_message(chat_id, f"💰 saldo: ${total:.2f}")
             elif low.startswith("saldo="):
                 total = app.trader.equity()
-                try:
-                    df = pd.read_csv(f"{csv_dir}/equity.csv", parse_dates=["ts"])
-                    df['ts'] = pd.to_datetime(df['ts'], utc=True)
-                    now = pd.Timestamp.utcnow()
-                    d1 = float(df[df['ts'] >= (now - pd.Timedelta(days=1))]['pnl'].sum())
-                    w1 = float(df[df['ts'] >= (now - pd.Timedelta(days=7))]['pnl'].sum())
+                if rm.last_equity():
+                    d1 = rm.pnl_window("1d"); w1 = rm.pnl_window("7d")
                     await context.bot.send_message(chat_id, f"💰 saldo: ${total:.2f}\n📅 último día: ${d1:.2f}\n🗓️ última semana: ${w1:.2f}")
-                except Exception:
+                else:
                     await context.bot.send_message(chat_id, f"💰 saldo: ${total:.2f}\n(no hay datos de equity.csv suficientes)")
             elif low.startswith("operaciones="):
                 span = "hoy"
                 if "semana" in low: span = "semana"
                 if "mes" in low: span = "mes"
-                try:
-                    df = pd.read_csv(f"{csv_dir}/trades.csv", parse_dates=["ts"])
-                    df['ts'] = pd.to_datetime(df['ts'], utc=True)
-                    now = pd.Timestamp.utcnow()
-                    delta = {"hoy":"1D","semana":"7D","mes":"30D"}[span]
-                    cnt = int((df['ts'] >= (now - pd.to_timedelta(delta))).sum())
-                    await context.bot.send_message(chat_id, f"🧾 operaciones {span}: {cnt}")
-                except Exception:
-                    await context.bot.send_message(chat_id, "No hay trades cargados todavía.")
+                cnt = rm.trade_count({"hoy": "1d", "semana": "7d", "mes": "30d"}[span])
+                await context.bot.send_message(chat_id, f"🧾 operaciones {span}: {cnt}")
             elif low == "killswitch":
                 ks = app.toggle_killswitch()
                 await context.bot.send_message(chat_id, f"🛑 killswitch {'ON' if ks else 'OFF'}")
@@ -1,4 +1,4 @@
-import asyncio, logging, os, re, datetime as dt, csv
+import asyncio, logging, os, re, datetime as dt
 
 async def _cmd_help(reply):
     texto = (
@@ -13,6 +13,7 @@ async def _cmd_help(reply):
         "• *cerrar todo*: cierra todas las posiciones.\n"
         "• *recientes* / *motivos*: últimos motivos de NO-entrada.\n"
         "• *stats* / *stats semana*: PF, winrate, expectancy por símbolo/capa.\n"
+        "• *diag*: conteo de motivos de NO-entrada.\n"
         "• *diag on* / *diag off*: activa/desactiva diagnóstico.\n"
     )
     return await reply(texto)
@@ -76,6 +77,10 @@ def _fmt_money(x):
     except Exception:
         return str(x)
 
+def _read_model(engine):
+    # lo arma el engine desde el Ledger: acá no se vuelve a leer ningún CSV
+    return getattr(engine, "read_model", None)
+
 def _status_text(engine):
     # Construir estado en español
     try:
@@ -86,46 +91,22 @@ def _status_text(engine):
     per_symbol = {s: len(v) for s, v in getattr(engine.trader.state, "positions", {}).items()} if getattr(engine, "trader", None) else {}
     open_cnt = sum(per_symbol.values()) if per_symbol else 0
 
-    # fallback: si no hay nada en memoria, mirar CSV de trades
+    # fallback: si no hay nada en memoria, lotes reconstruidos de OPEN/CLOSE (read model)
+    rm = _read_model(engine)
     try:
-        if open_cnt == 0:
-            csv_dir = getattr(engine, "csv_dir", "data")
-            path = os.path.join(csv_dir, "trades.csv")
-            if os.path.exists(path):
-                abiertos = {}
-                with open(path, newline="", encoding="utf-8") as f:
-                    reader = csv.DictReader(f)
-                    for r in reader:
-                        sym = (r.get("symbol") or "").upper()
-                        note = (r.get("note") or "").upper()
-                        if not sym:
-                            continue
-                        if note.startswith("OPEN"):
-                            abiertos[sym] = abiertos.get(sym, 0) + 1
-                        elif note.startswith("CLOSE") and abiertos.get(sym, 0) > 0:
-                            abiertos[sym] -= 1
-                            if abiertos[sym] <= 0:
-                                abiertos.pop(sym, None)
-                per_symbol = {k: v for k, v in abiertos.items() if v > 0}
-                open_cnt = sum(per_symbol.values())
+        if open_cnt == 0 and rm is not None:
+            per_symbol = rm.open_by_symbol()
+            open_cnt = sum(per_symbol.values())
     except Exception as e:
-        log.warning("No pude leer trades.csv para estado: %s", e)
+        log.warning("No pude leer lotes abiertos para estado: %s", e)
 
-    # últimos saldos (equity.csv)
+    # últimos saldos
     recientes_txt = ""
     try:
-        csv_dir = getattr(engine, "csv_dir", "data")
-        eq_path = os.path.join(csv_dir, "equity.csv")
-        if os.path.exists(eq_path):
-            rows = []
-            with open(eq_path, newline="", encoding="utf-8") as f:
-                reader = csv.DictReader(f)
-                for r in reader:
-                    rows.append(r)
-            ult = rows[-3:] if len(rows) >= 3 else rows[-len(rows):]
-            if ult:
-                saldos = " → ".join(_fmt_money(r.get("equity", "0")) for r in ult)
-                recientes_txt = f"\nSaldos recientes: {saldos}"
+        ult = rm.last_equity() if rm is not None else []
+        if ult:
+            saldos = " → ".join(_fmt_money(x) for x in ult)
+            recientes_txt = f"\nSaldos recientes: {saldos}"
     except Exception as e:
         pass
 
@@ -203,30 +184,12 @@ class CommandBot:
         if msg in ("posicion", "posición", "posiciones"):
             st = getattr(self.engine.trader.state, "positions", {}) if getattr(self.engine, "trader", None) else {}
             if not st:
-                # fallback CSV
-                csv_dir = getattr(self.engine, "csv_dir", "data")
-                path = os.path.join(csv_dir, "trades.csv")
-                abiertos = {}
-                if os.path.exists(path):
-                    try:
-                        with open(path, newline="", encoding="utf-8") as f:
-                            reader = csv.DictReader(f)
-                            for r in reader:
-                                sym = (r.get("symbol") or "").upper()
-                                note = (r.get("note") or "").upper()
-                                if not sym:
-                                    continue
-                                if note.startswith("OPEN"):
-                                    abiertos[sym] = abiertos.get(sym, 0) + 1
-                                elif note.startswith("CLOSE") and abiertos.get(sym, 0) > 0:
-                                    abiertos[sym] -= 1
-                                    if abiertos[sym] <= 0:
-                                        abiertos.pop(sym, None)
-                        if abiertos:
-                            listado = "\n".join(f"• {k}: {v}" for k, v in abiertos.items())
-                            return await reply(f"Posiciones abiertas (por símbolo):\n{listado}")
-                    except Exception as e:
-                        pass
+                # fallback: lotes reconstruidos de OPEN/CLOSE (read model)
+                rm = _read_model(self.engine)
+                abiertos = rm.open_by_symbol() if rm is not None else {}
+                if abiertos:
+                    listado = "\n".join(f"• {k}: {v}" for k, v in abiertos.items())
+                    return await reply(f"Posiciones abiertas (por símbolo):\n{listado}")
                 return await reply("No hay posiciones abiertas.")
 
             # Hay estado en memoria
@@ -258,6 +221,13 @@ class CommandBot:
         if norm_all in ("diag off", "diagnostico off", "diagnostico desactivar"):
             setattr(self.engine, "diag", False)
             return await reply("Modo diagnóstico desactivado.")
+        if norm_all in ("diag", "diagnostico"):
+            journal = getattr(self.engine, "decisions", None)
+            top = journal.top_reasons(10) if journal is not None else []
+            if not top:
+                return await reply("No tengo motivos registrados aún.")
+            listado = "\n".join(f"• {reason}: {n}" for reason, n in top)
+            return await reply("Motivos de no-entrada desde el arranque:\n" + listado)
 
         # --- KILL / KILLSWITCH ---
         if msg in ("kill", "killswitch"):
@@ -0,0 +1,74 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import backtest
+
+CONF = {"ema_fast": 21, "ema_slow": 55, "rsi_period": 14, "macd_fast": 12, "macd_slow": 26, "macd_signal": 9,
+        "bb_period": 20, "bb_std": 2, "atr_period": 14}
+PARAMS = [{}, {"fee": 0.0002, "stop_mult": 1.0, "tp1r": 0.5, "rsi_long": 50.0, "rsi_short": 50.0, "adx_min": 10.0},
+          {"risk": 0.02, "stop_mult": 3.0, "tp1r": 2.5, "bbw_min": 30.0}]
+
+
+def _synthetic(n, seed=5):
+    rng = np.random.default_rng(seed)
+    # tramos con tendencia para que haya entradas de los dos lados
+    drift = np.repeat(rng.normal(0, 0.001, n // 100 + 1), 100)[:n]
+    close = 30000 * np.exp(np.cumsum(drift + rng.normal(0, 0.003, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.001, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.001, n)))
+    df = pd.DataFrame({"timestamp": pd.date_range("2025-01-01", periods=n, freq="5min"),
+                       "open": open_, "high": high, "low": low, "close": close,
+                       "volume": np.abs(rng.normal(100, 30, n))})
+    return backtest.compute_indicators(df, CONF)
+
+
+@pytest.fixture(scope="module")
+def df():
+    return _synthetic(2500)
+
+
+def _same(got, ref):
+    rows, bal = got
+    ref_rows, ref_bal = ref
+    # lo mismo que compara --verify
+    return pd.DataFrame(rows).equals(pd.DataFrame(ref_rows)) and bal == ref_bal
+
+
+def test_entry_masks_match_row_conditions(df):
+    P = backtest.DEFAULTS
+    long_ok, short_ok = backtest.entry_masks(df)
+    for i in range(2, len(df)):
+        r, p1 = df.iloc[i], df.iloc[i - 1]
+        rising = (r.macd - r.macd_signal) > (p1.macd - p1.macd_signal)
+        falling = (r.macd - r.macd_signal) < (p1.macd - p1.macd_signal)
+        base = r.adx >= P["adx_min"] and r.bb_width_bps >= P["bbw_min"]
+        assert long_ok[i] == (r.ema_fast > r.ema_slow and rising and r.rsi > P["rsi_long"] and base), i
+        assert short_ok[i] == (r.ema_fast < r.ema_slow and falling and r.rsi < P["rsi_short"] and base), i
+    assert not long_ok[:2].any() and not short_ok[:2].any()
+
+
+@pytest.mark.parametrize("params", PARAMS)
+def test_numpy_core_matches_simulate_loop(df, params):
+    ref = backtest.simulate_loop(df, params)
+    assert len(ref[0]) >= 20
+    assert {r["action"] for r in ref[0]} >= {"OPEN", "STOP", "TP1"}
+    assert _same(backtest.simulate(df, params, use_numba=False), ref)
+
+
+@pytest.mark.skipif(backtest.njit is None, reason="numba no instalado")
+@pytest.mark.parametrize("params", PARAMS)
+def test_numba_core_matches_simulate_loop(df, params):
+    assert _same(backtest.simulate(df, params, use_numba=True), backtest.simulate_loop(df, params))
+
+
+def test_open_position_at_end_of_data(df):
+    # corta la serie con una posición abierta: el último evento queda en OPEN en los dos
+    rows, _ = backtest.simulate_loop(df)
+    last_open = max(i for i, r in enumerate(rows) if r["action"] == "OPEN")
+    cut = int(df.index[df["timestamp"] == rows[last_open]["timestamp"]][0]) + 1
+    part = df.iloc[:cut].reset_index(drop=True)
+    ref = backtest.simulate_loop(part)
+    assert ref[0][-1]["action"] == "OPEN"
+    assert _same(backtest.simulate(part, use_numba=False), ref)
@@ -0,0 +1,76 @@
+import random
+
+import pandas as pd
+
+from bot.core.candle_store import CandleStore
+
+MIN = 60_000
+HOUR = 60 * MIN
+
+
+def _walk(n, start_ms, seed=7):
+    rnd = random.Random(seed)
+    rows, px = [], 100.0
+    for i in range(n):
+        o = px
+        c = o * (1 + rnd.uniform(-0.002, 0.002))
+        h = max(o, c) * (1 + rnd.uniform(0, 0.001))
+        l = min(o, c) * (1 - rnd.uniform(0, 0.001))
+        rows.append([start_ms + i * MIN, o, h, l, c, rnd.uniform(0.5, 2.0)])
+        px = c
+    return rows
+
+
+def _resample(rows, rule):
+    df = pd.DataFrame(rows, columns=["ts", "open", "high", "low", "close", "volume"])
+    df.index = pd.to_datetime(df["ts"], unit="ms")
+    out = df.resample(rule, label="left", closed="left").agg(
+        {"open": "first", "high": "max", "low": "min", "close": "last", "volume": "sum"}).dropna()
+    out.insert(0, "ts", out.index.as_unit("ms").astype("int64"))
+    return out.reset_index(drop=True)
+
+
+def _as_frame(bars):
+    return pd.DataFrame([list(b) for b in bars], columns=["ts", "open", "high", "low", "close", "volume"])
+
+
+def test_pyramid_matches_resample_after_incremental_merges():
+    rows = _walk(600, 1_700_000_000_000 - 1_700_000_000_000 % HOUR)
+    store = CandleStore("1m", derived=("2m", "5m", "15m"), depth=1000)
+    store.merge("X", rows[:50], reset=True)
+    i = 50
+    while i < len(rows):
+        step = 1 + i % 4
+        # la vela abierta llega primero a medio armar y después completa
+        partial = list(rows[i]); partial[4] = partial[1]; partial[5] = 0.1
+        store.merge("X", [partial])
+        store.merge("X", rows[i:i + step])
+        i += step
+    for tf, rule in (("2m", "2min"), ("5m", "5min"), ("15m", "15min")):
+        got = _as_frame(store.bars("X", tf))
+        want = _resample(rows, rule)
+        # el primer bucket sale del primer ts del buffer: misma ventana que el resample
+        pd.testing.assert_frame_equal(got, want, check_dtype=False, rtol=1e-12)
+
+
+def test_seed_replaces_partial_leading_bucket_with_native_bar():
+    hour0 = 1_700_000_000_000 - 1_700_000_000_000 % HOUR
+    # el buffer base arranca a los 57 minutos de la primera hora
+    rows = _walk(3 * 60 + 3, hour0)[57:]
+    store = CandleStore("1m", derived=("1h",), depth=200, depths={"1h": 10})
+    store.merge("X", rows, reset=True)
+    assert store.missing("X") == ["1h"]
+
+    native = [[hour0 - HOUR, 90.0, 91.0, 89.0, 90.5, 55.0],
+              [hour0, 100.0, 101.0, 99.0, 100.5, 60.0]]
+    store.seed("X", "1h", native)
+
+    bars = [list(b) for b in store.bars("X", "1h")]
+    assert bars[0] == native[0]
+    assert bars[1] == native[1]
+    assert [b[0] for b in bars] == [hour0 + k * HOUR for k in range(-1, 4)]
+    assert store.missing("X") == []
+
+    # los buckets completos desde el base no se tocan y el siguiente merge los mantiene
+    store.merge("X", [[hour0 + 3 * HOUR + 3 * MIN, 1, 1, 1, 1, 1]])
+    assert list(store.bars("X", "1h")[1]) == native[1]
@@ -0,0 +1,60 @@
+import datetime as dt
+import os
+
+from bot.storage.columnar import ColumnarStore
+
+
+def _row(day, hour, equity):
+    ts = dt.datetime(2025, 3, day, hour, tzinfo=dt.timezone.utc).timestamp()
+    return {"ts": ts, "equity": equity, "pnl": 1.0}
+
+
+def test_flush_appends_chunks_and_compact_merges_closed_days(tmp_path):
+    store = ColumnarStore(str(tmp_path), flush_interval=3600)
+    store.extend("equity", [_row(1, 10, 100.0), _row(1, 11, 101.0), _row(2, 9, 102.0)])
+    assert len(store.read("equity")) == 3          # pendiente, todavía sin disco
+    store.flush()
+    first = {p: os.path.getmtime(p) for _, p in store.partitions("equity")}
+    assert len(first) == 2                          # un chunk por día
+
+    store.append("equity", _row(1, 12, 103.0))
+    store.flush()
+    parts = store.partitions("equity")
+    assert len(parts) == 3
+    # los chunks ya escritos no se reescriben
+    assert all(os.path.getmtime(p) == m for p, m in first.items())
+
+    df = store.read("equity", start="2025-03-01", end="2025-03-02")
+    assert df["equity"].tolist() == [100.0, 101.0, 103.0]
+
+    assert store.compact(before=dt.date(2025, 3, 2)) == 1
+    parts = store.partitions("equity")
+    assert [os.path.basename(p) for d, p in parts if d == dt.date(2025, 3, 1)] == ["2025-03-01" + os.path.splitext(parts[0][1])[1]]
+    assert store.read("equity")["equity"].tolist() == [100.0, 101.0, 103.0, 102.0]
+    store.close()
+
+
+def test_mixed_epoch_and_iso_batch_keeps_every_row(tmp_path):
+    store = ColumnarStore(str(tmp_path), flush_interval=3600)
+    epoch = dt.datetime(2025, 3, 1, 9, tzinfo=dt.timezone.utc).timestamp()
+    store.extend("equity", [{"ts": epoch, "equity": 1.0, "pnl": 0.0},
+                            {"ts": "2025-03-01T10:00:00", "equity": 2.0, "pnl": 0.0},
+                            {"ts": str(epoch + 7200), "equity": 3.0, "pnl": 0.0},
+                            {"ts": "2025-03-01T12:00:00Z", "equity": 4.0, "pnl": 0.0}])
+    store.flush()
+    df = store.read("equity")
+    assert df["equity"].tolist() == [1.0, 2.0, 3.0, 4.0]
+    assert [t.hour for t in df["ts"]] == [9, 10, 11, 12]
+    store.close()
+
+
+def test_partition_cache_is_bounded(tmp_path):
+    store = ColumnarStore(str(tmp_path), flush_interval=3600, cache_size=3)
+    store.extend("equity", [_row(day, 10, float(day)) for day in range(1, 11)])
+    store.flush()
+    assert len(store._cache) == 3
+    assert store.read("equity")["equity"].tolist() == [float(d) for d in range(1, 11)]
+    assert len(store._cache) == 3
+    # el último leído queda en cache
+    assert store.partitions("equity")[-1][1] in store._cache
+    store.close()
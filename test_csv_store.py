@@ -0,0 +1,38 @@
+import os
+import time
+
+from bot.storage import csv_store
+from bot.storage.csv_store import append_equity_csv, append_trade_csv, iter_rows
+
+
+def test_trade_rows_hit_disk_on_append_and_iter_rows_spans_segments(tmp_path):
+    d = str(tmp_path)
+    append_trade_csv(d, {"ts": 1, "symbol": "A", "pnl_net": 1.0})
+    append_trade_csv(d, {"ts": 2, "symbol": "A", "pnl_net": -2.0})
+    # columna nueva: el archivo actual pasa a segmento y se abre uno nuevo
+    append_trade_csv(d, {"ts": 3, "symbol": "B", "pnl_net": 3.0, "regime": "trend"})
+    append_trade_csv(d, {"ts": 4, "symbol": "B", "pnl_net": 4.0, "regime": "range"})
+    path = os.path.join(d, "trades.csv")
+    # sin flush explícito ni atexit: la fila ya está en el archivo
+    assert "range" in open(path, encoding="utf-8").read()
+
+    rows = list(iter_rows(d, "trades.csv"))
+    assert [r["ts"] for r in rows] == ["1", "2", "3", "4"]
+    assert os.path.exists(os.path.join(d, "trades.1.csv"))
+    csv_store.close_all()
+
+
+def test_equity_rows_are_flushed_by_the_background_thread(tmp_path):
+    d = str(tmp_path)
+    append_equity_csv(d, {"ts": 1, "equity": 100.0, "pnl": 0.0})
+    path = os.path.join(d, "equity.csv")
+    end = time.monotonic() + 5 * csv_store.FLUSH_INTERVAL_S
+    while "100.0" not in open(path, encoding="utf-8").read() and time.monotonic() < end:
+        time.sleep(0.05)
+    # sin otro append: lo bajó el timer
+    assert "100.0" in open(path, encoding="utf-8").read()
+
+    append_equity_csv(d, {"ts": 2, "equity": 101.0, "pnl": 1.0})
+    csv_store.flush_all()
+    assert "101.0" in open(path, encoding="utf-8").read()
+    csv_store.close_all()
@@ -0,0 +1,21 @@
+from bot.lot_book import Positions
+from bot.risk.exposure import ExposureAggregator
+
+
+def _lot(side, qty):
+    return {"side": side, "qty": qty, "entry": 1.0, "lev": 5, "sl": 0.0, "tp1": 0.0, "tp2": 0.0}
+
+
+def test_cluster_ratio_takes_worst_cluster_of_symbol():
+    # ETH está en dos clusters; el segundo tiene más exposición long
+    agg = ExposureAggregator([["BTC", "ETH"], ["ETH", "SOL", "AVAX"]])
+    pos = Positions({"BTC": [_lot("short", 1.0)], "SOL": [_lot("long", 3.0)], "AVAX": [_lot("long", 2.0)]})
+    agg.attach(pos)
+    for sym in ("BTC", "SOL", "AVAX", "ETH"):
+        agg.on_price(sym, 10.0)
+
+    assert agg.notional == 60.0
+    assert agg.cluster_ratio("ETH", "long") == 50.0 / 60.0
+    assert agg.cluster_ratio("ETH", "short") == 10.0 / 60.0
+    assert agg.cluster_ratio("BTC", "long") == 0.0
+    assert agg.cluster_ratio("DOGE", "long") == 0.0
@@ -0,0 +1,45 @@
+import asyncio
+
+from bot.exchanges.funding_cache import FundingCache
+
+
+class _Ccxt:
+    has = {"fetchFundingRates": True}
+
+    def __init__(self, data=None, fail=False):
+        self.data, self.fail, self.calls = data or {}, fail, 0
+
+    async def fetch_funding_rates(self, symbols):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("down")
+        return self.data
+
+    async def fetch_funding_rate(self, symbol):
+        self.calls += 1
+        raise RuntimeError("down")
+
+
+def test_failed_refresh_backs_off_instead_of_refetching_every_loop():
+    ccxt = _Ccxt(fail=True)
+    fc = FundingCache(ccxt, ["A", "B"], {"retry_s": 60})
+    asyncio.run(fc.ensure(1000.0))
+    calls = ccxt.calls
+    for t in (1001.0, 1030.0, 1059.0):
+        asyncio.run(fc.ensure(t))
+    assert ccxt.calls == calls
+    asyncio.run(fc.ensure(1061.0))
+    assert ccxt.calls > calls
+
+
+def test_partial_result_backs_off_then_completes():
+    nxt = 5000 * 1000
+    ccxt = _Ccxt({"A": {"fundingRate": 0.0001, "nextFundingTimestamp": nxt}})
+    fc = FundingCache(ccxt, ["A", "B"], {"retry_s": 30})
+    asyncio.run(fc.ensure(1000.0))
+    asyncio.run(fc.ensure(1010.0))
+    assert ccxt.calls == 1 and fc.stats["partial"] == 1
+    ccxt.data["B"] = {"fundingRate": -0.0002, "nextFundingTimestamp": nxt}
+    asyncio.run(fc.ensure(1031.0))
+    assert ccxt.calls == 2 and fc.bps("B") is not None
+    assert not fc.due(1040.0)
@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bot.core.indicators import compute_indicators
+from bot.core.indicator_state import IndicatorState, COLUMNS
+
+CONFS = [{}, {"ema_fast": 9, "ema_slow": 30, "rsi_len": 7, "adx_len": 10, "bb_len": 15, "bb_dev": 2.5,
+              "atr_len": 10, "macd_fast": 8, "macd_slow": 21, "macd_signal": 5}]
+
+
+def _synthetic(n, seed=7):
+    rng = np.random.default_rng(seed)
+    close = 30000 * np.exp(np.cumsum(rng.normal(0, 0.0015, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.0007, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.0007, n)))
+    ts = 1_700_000_000_000 + np.arange(n) * 120_000
+    return pd.DataFrame({"ts": ts, "open": open_, "high": high, "low": low, "close": close,
+                         "volume": np.abs(rng.normal(100, 30, n))})
+
+
+def _assert_rows_equal(got: pd.DataFrame, ref: pd.DataFrame):
+    assert len(got) == len(ref)
+    for col in COLUMNS:
+        a, b = ref[col].to_numpy(dtype=float), got[col].to_numpy(dtype=float)
+        np.testing.assert_allclose(b, a, rtol=1e-9, atol=1e-9, err_msg=col)
+
+
+@pytest.mark.parametrize("conf", CONFS)
+def test_update_matches_compute_indicators_over_full_history(conf):
+    df = _synthetic(1500)
+    ref = compute_indicators(df, conf)
+    st = IndicatorState(conf)
+    rows = [r for r in (st.update(b) for b in df.itertuples(index=False, name=None)) if IndicatorState.ready(r)]
+    _assert_rows_equal(pd.DataFrame(rows, columns=COLUMNS), ref)
+
+
+@pytest.mark.parametrize("conf", CONFS)
+def test_sync_peeks_open_bar_like_compute_indicators_on_the_buffer(conf):
+    df = _synthetic(700, seed=3)
+    bars = list(df.itertuples(index=False, name=None))
+    st = IndicatorState(conf)
+    for end in range(300, len(bars), 37):
+        # la última vela del buffer está abierta: primero a medio armar, después completa
+        half = bars[end - 1][:4] + (bars[end - 1][1], bars[end - 1][5] * 0.5)
+        st.sync(bars[:end - 1] + [half])
+        last = st.sync(bars[:end])
+        ref = compute_indicators(df.iloc[:end], conf).iloc[-1]
+        for col in COLUMNS:
+            assert float(last[col]) == pytest.approx(float(ref[col]), rel=1e-9, abs=1e-9), col
+    # peek no mueve el estado
+    assert st.last_ts == bars[end - 2][0]
@@ -0,0 +1,104 @@
+import copy
+import json
+import random
+
+import pytest
+
+from bot.lot_book import LotBook, Positions, STATE_FIELDS
+from bot.risk.guards import Limits, can_open, portfolio_caps_ok
+
+SYMS = ("BTC/USDT:USDT", "ETH/USDT:USDT", "SOL/USDT:USDT")
+
+
+def _lot(rnd, side=None):
+    entry = rnd.uniform(10, 100)
+    return {"side": side or rnd.choice(("long", "short")), "qty": round(rnd.uniform(0.1, 3.0), 6),
+            "entry": entry, "lev": rnd.choice((1, 3, 5, 10)), "ts": 1_700_000_000.0,
+            "sl": entry * 0.98, "tp1": entry * 1.01, "tp2": entry * 1.02, "realized_pnl": 0.0,
+            "trailing_anchor": entry, "entry_adx": 25.0, "leg": 1}
+
+
+def _recount(plain):
+    """Agregados recalculados desde listas de dicts comunes."""
+    out = {}
+    for sym, lots in plain.items():
+        longs = [L for L in lots if L["side"] == "long"]
+        shorts = [L for L in lots if L["side"] != "long"]
+        out[sym] = {"n_long": len(longs), "n_short": len(shorts),
+                    "qty_long": sum(abs(L["qty"]) for L in longs),
+                    "qty_short": sum(abs(L["qty"]) for L in shorts),
+                    "margin_qty": sum(abs(L["qty"]) / max(int(L["lev"]), 1) for L in lots)}
+    return out
+
+
+def _assert_matches(pos, plain):
+    assert pos.total_lots() == sum(len(v) for v in plain.values())
+    want = _recount(plain)
+    for sym in set(pos) | set(plain):
+        book = pos.get(sym, LotBook())
+        w = want.get(sym, {"n_long": 0, "n_short": 0, "qty_long": 0.0, "qty_short": 0.0, "margin_qty": 0.0})
+        assert (book.n_long, book.n_short) == (w["n_long"], w["n_short"])
+        for k in ("qty_long", "qty_short", "margin_qty"):
+            assert getattr(book, k) == pytest.approx(w[k], abs=1e-9)
+        assert [L.to_dict() for L in book] == plain.get(sym, [])
+
+
+def test_open_close_counters_match_plain_lists_and_survive_state_roundtrip():
+    rnd = random.Random(11)
+    pos, plain = Positions(), {}
+    for step in range(400):
+        sym = rnd.choice(SYMS)
+        op = rnd.random()
+        if op < 0.45 or not plain.get(sym):
+            # open_lot: el Trader hace setdefault(sym, []).append(dict)
+            L = _lot(rnd)
+            pos.setdefault(sym, []).append(dict(L))
+            plain.setdefault(sym, []).append(dict(L))
+        elif op < 0.7:
+            # close_lot: pop del índice
+            i = rnd.randrange(len(plain[sym]))
+            closed = pos[sym].pop(i)
+            assert closed.to_dict() == plain[sym].pop(i)
+        elif op < 0.85:
+            # cierre parcial (TP1) y cambios de campos sin agregados
+            i = rnd.randrange(len(plain[sym]))
+            half = plain[sym][i]["qty"] * 0.5
+            for book in (pos[sym], plain[sym]):
+                book[i]["qty"] = half
+                book[i]["sl"] = book[i]["entry"]
+                book[i]["trailing_anchor"] = book[i]["entry"] * 1.01
+        elif op < 0.95:
+            # el engine reemplaza la lista entera del símbolo
+            keep = [L for L in plain[sym] if L["qty"] > 0.5]
+            pos[sym] = [dict(L) for L in keep]
+            plain[sym] = [dict(L) for L in keep]
+        else:
+            del pos[sym]
+            del plain[sym]
+        _assert_matches(pos, plain)
+
+    # consumidores del layer tipo dict: guards / reporting / telegram
+    limits = Limits(max_total_positions=10_000, max_per_symbol=10_000, no_hedge=True)
+    prices = {s: 50.0 for s in SYMS}
+    for sym in SYMS:
+        for side in ("long", "short"):
+            assert can_open(sym, side, pos, limits) == can_open(sym, side, plain, limits)
+    assert portfolio_caps_ok(1000.0, pos, prices, {}) == portfolio_caps_ok(1000.0, plain, prices, {})
+    for sym, lots in pos.items():
+        for L, P in zip(lots, plain[sym]):
+            assert (L["side"], L.get("lev"), L.get("tp2", L.get("tp1"))) == (P["side"], P["lev"], P["tp2"])
+            assert "sl" in L and L.get("missing", "x") == "x"
+
+    # round trip por JSON como state.json
+    snap = json.loads(json.dumps({"positions": pos.to_state()}))
+    restored = Positions.from_state(snap["positions"], now=1_700_000_000.0)
+    expected = {sym: [{**{k: L[k] for k in STATE_FIELDS}, "ts": 1_700_000_000.0} for L in lots]
+                for sym, lots in plain.items() if lots}
+    _assert_matches(restored, expected)
+
+    # y sigue funcionando como antes después del restore
+    plain_after = copy.deepcopy(expected)
+    sym = next(iter(restored))
+    restored[sym].pop(0)
+    plain_after[sym].pop(0)
+    _assert_matches(restored, plain_after)
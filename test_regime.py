@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from regime import classify, classify_series, RegimeState
+
+CFG = {"slope_lookback": 5,
+       "rules": {"range": {"bb_width_bps_max": 12, "adx_max": 18},
+                 "uptrend": {"slope_ema20_bps_min": 1, "slope_ema50_bps_min": 0.5, "adx_min": 20},
+                 "downtrend": {"slope_ema20_bps_max": -1, "slope_ema50_bps_max": -0.5, "adx_min": 20}}}
+
+
+def _frame(n=1200, seed=5, with_ema_cols=False):
+    rng = np.random.default_rng(seed)
+    # tramos con deriva para que aparezcan los cuatro regímenes
+    drift = np.repeat(rng.choice([-0.002, 0.0, 0.002], size=n // 100 + 1), 100)[:n]
+    close = 100 * np.exp(np.cumsum(drift + rng.normal(0, 0.001, n)))
+    df = pd.DataFrame({"close": close,
+                       "adx": rng.uniform(5, 40, n),
+                       "bb_width_bps": rng.uniform(2, 30, n)})
+    if with_ema_cols:
+        ema50 = df["close"].ewm(span=50, adjust=False).mean()
+        df["ema50"] = ema50.where(rng.random(n) > 0.3)   # con huecos: cae a la EMA calculada
+    return df
+
+
+@pytest.mark.parametrize("with_ema_cols", [False, True])
+def test_classify_series_matches_regime_state(with_ema_cols):
+    df = _frame(with_ema_cols=with_ema_cols)
+    got = classify_series(df, CFG)
+    st = RegimeState(CFG)
+    want = [st.update(row) for row in df.to_dict("records")]
+    assert got.tolist() == want
+    assert set(want) == {"range", "uptrend", "downtrend", "chop"}
+
+
+def test_classify_series_matches_classify_on_each_prefix():
+    df = _frame(400, seed=9)
+    got = classify_series(df, CFG)
+    for i in range(0, len(df), 7):
+        assert got.iloc[i] == classify(df.iloc[:i + 1], CFG).name, i
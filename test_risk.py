@@ -0,0 +1,60 @@
+import datetime as dt
+
+import numpy as np
+import pytest
+
+from bot.storage.columnar import ColumnarStore
+from bot.storage.ledger import Ledger
+from bot.storage.read_model import ReadModel
+from risk import BudgetManager
+
+
+def _rows(now):
+    out = []
+    for hours_ago, pnl in ((24 * 400, -13.0), (24 * 40, 11.0), (24 * 5, -7.0), (30, 5.0), (2, -3.0)):
+        ts = (now - dt.timedelta(hours=hours_ago)).isoformat()
+        out.append({"ts": ts, "equity": 1000.0, "pnl": pnl})
+    return out
+
+
+def test_pnl_windows_from_read_model_match_one_columnar_read(tmp_path):
+    now = dt.datetime.utcnow()
+    rm = ReadModel()
+    store = ColumnarStore(str(tmp_path / "columnar"), flush_interval=3600)
+    for row in _rows(now):
+        rm.on_equity(row)
+        store.on_equity(row)
+    equity_csv = str(tmp_path / "equity.csv")
+    from_rm = BudgetManager(equity_csv, read_model=rm)._pnl_windows()
+    from_store = BudgetManager(equity_csv, columnar=store)._pnl_windows()
+    assert from_rm == pytest.approx((-3.0, -5.0, -7.0))
+    assert from_store == pytest.approx(from_rm)
+
+    # límites en %: -5 de PnL semanal dispara con un tope de 400%
+    bm = BudgetManager(equity_csv, {"max_daily_drawdown_pct": 1000.0, "max_weekly_drawdown_pct": 400.0,
+                                    "max_global_drawdown_pct": 1000.0}, read_model=rm)
+    assert bm.circuit_breakers() == (True, "CIRCUIT_WEEK -5.0000")
+    store.close()
+
+
+def test_kelly_and_var95_from_ledger_match_columnar_trades(tmp_path):
+    ledger = Ledger()
+    store = ColumnarStore(str(tmp_path / "columnar"), flush_interval=3600)
+    pnls = [4.0, -3.0, 3.0, -2.0, 6.0, -5.0, 2.0, "", None]
+    t0 = dt.datetime(2025, 3, 1)
+    for i, p in enumerate(pnls):
+        row = {"ts": (t0 + dt.timedelta(hours=i)).isoformat(), "symbol": "BTC", "note": "CLOSE", "pnl": 0.0}
+        if p is not None:
+            row["pnl_net"] = p
+        ledger.on_trade(row)
+        store.on_trade(row)
+    trades_csv = str(tmp_path / "trades.csv")
+    equity_csv = str(tmp_path / "equity.csv")
+    mem = BudgetManager(equity_csv, ledger=ledger)
+    col = BudgetManager(equity_csv, columnar=store)
+    assert list(mem._pnl_net(trades_csv)) == [4.0, -3.0, 3.0, -2.0, 6.0, -5.0, 2.0]
+    assert list(col._pnl_net(trades_csv)) == list(mem._pnl_net(trades_csv))
+    assert mem.var95(trades_csv) == col.var95(trades_csv) == pytest.approx(float(np.percentile(pnls[:7], 5)))
+    # p=4/7, b=(15/4)/(10/3): k = p - (1-p)/b
+    assert mem.kelly_fraction(trades_csv) == col.kelly_fraction(trades_csv) == pytest.approx(4 / 7 - (3 / 7) / 1.125)
+    store.close()
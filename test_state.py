@@ -0,0 +1,45 @@
+import json
+
+from bot.state import StatePersister
+
+
+def _persister(path, snapshot):
+    p = StatePersister(str(path), snapshot, max_writes_per_s=1.0, journal=True)
+    p._last_write = float("inf")  # dentro del debounce: mark(critical) solo va al journal
+    return p
+
+
+def test_stale_journal_left_by_crash_before_truncate_does_not_override_snapshot(tmp_path):
+    path = tmp_path / "state.json"
+    state = {"positions": {"BTC": [{"qty": 1.0}], "ETH": [{"qty": 2.0}]}}
+    p = _persister(path, lambda: json.loads(json.dumps(state)))
+    p.mark(critical=True)                       # abre ETH: línea de journal
+    journal = open(p.journal_path, encoding="utf-8").read()
+    assert journal.count("\n") == 1
+
+    state["positions"].pop("ETH")               # cierra ETH
+    p.mark()
+    assert p.flush()                            # snapshot nuevo + truncado del journal
+    # crash entre write_atomic y el truncado: el journal viejo sigue ahí
+    open(p.journal_path, "w", encoding="utf-8").write(journal)
+
+    assert _persister(path, dict).load() == {"positions": {"BTC": [{"qty": 1.0}]}}
+
+
+def test_newer_journal_line_wins_and_numbering_survives_restart(tmp_path):
+    path = tmp_path / "state.json"
+    p = _persister(path, lambda: {"positions": {"BTC": [{"qty": 1.0}]}})
+    for _ in range(3):
+        p.mark(critical=True)
+    p.mark()
+    assert p.flush()
+
+    # otro proceso (sin load) abre un lote: su línea tiene que ganarle al snapshot
+    state2 = {"positions": {"BTC": [{"qty": 1.0}], "SOL": [{"qty": 3.0}]}}
+    _persister(path, lambda: state2).mark(critical=True)
+    assert _persister(path, dict).load() == state2
+
+    # una línea cortada al final no pisa la anterior
+    with open(str(path) + ".journal", "a", encoding="utf-8") as f:
+        f.write('{"positions": {"BTC"')
+    assert _persister(path, dict).load() == state2
@@ -0,0 +1,49 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from bot.core.indicators import compute_indicators
+from bot.core.strategy import signal_arrays, signal_at, signal_from_row, generate_signal
+
+CONFS = [{}, {"rsi_long": 50, "rsi_short": 50, "rsi_low": 45, "rsi_high": 55, "stop_mult": 2.0,
+              "tp1_r": 0.8, "tp2_r": 3.0}]
+
+
+def _indicators(n=3000, seed=21):
+    rng = np.random.default_rng(seed)
+    drift = np.repeat(rng.choice([-0.0015, 0.0, 0.0015], size=n // 150 + 1), 150)[:n]
+    close = 30000 * np.exp(np.cumsum(drift + rng.normal(0, 0.002, n)))
+    open_ = np.r_[close[0], close[:-1]]
+    df = pd.DataFrame({"ts": 1_700_000_000_000 + np.arange(n) * 120_000, "open": open_,
+                       "high": np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.001, n))),
+                       "low": np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.001, n))),
+                       "close": close, "volume": np.abs(rng.normal(100, 30, n))})
+    return compute_indicators(df, {})
+
+
+def _assert_same(arrays, i, sig):
+    got = signal_at(arrays, i)
+    assert (got.side, got.regime) == (sig.side, sig.regime), i
+    for k in ("conf", "sl", "tp1", "tp2"):
+        assert getattr(got, k) == getattr(sig, k), (i, k)
+
+
+@pytest.mark.parametrize("conf", CONFS)
+def test_signal_arrays_equal_signal_from_row_elementwise(conf):
+    ind = _indicators()
+    arrays = signal_arrays(ind, conf)
+    for i, row in enumerate(ind.to_dict("records")):
+        _assert_same(arrays, i, signal_from_row(row, conf))
+    assert {"long", "short", "flat"} <= set(arrays["side"])
+    # la última fila es generate_signal
+    _assert_same(arrays, len(ind) - 1, generate_signal(ind, conf))
+
+
+def test_signal_arrays_defaults_and_nan_like_signal_from_row():
+    ind = _indicators(600, seed=4).drop(columns=["macd_hist", "bb_low"])
+    ind.loc[::17, "rsi"] = np.nan
+    ind.loc[::23, "atr"] = 0.0
+    cols = {k: ind[k].to_numpy() for k in ind.columns}   # también acepta dict de arrays
+    arrays = signal_arrays(cols, {})
+    for i, row in enumerate(ind.to_dict("records")):
+        _assert_same(arrays, i, signal_from_row(row, {}))
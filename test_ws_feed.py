@@ -0,0 +1,86 @@
+import asyncio
+import time
+import types
+
+from bot.core.candle_store import CandleStore
+from bot.exchanges.ws_feed import MarketFeed, StubFeedServer, kline_msg, mark_msg
+
+SYM = "BTC/USDT:USDT"
+T0 = 1_700_000_000_000 - 1_700_000_000_000 % 60_000
+
+
+async def _until(cond, timeout=5.0):
+    end = time.monotonic() + timeout
+    while not cond() and time.monotonic() < end:
+        await asyncio.sleep(0.01)
+    return cond()
+
+
+class _FakeCcxt:
+    def __init__(self):
+        self.calls = {"fetch_ticker": 0, "fetch_ohlcv": 0}
+
+    async def fetch_ticker(self, symbol):
+        self.calls["fetch_ticker"] += 1
+        return {"last": 99.0}
+
+    async def fetch_ohlcv(self, symbol, timeframe="1m", since=None, limit=None):
+        self.calls["fetch_ohlcv"] += 1
+        return [[since, 1, 1, 1, 1, 1]]
+
+
+def _engine(feed, candles, now_s):
+    """Lo mínimo de TradingApp para fetch_last_price/refresh_candles."""
+    from bot.engine import TradingApp
+
+    async def with_retry(fn, *args, **kwargs):
+        return await fn(*args, **kwargs)
+
+    app = types.SimpleNamespace(feed=feed, candles=candles, ccxt=_FakeCcxt(), with_retry=with_retry,
+                                base_timeframe="1m", _now=lambda: now_s)
+    app.fetch_last_price = types.MethodType(TradingApp.fetch_last_price, app)
+    app.refresh_candles = types.MethodType(TradingApp.refresh_candles, app)
+    return app
+
+
+def test_feed_disconnect_falls_back_to_rest_and_reconnects():
+    async def run():
+        server = StubFeedServer()
+        url = await server.start()
+        candles = CandleStore("1m", depth=50)
+        candles.merge(SYM, [[T0, 1, 1, 1, 1, 1]], reset=True)
+        feed = MarketFeed([SYM], "1m", candles, {}, url=url, stale_after_s=5)
+        feed.start()
+        try:
+            assert await server.wait_clients(1)
+            await server.push(kline_msg(SYM, (T0 + 60_000, 100, 101, 99, 100.5, 3)))
+            await server.push(mark_msg(SYM, 100.5, funding_rate=0.0001))
+            assert await _until(lambda: feed.price(SYM) == 100.5)
+            assert candles.bars(SYM)[-1][0] == T0 + 60_000
+            assert feed.funding_bps(SYM) is not None
+
+            app = _engine(feed, candles, (T0 + 60_000) / 1000 + 30)
+            # feed sano: ni ticker ni velas por REST
+            assert await app.fetch_last_price(SYM) == 100.5
+            await app.refresh_candles(SYM)
+            assert app.ccxt.calls == {"fetch_ticker": 0, "fetch_ohlcv": 0}
+
+            await server.drop()
+            assert await _until(lambda: not feed.connected)
+            assert feed.price(SYM) is None and feed.funding_bps(SYM) is None
+            # caído: todo vuelve a REST
+            assert await app.fetch_last_price(SYM) == 99.0
+            await app.refresh_candles(SYM)
+            assert app.ccxt.calls == {"fetch_ticker": 1, "fetch_ohlcv": 1}
+
+            # reconecta con backoff y vuelve a servir precios
+            assert await server.wait_clients(1, timeout=5.0)
+            assert await _until(lambda: feed.connected)
+            await server.push(mark_msg(SYM, 101.0))
+            assert await _until(lambda: feed.price(SYM) == 101.0)
+            assert feed.stats["reconnects"] >= 1
+        finally:
+            await feed.stop()
+            await server.stop()
+
+    asyncio.run(run())
@@ -1,25 +1,99 @@
-
 from __future__ import annotations
-import pandas as pd, numpy as np, math
+import os, shutil, tempfile
+from concurrent.futures import ProcessPoolExecutor
+import pandas as pd, numpy as np
 from .strategy_cots import compute_cots_score
 
-def walk_forward(df: pd.DataFrame, train_months: int = 6, test_months: int = 1, threshold: float = 0.65) -> pd.DataFrame:
+DEFAULT_THRESHOLDS = (0.55, 0.60, 0.65, 0.70, 0.75, 0.80)
+DEFAULT_HOLDS = (1, 3, 6, 12)
+
+# features compartidas por los workers (memmaps de solo lectura)
+_F = {}
+
+def _load_features(path: str):
+    _F.clear()
+    for k in ("cots", "dir", "fwd"):
+        _F[k] = np.load(os.path.join(path, f"{k}.npy"), mmap_mode="r")
+
+def precompute_features(df: pd.DataFrame, holds=DEFAULT_HOLDS, atr_htf_window: int = 48) -> dict:
+    """COTS, dirección de la vela y retornos forward close->close a cada `hold`, una sola vez para toda la serie."""
+    sig = compute_cots_score(df, atr_htf_window=atr_htf_window)
+    close = df["close"].to_numpy(float)
+    fwd = np.full((len(close), len(holds)), np.nan)
+    for j, h in enumerate(holds):
+        fwd[:-h, j] = close[h:] / close[:-h] - 1.0
+    return {"cots": sig["cots"].to_numpy(float), "dir": sig["dir"].to_numpy(float), "fwd": fwd}
+
+def _trades(lo: int, hi: int, thr: float, j: int, h: int, fee: float):
+    """Trades de la ventana [lo, hi): entrada en cada vela con cots>=thr, salida h velas después (dentro de la ventana)."""
+    cots = np.asarray(_F["cots"][lo:hi]); d = np.asarray(_F["dir"][lo:hi])
+    m = (cots >= thr) & (d != 0)
+    m[max(0, hi - lo - h):] = False
+    idx = np.flatnonzero(m)
+    return lo + idx, d[idx] * np.asarray(_F["fwd"][lo:hi, j])[idx] - fee
+
+def _eval_window(lo: int, mid: int, hi: int, thresholds, holds, fee: float, min_trades: int):
+    """Optimiza (threshold, hold) en train [lo, mid) y evalúa el mejor en test [mid, hi)."""
+    best = None
+    for thr in thresholds:
+        for j, h in enumerate(holds):
+            _, r = _trades(lo, mid, thr, j, h, fee)
+            if len(r) < min_trades:
+                continue
+            score = float(r.sum())
+            if best is None or score > best[0]:
+                best = (score, len(r), thr, j, h)
+    if best is None:
+        return None
+    score, n_train, thr, j, h = best
+    pos, r = _trades(mid, hi, thr, j, h, fee)
+    return {"threshold": thr, "hold": h, "train_trades": n_train, "train_pnl": score, "pos": pos, "ret": r}
+
+def walk_forward(df: pd.DataFrame, train_months: int = 6, test_months: int = 1, thresholds=DEFAULT_THRESHOLDS,
+                 holds=DEFAULT_HOLDS, fee_bps: float = 0.0, min_trades: int = 10, workers: int | None = None,
+                 return_equity: bool = False):
+    """Walk-forward sobre COTS: por ventana elige (threshold, hold) en train y lo mide out-of-sample en test.
+
+    Las ventanas avanzan de a `test_months`, así los tests no se solapan y el equity OOS se puede coser.
+    Las features se calculan una vez y los workers las leen de .npy mapeados en memoria.
+    Devuelve el reporte por ventana y, con return_equity=True, también el equity OOS cosido
+    (retornos por trade sobre notional, indexados por la vela de entrada).
+    """
     df = df.copy().sort_index()
+    thresholds = (thresholds,) if np.isscalar(thresholds) else tuple(thresholds)
+    holds = tuple(int(h) for h in holds)
     monthly = df.resample("MS").first().index
-    rows = []
-    for i in range(0, len(monthly)-(train_months+test_months)):
-        train_end = monthly[i+train_months]
-        test_end  = monthly[i+train_months+test_months]
-        test_df = df.loc[train_end:test_end - pd.Timedelta(milliseconds=1)]
-        sig = compute_cots_score(test_df, atr_htf_window=48)
-        longs = (sig["cots"]>=threshold) & (sig["long_ok"]==1)
-        shorts= (sig["cots"]>=threshold) & (sig["short_ok"]==1)
-        # naive PnL: next bar close-close
-        pnl = 0.0; trades=0; wins=0; res=[]
-        for ts, ok in longs.items():
-            nxt = test_df.index.get_loc(ts)+1
-            if nxt < len(test_df.index):
-                ret = test_df.iloc[nxt]["close"] - test_df.iloc[nxt]["close"].shift(0)
-        rows.append({"train_end":str(train_end.date()),"test_end":str((test_end-pd.Timedelta(days=1)).date()),
-                     "trades": trades, "win_rate": (wins/max(1,trades)) if trades else 0.0, "pnl": pnl})
-    return pd.DataFrame(rows)
+    bounds = [int(df.index.searchsorted(m)) for m in monthly]
+    wins = [(i, bounds[i], bounds[i + train_months], bounds[i + train_months + test_months])
+            for i in range(0, len(monthly) - (train_months + test_months), test_months)]
+
+    tmp = tempfile.mkdtemp(prefix="wf_")
+    try:
+        for k, v in precompute_features(df, holds).items():
+            np.save(os.path.join(tmp, f"{k}.npy"), v)
+        args = [(lo, mid, hi, thresholds, holds, fee_bps / 10000.0, min_trades) for _, lo, mid, hi in wins]
+        with ProcessPoolExecutor(max_workers=workers, initializer=_load_features, initargs=(tmp,)) as ex:
+            results = list(ex.map(_eval_window, *zip(*args))) if args else []
+    finally:
+        shutil.rmtree(tmp, ignore_errors=True)
+
+    rows, oos = [], []
+    for (i, lo, mid, hi), res in zip(wins, results):
+        train_end = monthly[i + train_months]
+        test_end = monthly[i + train_months + test_months]
+        row = {"train_end": str(train_end.date()), "test_end": str((test_end - pd.Timedelta(days=1)).date()),
+               "threshold": np.nan, "hold": np.nan, "train_trades": 0, "train_pnl": 0.0,
+               "trades": 0, "win_rate": 0.0, "pnl": 0.0}
+        if res is not None:
+            r = res["ret"]
+            row.update(threshold=res["threshold"], hold=res["hold"], train_trades=res["train_trades"],
+                       train_pnl=res["train_pnl"], trades=int(len(r)),
+                       win_rate=float((r > 0).mean()) if len(r) else 0.0, pnl=float(r.sum()))
+            oos.append(pd.DataFrame({"ret": r, "window": str(train_end.date())}, index=df.index[res["pos"]]))
+        rows.append(row)
+    report = pd.DataFrame(rows)
+    if not return_equity:
+        return report
+    equity = pd.concat(oos) if oos else pd.DataFrame(columns=["ret", "window"])
+    equity["equity"] = equity["ret"].cumsum()
+    return report, equity
@@ -0,0 +1,229 @@
+import asyncio, json, time, logging, random
+import aiohttp
+from aiohttp import web
+
+from bot.exchanges.funding_cache import annualized_bps
+
+logger = logging.getLogger("ws_feed")
+
+# Streams de Binance USDⓈ-M: kline del timeframe base + mark price (trae el funding).
+DEFAULT_URL = "wss://fstream.binance.com/stream"
+
+
+def stream_symbol(symbol: str) -> str:
+    """'BTC/USDT:USDT' -> 'btcusdt'."""
+    return symbol.split(":")[0].replace("/", "").lower()
+
+
+class MarketFeed:
+    """Feed websocket de velas, mark price y funding.
+
+    Escribe directo en el CandleStore y el price_cache del engine y llama a
+    `on_tick(symbol, price)` en cada mark price, para evaluar salidas por tick.
+    Si se corta reconecta con backoff; mientras no esté sano (`healthy`) el
+    engine sigue usando REST como siempre.
+    """
+
+    def __init__(self, symbols, base_tf, candles, price_cache, on_tick=None,
+                 url=DEFAULT_URL, mark_interval="1s", stale_after_s=10.0):
+        self.symbols = list(symbols)
+        self.base_tf = base_tf
+        self.candles = candles
+        self.price_cache = price_cache
+        self.on_tick = on_tick
+        self.url = url
+        self.mark_interval = mark_interval
+        self.stale_after = float(stale_after_s)
+        self._by_stream = {stream_symbol(s): s for s in self.symbols}
+        self._last = {}            # symbol -> monotonic del último mensaje
+        self.funding = {}          # symbol -> (bps anualizados, monotonic)
+        self.next_funding = {}     # symbol -> epoch s de la próxima liquidación
+        self.connected = False
+        self._task = None
+        self.stats = {"msgs": 0, "klines": 0, "marks": 0, "reconnects": 0}
+
+    def streams(self):
+        out = []
+        for s in self._by_stream:
+            out.append(f"{s}@kline_{self.base_tf}")
+            out.append(f"{s}@markPrice@{self.mark_interval}" if self.mark_interval else f"{s}@markPrice")
+        return out
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+        return self._task
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except (asyncio.CancelledError, Exception):
+                pass
+        self.connected = False
+
+    # --- estado ---
+    def healthy(self, symbol=None) -> bool:
+        if not self.connected:
+            return False
+        now = time.monotonic()
+        if symbol is None:
+            return any(now - t < self.stale_after for t in self._last.values())
+        t = self._last.get(symbol)
+        return t is not None and now - t < self.stale_after
+
+    def price(self, symbol):
+        """Último mark price si el stream del símbolo está al día, si no None."""
+        return self.price_cache.get(symbol) if self.healthy(symbol) else None
+
+    def next_funding_ts(self, symbol):
+        return self.next_funding.get(symbol) if self.healthy(symbol) else None
+
+    def funding_bps(self, symbol):
+        fr = self.funding.get(symbol)
+        if fr is None or not self.healthy(symbol):
+            return None
+        return fr[0]
+
+    # --- conexión ---
+    async def _run(self):
+        delay = 1.0
+        url = f"{self.url}?streams={'/'.join(self.streams())}"
+        while True:
+            try:
+                async with aiohttp.ClientSession() as session:
+                    async with session.ws_connect(url, heartbeat=30) as ws:
+                        self.connected = True
+                        delay = 1.0
+                        logger.info("ws feed conectado (%d streams)", len(self.streams()))
+                        async for msg in ws:
+                            if msg.type == aiohttp.WSMsgType.TEXT:
+                                await self.handle(json.loads(msg.data))
+                            elif msg.type in (aiohttp.WSMsgType.CLOSED, aiohttp.WSMsgType.ERROR):
+                                break
+            except asyncio.CancelledError:
+                self.connected = False
+                raise
+            except Exception as e:
+                logger.warning("ws feed error: %s", e)
+            self.connected = False
+            self.stats["reconnects"] += 1
+            logger.warning("ws feed desconectado; REST hasta reconectar (reintento en %.0fs)", delay)
+            await asyncio.sleep(delay * (1 + random.random() * 0.2))
+            delay = min(delay * 2, 60.0)
+
+    async def handle(self, msg: dict):
+        data = msg.get("data", msg)
+        sym = self._by_stream.get(str(data.get("s", "")).lower())
+        if sym is None:
+            return
+        self.stats["msgs"] += 1
+        self._last[sym] = time.monotonic()
+        ev = data.get("e")
+        if ev == "kline":
+            k = data["k"]
+            # sin historia previa (REST) no sirve una vela suelta: el primer fetch la trae
+            if self.candles.bars(sym):
+                self.candles.merge(sym, [[int(k["t"]), k["o"], k["h"], k["l"], k["c"], k["v"]]])
+            self.stats["klines"] += 1
+        elif ev == "markPriceUpdate":
+            price = float(data["p"])
+            self.price_cache[sym] = price
+            if data.get("r") not in (None, ""):
+                bps = annualized_bps(data["r"])
+                self.funding[sym] = (bps, time.monotonic())
+                self.price_cache[f"FUNDING_BPS:{sym}"] = bps
+            if data.get("T"):
+                self.next_funding[sym] = int(data["T"]) / 1000.0
+            self.stats["marks"] += 1
+            if self.on_tick is not None:
+                try:
+                    await self.on_tick(sym, price)
+                except Exception as e:
+                    logger.warning("on_tick %s failed: %s", sym, e)
+
+
+# --- servidor stub para tests / replay local ---
+def kline_msg(symbol, bar, tf="1m", closed=False):
+    ts, o, h, l, c, v = bar
+    s = stream_symbol(symbol)
+    return {"stream": f"{s}@kline_{tf}",
+            "data": {"e": "kline", "s": s.upper(),
+                     "k": {"t": int(ts), "i": tf, "o": str(o), "h": str(h), "l": str(l), "c": str(c),
+                           "v": str(v), "x": bool(closed)}}}
+
+
+def mark_msg(symbol, price, funding_rate=None):
+    s = stream_symbol(symbol)
+    data = {"e": "markPriceUpdate", "s": s.upper(), "p": str(price)}
+    if funding_rate is not None:
+        data["r"] = str(funding_rate)
+    return {"stream": f"{s}@markPrice@1s", "data": data}
+
+
+class StubFeedServer:
+    """Servidor websocket local que emite mensajes con el formato de Binance.
+
+    `await push(msg)` los manda a todos los clientes conectados; `drop()` corta
+    las conexiones para probar el fallback a REST.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host, self.port = host, port
+        self._clients = set()
+        self._runner = None
+        self.url = None
+
+    async def start(self):
+        app = web.Application()
+        app.router.add_get("/stream", self._handler)
+        self._runner = web.AppRunner(app)
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, self.host, self.port)
+        await site.start()
+        port = site._server.sockets[0].getsockname()[1]
+        self.url = f"ws://{self.host}:{port}/stream"
+        return self.url
+
+    async def _handler(self, request):
+        ws = web.WebSocketResponse()
+        await ws.prepare(request)
+        self._clients.add(ws)
+        try:
+            async for _ in ws:
+                pass
+        finally:
+            self._clients.discard(ws)
+        return ws
+
+    async def wait_clients(self, n=1, timeout=5.0):
+        end = time.monotonic() + timeout
+        while len(self._clients) < n and time.monotonic() < end:
+            await asyncio.sleep(0.01)
+        return len(self._clients) >= n
+
+    async def push(self, msg):
+        for ws in list(self._clients):
+            try:
+                await ws.send_str(json.dumps(msg))
+            except Exception:
+                self._clients.discard(ws)
+
+    async def replay(self, symbol, bars, tf="1m", delay=0.0):
+        """Emite cada vela como kline cerrada + mark price al cierre."""
+        for bar in bars:
+            await self.push(kline_msg(symbol, bar, tf, closed=True))
+            await self.push(mark_msg(symbol, bar[4]))
+            if delay:
+                await asyncio.sleep(delay)
+
+    async def drop(self):
+        for ws in list(self._clients):
+            await ws.close()
+        self._clients.clear()
+
+    async def stop(self):
+        await self.drop()
+        if self._runner:
+            await self._runner.cleanup()